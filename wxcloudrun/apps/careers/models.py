@@ -1,7 +1,8 @@
 from django.db import models
 from wxcloudrun.apps.users.models import User
+from wxcloudrun.apps.jobs.models import EnrichableModel
 
-class CareerRecord(models.Model):
+class CareerRecord(EnrichableModel):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='career_records')
     title = models.CharField(max_length=100)
     content = models.TextField()
@@ -13,6 +14,8 @@ class CareerRecord(models.Model):
     class Meta:
         ordering = ['-created_at']
         db_table = 'career_records'
+        # 游标分页按 (created_at, id) 定位
+        indexes = [models.Index(fields=['user', 'created_at', 'id'], name='career_records_user_created')]
 
     def __str__(self):
         return f"{self.user.username} - {self.title} - {self.created_at}" 
\ No newline at end of file
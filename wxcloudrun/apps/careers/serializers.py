@@ -4,8 +4,8 @@ from .models import CareerRecord
 class CareerRecordSerializer(serializers.ModelSerializer):
     class Meta:
         model = CareerRecord
-        fields = ['id', 'title', 'content', 'record_type', 'ai_analysis', 'created_at']
-        read_only_fields = ['id', 'ai_analysis', 'created_at']
+        fields = ['id', 'title', 'content', 'record_type', 'ai_analysis', 'enrich_status', 'enriched_at', 'created_at']
+        read_only_fields = ['id', 'ai_analysis', 'enrich_status', 'enriched_at', 'created_at']
 
 class CareerRecordCreateSerializer(serializers.ModelSerializer):
     class Meta:
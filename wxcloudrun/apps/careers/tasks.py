@@ -0,0 +1,41 @@
+import json
+from wxcloudrun.apps.core.services.ai_service import AIService
+from wxcloudrun.apps.core.services.quota import QuotaExceededError
+from wxcloudrun.apps.jobs.queue import register, JobError, PermanentJobError
+from wxcloudrun.apps.jobs.enrichment import track_enrichment, finish_enrichment
+from .models import CareerRecord
+
+def dump_analysis(analysis: dict) -> str:
+    """ai_analysis 统一保存为 JSON：suggestion、skills、development_path"""
+    return json.dumps({
+        'suggestion': analysis.get('suggestion', ''),
+        'skills': analysis.get('skills', []),
+        'development_path': analysis.get('development_path', [])
+    }, ensure_ascii=False)
+
+def parse_streamed_analysis(text: str) -> dict:
+    """流式输出为 JSON 对象时按字段读取，否则整段作为建议"""
+    try:
+        output = json.loads(text)
+    except ValueError:
+        output = None
+    return output if isinstance(output, dict) else {'suggestion': text}
+
+@register('careers.analyze', workflow='career_analysis')
+def analyze(job):
+    """职业发展记录 AI 分析"""
+    career_record = CareerRecord.objects.filter(id=job.payload['record_id']).first()
+    if career_record is None:
+        raise PermanentJobError('职业发展记录不存在')
+
+    with track_enrichment(CareerRecord, career_record.id, job):
+        try:
+            analysis = AIService(job.user).analyze_career(career_record.content)
+        except QuotaExceededError as e:
+            # 额度按天重置，几分钟内的重试不会成功
+            raise PermanentJobError(str(e))
+        if analysis is None:
+            raise JobError('职业分析失败')
+
+        finish_enrichment(CareerRecord, career_record.id, job=job, ai_analysis=dump_analysis(analysis))
+    return {'record_id': career_record.id, 'analysis': analysis}
@@ -1,16 +1,22 @@
 from rest_framework import viewsets, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.renderers import JSONRenderer
 from django.db.models import Count
 from django.db.models.functions import TruncDate
 from .models import CareerRecord
 from .serializers import CareerRecordSerializer, CareerRecordCreateSerializer
-from wxcloudrun.apps.core.utils.response import api_response
+from .tasks import dump_analysis, parse_streamed_analysis
+from wxcloudrun.apps.core.utils.pagination import KeysetPagination
+from wxcloudrun.apps.core.utils.export import export_response, EXPORT_FORMATS
+from wxcloudrun.apps.core.utils.response import api_response, accepted_response, stream_text_response, EventStreamRenderer
 from wxcloudrun.apps.core.services.ai_service import AIService
+from wxcloudrun.apps.jobs.enrichment import schedule_enrichment, enrichment_status, save_streamed_enrichment
 
 class CareerRecordViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = CareerRecordSerializer
+    pagination_class = KeysetPagination
     
     def get_queryset(self):
         return CareerRecord.objects.filter(user=self.request.user)
@@ -22,11 +28,44 @@ class CareerRecordViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         career_record = serializer.save()
-        # 调用AI服务进行分析
-        ai_service = AIService()
-        analysis = ai_service.analyze_career(career_record.content)
-        career_record.ai_analysis = analysis
-        career_record.save()
+        # AI分析在事务提交后由后台任务执行，完成后写回 ai_analysis
+        schedule_enrichment(career_record, 'careers.analyze', {'record_id': career_record.id}, user=self.request.user)
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        self.perform_create(serializer)
+        return accepted_response(CareerRecordSerializer(serializer.instance).data)
+
+    @action(detail=True, methods=['get'])
+    def enrichment(self, request, pk=None):
+        """AI分析的执行进度"""
+        return api_response(data=enrichment_status(self.get_object()))
+
+    @action(detail=True, methods=['get'], url_path='analysis/stream', renderer_classes=[EventStreamRenderer, JSONRenderer])
+    def stream_analysis(self, request, pk=None):
+        """流式生成职业分析（SSE），生成完成后保存"""
+        career_record = self.get_object()
+        chunks = AIService(request.user).stream_career_analysis(career_record.content)
+
+        def save(text):
+            # 与后台任务写回的格式一致，并取代尚未完成的分析任务
+            save_streamed_enrichment(career_record, ai_analysis=dump_analysis(parse_streamed_analysis(text)))
+            return {'id': career_record.id}
+
+        return stream_text_response(chunks, save)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """流式导出全部职业发展记录：?output=jsonl|csv，?gzip=1 时输出 .gz 文件"""
+        output = request.query_params.get('output', 'jsonl')
+        if output not in EXPORT_FORMATS:
+            return api_response(code=400, message='output 只支持 jsonl 或 csv')
+        return export_response(
+            self.get_queryset(), CareerRecordSerializer, 'career-records', output,
+            compress=request.query_params.get('gzip') in ('1', 'true'),
+            context=self.get_serializer_context()
+        )
 
     @action(detail=False, methods=['get'])
     def statistics(self, request):
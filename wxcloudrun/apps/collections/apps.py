@@ -3,4 +3,8 @@ from django.apps import AppConfig
 class CollectionsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'wxcloudrun.apps.collections'
-    verbose_name = '收藏管理' 
\ No newline at end of file
+    verbose_name = '收藏管理' 
+
+    def ready(self):
+        # 注册维护全文索引的信号
+        from . import signals
@@ -0,0 +1,274 @@
+import os
+import json
+import uuid
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from django.conf import settings
+from django.core.files import locks
+from django.db import transaction
+from django.db.models import Count, Max
+from wxcloudrun.apps.core.services.result_cache import LRUCache
+from wxcloudrun.apps.jobs.enrichment import submit_enrichment
+from .models import Collection, CollectionEmbedding
+from .search_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+# 字段权重：标题中的词比正文中的词更重要（摘要由正文生成，不参与向量）
+FIELD_WEIGHTS = (('title', 3), ('content', 1))
+
+def get_dim() -> int:
+    return getattr(settings, 'COLLECTION_EMBEDDING_DIM', 256)
+
+def _term_counts(collection: Collection) -> Counter:
+    max_chars = getattr(settings, 'SEARCH_INDEX_MAX_CHARS', 50000)
+    counts: Counter = Counter()
+    for field, weight in FIELD_WEIGHTS:
+        for term in tokenize((getattr(collection, field) or '')[:max_chars]):
+            counts[term] += weight
+    return counts
+
+def embed_counts(counts: Counter) -> np.ndarray:
+    """带符号的特征哈希：每个词按哈希值落到一个维度，权重为 1 + log(词频)，结果做 L2 归一化"""
+    dim = get_dim()
+    vector = np.zeros(dim, dtype=np.float32)
+    if not counts:
+        return vector
+    hashes = np.array([
+        int.from_bytes(hashlib.blake2b(term.encode('utf-8'), digest_size=8).digest(), 'little')
+        for term in counts
+    ], dtype=np.uint64)
+    weights = 1 + np.log(np.array(list(counts.values()), dtype=np.float32))
+    signs = np.where(hashes >> np.uint64(63), 1.0, -1.0).astype(np.float32)
+    np.add.at(vector, (hashes % np.uint64(dim)).astype(np.int64), signs * weights)
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+def embed_collection(collection: Collection) -> np.ndarray:
+    return embed_counts(_term_counts(collection))
+
+def embed_query(query: str) -> np.ndarray:
+    return embed_counts(Counter(tokenize(query)))
+
+def index_collection(collection: Collection) -> None:
+    """计算并保存收藏的向量"""
+    CollectionEmbedding.objects.update_or_create(
+        collection_id=collection.id,
+        defaults={'user_id': collection.user_id, 'vector': embed_collection(collection).tobytes()}
+    )
+
+def schedule(collection: Collection, user=None) -> None:
+    """事务提交后提交后台任务计算向量，不阻塞请求"""
+    payload = {'collection_id': collection.id}
+    transaction.on_commit(lambda: submit_enrichment('collections.embed', payload, user, ''))
+
+def rebuild(user_ids: Optional[List[int]] = None, batch_size: int = 500) -> int:
+    """重新计算全部或指定用户的向量，返回处理的收藏数"""
+    collections = Collection.objects.all()
+    if user_ids is not None:
+        collections = collections.filter(user_id__in=user_ids)
+    count = 0
+    for collection in collections.only('id', 'user_id', 'title', 'content').iterator(chunk_size=batch_size):
+        index_collection(collection)
+        count += 1
+    return count
+
+class EmbeddingMatrix:
+    """一个用户的全部向量：内存映射的 .npy 文件，每行为 (收藏 ID, float32 向量)，ID 为 -1 表示空行"""
+
+    def __init__(self, state: Tuple[int, str], generation: str, rows: np.ndarray):
+        self.state = state
+        self.generation = generation
+        self.ids = rows['id']
+        self.vectors = rows['vector']
+
+    def top_k(self, query: np.ndarray, k: int, exclude_id: Optional[int] = None) -> List[Tuple[int, float]]:
+        """余弦相似度最高的 k 条（向量均已归一化，矩阵乘一个向量即得全部相似度）"""
+        if len(self.ids) == 0 or k <= 0:
+            return []
+        scores = self.vectors @ query
+        scores[self.ids < 0] = -np.inf
+        if exclude_id is not None:
+            scores[self.ids == exclude_id] = -np.inf
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(self.ids[i]), float(scores[i])) for i in top if scores[i] > 0]
+
+# 增量同步时多读最近一段时间内更新的向量，覆盖更新时间早于上次同步、但提交得更晚的写入
+SYNC_OVERLAP = timedelta(seconds=60)
+# 进程内打开的矩阵闲置超过该时间后关闭
+MATRIX_IDLE_TTL = 3600
+
+_matrix_cache: Optional[LRUCache] = None
+_matrix_cache_lock = threading.Lock()
+
+def get_matrix_cache() -> LRUCache:
+    """进程内已打开的矩阵，按用户数 LRU 淘汰"""
+    global _matrix_cache
+    if _matrix_cache is None:
+        with _matrix_cache_lock:
+            if _matrix_cache is None:
+                _matrix_cache = LRUCache(getattr(settings, 'COLLECTION_EMBEDDING_CACHE_USERS', 256))
+    return _matrix_cache
+
+def _cache_dir() -> str:
+    path = getattr(settings, 'COLLECTION_EMBEDDING_CACHE_DIR', '') or os.path.join(tempfile.gettempdir(), 'collection-embeddings')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def _cache_base(user_id: int) -> str:
+    return os.path.join(_cache_dir(), f"user-{user_id}-d{get_dim()}")
+
+def _state(user_id: int) -> Tuple[int, str]:
+    """向量条数和最近更新时间，任一变化即需要同步矩阵（走 (user, updated_at) 索引）"""
+    stats = CollectionEmbedding.objects.filter(user_id=user_id).aggregate(count=Count('pk'), latest=Max('updated_at'))
+    return stats['count'], stats['latest'].isoformat() if stats['latest'] else ''
+
+def _read_meta(base: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(f"{base}.json", encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_meta(base: str, meta: Dict[str, Any]) -> None:
+    tmp = f"{base}.json.tmp{os.getpid()}"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(tmp, f"{base}.json")
+
+def _create(path: str, capacity: int, source: Optional[np.ndarray] = None, used: int = 0) -> np.ndarray:
+    """写一个新的矩阵文件（可带上已有的前 used 行）替换原文件：先写临时文件再改名，其他进程已打开的映射不受影响"""
+    dim = get_dim()
+    tmp = f"{path}.tmp{os.getpid()}-{threading.get_ident()}.npy"
+    rows = np.lib.format.open_memmap(tmp, mode='w+', shape=(capacity,),
+                                     dtype=np.dtype([('id', '<i8'), ('vector', '<f4', (dim,))]))
+    rows['id'] = -1
+    if used:
+        rows[:used] = source[:used]
+    rows.flush()
+    del rows
+    os.replace(tmp, path)
+    return np.load(path, mmap_mode='r+')
+
+def _patch(path: str, rows: np.ndarray, used: int, changes: Iterable[Tuple[int, bytes]]) -> Tuple[np.ndarray, int]:
+    """把 [(收藏 ID, 向量字节串)] 写入矩阵：已有的行原地覆盖，新的行追加到末尾（容量不够时换一个两倍大的文件）"""
+    dim = get_dim()
+    positions = dict(zip(rows['id'][:used].tolist(), range(used)))
+    for collection_id, vector in changes:
+        vector = np.frombuffer(vector, dtype=np.float32)
+        if len(vector) != dim:
+            continue
+        row = positions.get(collection_id)
+        if row is None:
+            if used == len(rows):
+                rows = _create(path, max(2 * len(rows), 64), rows, used)
+            row = positions[collection_id] = used
+            used += 1
+        # 先写向量再写 ID，并发读取的进程不会看到带旧向量的新 ID
+        rows['vector'][row] = vector
+        rows['id'][row] = collection_id
+    return rows, used
+
+def _drop_deleted(user_id: int, rows: np.ndarray, used: int) -> None:
+    """把已删除收藏的行标记为空行"""
+    ids = rows['id'][:used]
+    live = CollectionEmbedding.objects.filter(user_id=user_id).values_list('collection_id', flat=True)
+    stale = np.flatnonzero((ids >= 0) & ~np.isin(ids, np.fromiter(live.iterator(chunk_size=2000), dtype=np.int64)))
+    rows['id'][stale] = -1
+
+def sync(user_id: int, build: bool = True) -> Optional[Dict[str, Any]]:
+    """把本机上用户的矩阵文件同步到数据库的最新状态，返回文件的元数据
+
+    只读取上次同步以来更新过的向量原地写入，文件不存在或空行过多时才全量读取；同一用户的写入通过文件锁
+    在进程间串行，不影响其他用户。build 为 False 时本机没有该用户的文件则跳过（后台任务所在机器未必处理检索）。
+    """
+    base = _cache_base(user_id)
+    path = f"{base}.npy"
+    with open(f"{base}.lock", 'a') as lock_file:
+        locks.lock(lock_file, locks.LOCK_EX)
+        try:
+            state = _state(user_id)
+            meta = _read_meta(base)
+            rows = None
+            if meta is not None and os.path.exists(path):
+                if tuple(meta['state']) == state:
+                    return meta
+                # 删除留下的空行超过一半时重建，避免矩阵越用越大
+                if meta['rows'] <= 2 * state[0] + 64:
+                    try:
+                        rows = np.load(path, mmap_mode='r+')
+                    except (OSError, ValueError):
+                        rows = None
+            elif not build:
+                return None
+
+            if rows is None:
+                generation = uuid.uuid4().hex
+                queryset = CollectionEmbedding.objects.filter(user_id=user_id)
+                rows = _create(path, max(state[0] + state[0] // 4, 64))
+                rows, used = _patch(path, rows, 0, queryset.values_list('collection_id', 'vector').iterator(chunk_size=2000))
+            else:
+                generation, used = meta['generation'], meta['rows']
+                queryset = CollectionEmbedding.objects.filter(user_id=user_id)
+                if meta['state'][1]:
+                    since = datetime.fromisoformat(meta['state'][1]) - SYNC_OVERLAP
+                    queryset = queryset.filter(updated_at__gte=since)
+                capacity = len(rows)
+                rows, used = _patch(path, rows, used, queryset.values_list('collection_id', 'vector'))
+                if len(rows) != capacity:
+                    generation = uuid.uuid4().hex
+                if int((rows['id'][:used] >= 0).sum()) != state[0]:
+                    _drop_deleted(user_id, rows, used)
+            rows.flush()
+            meta = {'generation': generation, 'rows': used, 'state': list(state)}
+            _write_meta(base, meta)
+            logger.info(f"用户 {user_id} 的向量矩阵已同步: {used} 行")
+            return meta
+        finally:
+            locks.unlock(lock_file)
+
+def get_matrix(user_id: int) -> EmbeddingMatrix:
+    """获取用户的向量矩阵：数据库状态未变时复用进程内已打开的内存映射，有增改时先同步本机的矩阵文件
+    （原地写入的行通过共享映射直接可见），文件被替换过才重新打开"""
+    state = _state(user_id)
+    cache = get_matrix_cache()
+    matrix = cache.get(user_id)
+    if matrix is not None and matrix.state == state:
+        return matrix
+
+    meta = sync(user_id)
+    if matrix is None or matrix.generation != meta['generation']:
+        try:
+            rows = np.load(f"{_cache_base(user_id)}.npy", mmap_mode='r')
+        except FileNotFoundError:
+            # 文件在同步之后被清理（如临时目录清理）：再同步一次即重建
+            meta = sync(user_id)
+            rows = np.load(f"{_cache_base(user_id)}.npy", mmap_mode='r')
+        matrix = EmbeddingMatrix(tuple(meta['state']), meta['generation'], rows)
+    else:
+        matrix.state = tuple(meta['state'])
+    cache.set(user_id, matrix, MATRIX_IDLE_TTL)
+    return matrix
+
+def related(collection: Collection, limit: int = 10) -> List[Tuple[int, float]]:
+    """与收藏语义相近的其他收藏 [(收藏 ID, 相似度)]"""
+    stored = CollectionEmbedding.objects.filter(collection_id=collection.id).values_list('vector', flat=True).first()
+    query = np.frombuffer(stored, dtype=np.float32) if stored is not None else embed_collection(collection)
+    if len(query) != get_dim():
+        query = embed_collection(collection)
+    return get_matrix(collection.user_id).top_k(query, limit, exclude_id=collection.id)
+
+def semantic_search(user, query: str, limit: int = 10) -> List[Tuple[int, float]]:
+    """按查询文本的向量检索 [(收藏 ID, 相似度)]"""
+    vector = embed_query(query)
+    if not vector.any():
+        return []
+    return get_matrix(user.id).top_k(vector, limit)
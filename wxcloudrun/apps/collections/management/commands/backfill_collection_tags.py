@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from wxcloudrun.apps.collections.tags import rebuild
+
+class Command(BaseCommand):
+    """按收藏的 tags 字符串生成标签表、关联表和计数（首次上线或修复计数时执行）"""
+
+    help = '从 collections.tags 回填 collection_tag_names / collection_tags'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users', help='只处理指定用户，可重复')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        count = rebuild(options['users'], batch_size=options['batch_size'])
+        self.stdout.write(f"已回填 {count} 条收藏的标签")
@@ -0,0 +1,90 @@
+import time
+import uuid
+import random
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from wxcloudrun.apps.users.models import User
+from wxcloudrun.apps.collections.models import Collection
+from wxcloudrun.apps.collections import search_index
+
+# 生成测试收藏用的词表
+VOCABULARY = [
+    '机器学习', '深度学习', '情绪管理', '时间管理', '职业规划', '产品设计', '数据分析', '用户研究',
+    '心理健康', '阅读笔记', '投资理财', '健身计划', '沟通技巧', '团队协作', '项目管理', '写作方法',
+    'python', 'django', 'mysql', 'redis', 'docker', 'api', '效率', '复盘', '目标', '习惯', '焦虑', '成长',
+]
+
+class Command(BaseCommand):
+    """对比全文索引与 icontains（LIKE '%kw%'）两种搜索方式的延迟"""
+
+    help = '基准测试：收藏搜索的索引查询 vs icontains 查询'
+
+    def add_arguments(self, parser):
+        parser.add_argument('queries', nargs='*', default=['机器学习', '情绪管理', 'python'], help='查询词')
+        parser.add_argument('--user', type=int, help='使用已有用户的收藏')
+        parser.add_argument('--seed', type=int, default=0, help='为临时用户生成指定条数的收藏，结束后删除')
+        parser.add_argument('--length', type=int, default=2000, help='生成收藏的正文字数')
+        parser.add_argument('--iterations', type=int, default=20, help='每个查询的重复次数')
+
+    def handle(self, *args, **options):
+        if not options['user'] and not options['seed']:
+            raise CommandError('请指定 --user 或 --seed')
+
+        user = None
+        try:
+            if options['seed']:
+                user = self._seed(options['seed'], options['length'])
+            else:
+                user = User.objects.get(id=options['user'])
+            self._run(user, options['queries'], options['iterations'])
+        finally:
+            if options['seed'] and user is not None:
+                user.delete()
+
+    def _filler(self, rng: random.Random, length: int) -> str:
+        """随机汉字组成的正文，每段插入少量词表中的词"""
+        parts = []
+        while sum(len(part) for part in parts) < length:
+            parts.append(''.join(chr(0x4e00 + rng.randrange(3000)) for _ in range(rng.randint(20, 60))))
+            if rng.random() < 0.1:
+                parts.append(rng.choice(VOCABULARY))
+        return '，'.join(parts)
+
+    def _seed(self, count: int, length: int) -> User:
+        """生成临时用户和收藏（bulk_create 不触发信号，写入后统一建索引）"""
+        user = User.objects.create(username=f"bench-{uuid.uuid4().hex[:12]}", openid=f"bench-{uuid.uuid4().hex}")
+        rng = random.Random(42)
+        with transaction.atomic():
+            Collection.objects.bulk_create([
+                Collection(
+                    user=user,
+                    title=' '.join(rng.sample(VOCABULARY, 2)),
+                    content=self._filler(rng, length),
+                    summary='、'.join(rng.sample(VOCABULARY, 3))
+                ) for _ in range(count)
+            ], batch_size=500)
+        start = time.perf_counter()
+        search_index.rebuild([user.id])
+        self.stdout.write(f"生成 {count} 条收藏并建立索引，耗时 {time.perf_counter() - start:.1f} 秒")
+        return user
+
+    def _run(self, user: User, queries, iterations: int) -> None:
+        queryset = Collection.objects.filter(user=user)
+        for query in queries:
+            start = time.perf_counter()
+            for _ in range(iterations):
+                like_ids = list(search_index.like_filter(queryset, query).values_list('id', flat=True))
+            like_ms = (time.perf_counter() - start) * 1000 / iterations
+
+            start = time.perf_counter()
+            for _ in range(iterations):
+                results = search_index.search(queryset, user, query, limit=20)
+            index_ms = (time.perf_counter() - start) * 1000 / iterations
+
+            if results is None:
+                self.stdout.write(f"{query}: 单字查询不走索引，icontains {like_ms:.2f} ms（{len(like_ids)} 条）")
+                continue
+            self.stdout.write(
+                f"{query}: icontains {like_ms:.2f} ms（{len(like_ids)} 条） | "
+                f"索引 {index_ms:.2f} ms（前 {len(results)} 条） | 提升约 {like_ms / index_ms:.1f} 倍"
+            )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from wxcloudrun.apps.collections.summary_store import invalidate, get_workflow_version
+
+class Command(BaseCommand):
+    """摘要工作流升级后清理旧版本的共享摘要"""
+
+    help = '删除非当前工作流版本（COZE_SUMMARY_WORKFLOW_VERSION）的共享摘要'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workflow-version', default=None, help='只删除指定版本的共享摘要（可以是当前版本）')
+
+    def handle(self, *args, **options):
+        deleted = invalidate(options['workflow_version'])
+        self.stdout.write(f"已删除 {deleted} 条共享摘要（当前版本 {get_workflow_version()}）")
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from wxcloudrun.apps.collections.embeddings import rebuild
+
+class Command(BaseCommand):
+    """按收藏内容重新计算本地向量（首次上线、批量导入或修改向量维度后执行）"""
+
+    help = '重新生成收藏向量 collection_embeddings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users', help='只处理指定用户，可重复')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        count = rebuild(options['users'], batch_size=options['batch_size'])
+        self.stdout.write(f"已计算 {count} 条收藏的向量")
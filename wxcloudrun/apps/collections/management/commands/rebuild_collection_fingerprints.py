@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from wxcloudrun.apps.collections.near_duplicates import rebuild
+
+class Command(BaseCommand):
+    """按收藏正文重新计算 SimHash 指纹（首次上线、批量导入或修改分词规则后执行）"""
+
+    help = '重新生成收藏近似重复指纹 collection_fingerprints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users', help='只处理指定用户，可重复')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        count = rebuild(options['users'], batch_size=options['batch_size'])
+        self.stdout.write(f"已计算 {count} 条收藏的指纹")
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from wxcloudrun.apps.collections.search_index import rebuild
+
+class Command(BaseCommand):
+    """按收藏内容重新生成全文索引（首次上线、批量导入或修改分词规则后执行）"""
+
+    help = '重新生成收藏全文索引 collection_search_postings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users', help='只处理指定用户，可重复')
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        count = rebuild(options['users'], batch_size=options['batch_size'])
+        self.stdout.write(f"已索引 {count} 条收藏")
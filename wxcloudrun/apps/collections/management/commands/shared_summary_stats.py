@@ -0,0 +1,48 @@
+import json
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Sum
+from wxcloudrun.apps.collections.models import SharedSummary
+from wxcloudrun.apps.collections.summary_store import get_workflow_version
+
+class Command(BaseCommand):
+    """共享摘要的去重命中率：每条共享摘要对应一次工作流调用，命中次数为省下的调用"""
+
+    help = '查看共享摘要的条数、命中次数与命中率（按工作流版本）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=10, help='列出命中次数最多的条目数')
+        parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+
+    def handle(self, *args, **options):
+        versions = []
+        for row in SharedSummary.objects.values('workflow_version').annotate(
+            entries=Count('id'), hits=Sum('hit_count')
+        ).order_by('workflow_version'):
+            hits = row['hits'] or 0
+            versions.append({
+                'version': row['workflow_version'],
+                'current': row['workflow_version'] == get_workflow_version(),
+                'entries': row['entries'],
+                'hits': hits,
+                'hit_rate': round(hits / (hits + row['entries']), 4)
+            })
+
+        top = list(SharedSummary.objects.filter(
+            workflow_version=get_workflow_version(), hit_count__gt=0
+        ).order_by('-hit_count').values('id', 'content_hash', 'hit_count', 'last_hit_at')[:options['top']])
+
+        if options['json']:
+            self.stdout.write(json.dumps({'versions': versions, 'top': top}, ensure_ascii=False, indent=2, default=str))
+            return
+
+        if not versions:
+            self.stdout.write('暂无共享摘要')
+            return
+        for item in versions:
+            mark = '*' if item['current'] else ' '
+            self.stdout.write(
+                f"{mark} 版本 {item['version']}: 摘要 {item['entries']} 条，命中 {item['hits']} 次，"
+                f"命中率 {item['hit_rate']:.2%}"
+            )
+        for item in top:
+            self.stdout.write(f"  #{item['id']} {item['content_hash'][:12]} 命中 {item['hit_count']} 次")
@@ -1,7 +1,8 @@
 from django.db import models
 from wxcloudrun.apps.users.models import User
+from wxcloudrun.apps.jobs.models import EnrichableModel
 
-class Collection(models.Model):
+class Collection(EnrichableModel):
     """智能收藏模型"""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='collections', verbose_name='用户')
     title = models.CharField('标题', max_length=256)
@@ -17,6 +18,121 @@ class Collection(models.Model):
         ordering = ['-created_at']
         verbose_name = '智能收藏'
         verbose_name_plural = verbose_name
+        # 游标分页按 (created_at, id) 定位
+        indexes = [models.Index(fields=['user', 'created_at', 'id'], name='collections_user_created')]
 
     def __str__(self):
-        return f"{self.user.username} - {self.title}" 
\ No newline at end of file
+        return f"{self.user.username} - {self.title}"
+
+class Tag(models.Model):
+    """用户的标签，count 为使用该标签的收藏数，随收藏的标签变化在同一事务中增减"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='collection_tags', verbose_name='用户')
+    name = models.CharField('名称', max_length=64)
+    count = models.IntegerField('收藏数', default=0)
+    created_at = models.DateTimeField('创建时间', auto_now_add=True)
+
+    class Meta:
+        db_table = 'collection_tag_names'
+        verbose_name = '标签'
+        verbose_name_plural = verbose_name
+        unique_together = [('user', 'name')]
+        # 标签云按使用次数排序
+        indexes = [models.Index(fields=['user', 'count'], name='collection_tags_user_count')]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.name} - {self.count}"
+
+class CollectionTag(models.Model):
+    """收藏与标签的关联"""
+    collection = models.ForeignKey(Collection, on_delete=models.CASCADE, related_name='tag_links', verbose_name='收藏')
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='collection_links', verbose_name='标签')
+
+    class Meta:
+        db_table = 'collection_tags'
+        verbose_name = '收藏标签'
+        verbose_name_plural = verbose_name
+        unique_together = [('collection', 'tag')]  # 按标签筛选使用 tag 外键上的索引
+
+class SharedSummary(models.Model):
+    """跨用户共享的摘要：同一链接或同一内容只调用一次摘要工作流"""
+    url_hash = models.CharField('规范化链接哈希', max_length=64, blank=True, default='', db_index=True)
+    content_hash = models.CharField('规范化内容哈希', max_length=64)
+    workflow_version = models.CharField('摘要工作流版本', max_length=32)
+    summary = models.TextField('AI摘要', blank=True, default='')
+    tags = models.JSONField('标签', default=list)
+    keywords = models.JSONField('关键词', default=list)
+    hit_count = models.IntegerField('命中次数', default=0)
+    last_hit_at = models.DateTimeField('最近命中时间', null=True, blank=True)
+    created_at = models.DateTimeField('创建时间', auto_now_add=True)
+
+    class Meta:
+        db_table = 'shared_summaries'
+        verbose_name = '共享摘要'
+        verbose_name_plural = verbose_name
+        unique_together = [('content_hash', 'workflow_version')]
+
+    def __str__(self):
+        return f"{self.content_hash[:12]}@{self.workflow_version} - {self.hit_count}"
+
+class CollectionSearchDocument(models.Model):
+    """全文索引中的文档：每条收藏一行，记录加权后的词数（BM25 的文档长度）"""
+    collection = models.OneToOneField(Collection, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    length = models.IntegerField('加权词数', default=0)
+    indexed_at = models.DateTimeField('索引时间', auto_now=True)
+
+    class Meta:
+        db_table = 'collection_search_documents'
+        verbose_name = '收藏索引文档'
+        verbose_name_plural = verbose_name
+
+class CollectionSearchPosting(models.Model):
+    """倒排表：(用户, 词) -> 收藏及加权词频"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    term = models.CharField('词', max_length=64)
+    collection = models.ForeignKey(Collection, on_delete=models.CASCADE, related_name='search_postings')
+    tf = models.IntegerField('加权词频')
+
+    class Meta:
+        db_table = 'collection_search_postings'
+        verbose_name = '收藏倒排索引'
+        verbose_name_plural = verbose_name
+        unique_together = [('collection', 'term')]
+        indexes = [models.Index(fields=['user', 'term'], name='collection_postings_term')]
+
+class CollectionFingerprint(models.Model):
+    """正文的 64 位 SimHash，拆成 4 段 16 位分别建索引：海明距离不超过 3 的两条收藏至少有一段完全相同"""
+    collection = models.OneToOneField(Collection, on_delete=models.CASCADE, primary_key=True, related_name='fingerprint')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    simhash = models.BigIntegerField('SimHash')  # 以有符号整数保存的 64 位指纹
+    band0 = models.IntegerField()
+    band1 = models.IntegerField()
+    band2 = models.IntegerField()
+    band3 = models.IntegerField()
+    duplicate_of = models.ForeignKey(
+        Collection, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name='近似重复的收藏'
+    )
+    updated_at = models.DateTimeField('更新时间', auto_now=True)
+
+    class Meta:
+        db_table = 'collection_fingerprints'
+        verbose_name = '收藏指纹'
+        verbose_name_plural = verbose_name
+        indexes = [
+            models.Index(fields=['user', f'band{band}'], name=f'collection_fp_band{band}')
+            for band in range(4)
+        ]
+
+class CollectionEmbedding(models.Model):
+    """收藏的本地向量（float32 字节串），按用户拼成矩阵做余弦相似度检索"""
+    collection = models.OneToOneField(Collection, on_delete=models.CASCADE, primary_key=True, related_name='embedding')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    vector = models.BinaryField('向量')
+    updated_at = models.DateTimeField('更新时间', auto_now=True)
+
+    class Meta:
+        db_table = 'collection_embeddings'
+        verbose_name = '收藏向量'
+        verbose_name_plural = verbose_name
+        # 按 (条数, 最近更新时间) 判断用户的向量矩阵是否需要同步，并按更新时间读取变化的行
+        indexes = [models.Index(fields=['user', 'updated_at'], name='collection_embeddings_user')]
@@ -0,0 +1,125 @@
+import hashlib
+import logging
+from collections import Counter
+from typing import List, Optional, Tuple
+import numpy as np
+from django.conf import settings
+from django.db.models import Q
+from .models import Collection, CollectionFingerprint
+from .search_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+BITS = 64
+BANDS = 4
+BAND_BITS = BITS // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+SHIFTS = np.arange(BITS, dtype=np.uint64)
+
+def _feature_hash(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'little')
+
+def simhash(content: Optional[str]) -> Optional[int]:
+    """正文的 64 位 SimHash（特征为全文索引的分词结果，按词频加权），特征过少时返回 None"""
+    counts = Counter(tokenize(content))
+    if len(counts) < getattr(settings, 'COLLECTION_SIMHASH_MIN_FEATURES', 16):
+        return None
+    hashes = np.array([_feature_hash(feature) for feature in counts], dtype=np.uint64)
+    weights = np.array(list(counts.values()), dtype=np.int64)
+    bits = ((hashes[:, None] >> SHIFTS) & np.uint64(1)).astype(np.int64)
+    votes = weights @ (2 * bits - 1)
+    return sum(1 << int(bit) for bit in np.flatnonzero(votes > 0))
+
+def bands(value: int) -> List[int]:
+    return [(value >> (band * BAND_BITS)) & BAND_MASK for band in range(BANDS)]
+
+def distance(a: int, b: int) -> int:
+    """海明距离"""
+    return bin(a ^ b).count('1')
+
+def _to_signed(value: int) -> int:
+    return value - (1 << BITS) if value >= 1 << (BITS - 1) else value
+
+def _to_unsigned(value: int) -> int:
+    return value + (1 << BITS) if value < 0 else value
+
+def candidates(user_id: int, value: int, exclude_id: Optional[int] = None, max_distance: Optional[int] = None) -> List[Tuple[int, int]]:
+    """与指纹至少有一段相同的收藏，按海明距离排序返回 [(收藏 ID, 距离)]
+
+    只通过 (user, band) 索引查找分段相同的候选，不扫描用户的全部收藏。距离不超过 3 的
+    收藏一定能找到，距离更大的收藏只要有一段相同也会被找到（距离越小概率越高）。
+    """
+    if max_distance is None:
+        max_distance = getattr(settings, 'COLLECTION_SIMILAR_DISTANCE', 16)
+    query = Q()
+    for band, band_value in enumerate(bands(value)):
+        query |= Q(**{f'band{band}': band_value})
+    rows = CollectionFingerprint.objects.filter(query, user_id=user_id)
+    if exclude_id is not None:
+        rows = rows.exclude(collection_id=exclude_id)
+
+    found = []
+    for collection_id, stored in rows.values_list('collection_id', 'simhash'):
+        d = distance(value, _to_unsigned(stored))
+        if d <= max_distance:
+            found.append((collection_id, d))
+    return sorted(found, key=lambda item: (item[1], -item[0]))
+
+def index_fingerprint(collection: Collection) -> Optional[CollectionFingerprint]:
+    """计算并保存收藏的指纹，记录最接近的近似重复收藏"""
+    value = simhash(collection.content)
+    if value is None:
+        CollectionFingerprint.objects.filter(collection_id=collection.id).delete()
+        return None
+    nearest = candidates(
+        collection.user_id, value, exclude_id=collection.id,
+        max_distance=getattr(settings, 'COLLECTION_DUPLICATE_DISTANCE', 6)
+    )
+    fingerprint, _ = CollectionFingerprint.objects.update_or_create(
+        collection_id=collection.id,
+        defaults={
+            'user_id': collection.user_id,
+            'simhash': _to_signed(value),
+            'duplicate_of_id': nearest[0][0] if nearest else None,
+            **{f'band{band}': band_value for band, band_value in enumerate(bands(value))}
+        }
+    )
+    return fingerprint
+
+def find_enriched_duplicate(collection: Collection) -> Optional[Collection]:
+    """同一用户已生成摘要的近似重复收藏（海明距离不超过 COLLECTION_DUPLICATE_DISTANCE，无关正文的距离约为 32）"""
+    fingerprint = CollectionFingerprint.objects.filter(collection_id=collection.id).first()
+    if fingerprint is None or fingerprint.duplicate_of_id is None:
+        return None
+    nearest = candidates(
+        collection.user_id, _to_unsigned(fingerprint.simhash), exclude_id=collection.id,
+        max_distance=getattr(settings, 'COLLECTION_DUPLICATE_DISTANCE', 6)
+    )
+    enriched = Collection.objects.filter(
+        id__in=[collection_id for collection_id, _ in nearest],
+        enrich_status=Collection.ENRICH_DONE
+    ).exclude(summary__isnull=True).exclude(summary='').in_bulk()
+    for collection_id, _ in nearest:
+        if collection_id in enriched:
+            return enriched[collection_id]
+    return None
+
+def similar(collection: Collection, limit: int = 10) -> List[Tuple[Collection, int]]:
+    """与收藏相似的其他收藏及海明距离"""
+    fingerprint = CollectionFingerprint.objects.filter(collection_id=collection.id).first()
+    if fingerprint is None:
+        return []
+    nearest = candidates(collection.user_id, _to_unsigned(fingerprint.simhash), exclude_id=collection.id)[:limit]
+    collections = Collection.objects.in_bulk([collection_id for collection_id, _ in nearest])
+    return [(collections[collection_id], d) for collection_id, d in nearest if collection_id in collections]
+
+def rebuild(user_ids: Optional[List[int]] = None, batch_size: int = 500) -> int:
+    """重新计算全部或指定用户的指纹，返回处理的收藏数"""
+    collections = Collection.objects.all()
+    if user_ids is not None:
+        collections = collections.filter(user_id__in=user_ids)
+    count = 0
+    for collection in collections.only('id', 'user_id', 'content').order_by('id').iterator(chunk_size=batch_size):
+        index_fingerprint(collection)
+        count += 1
+    return count
@@ -0,0 +1,206 @@
+import re
+import math
+import logging
+import unicodedata
+from collections import Counter
+from typing import Dict, Any, List, Optional
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, Avg, Count
+from django.utils.html import escape
+from .models import Collection, CollectionSearchDocument, CollectionSearchPosting
+
+logger = logging.getLogger(__name__)
+
+# 中日韩文字连续片段（切分为二元组）与字母数字词
+CJK = r'\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af'
+TOKEN = re.compile(rf'[{CJK}]+|[0-9a-z]+')
+CJK_RUN = re.compile(rf'[{CJK}]+')
+MAX_TERM_LENGTH = 64
+
+# 字段权重：标题中的词比正文中的词更重要
+FIELD_WEIGHTS = (('title', 3), ('summary', 2), ('content', 1))
+
+# BM25 参数
+K1 = 1.2
+B = 0.75
+
+def normalize(text: Optional[str]) -> str:
+    """全角转半角、统一小写"""
+    return unicodedata.normalize('NFKC', text or '').lower()
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """中日韩文字按相邻二字切分（单字片段保留单字），字母数字按词切分"""
+    terms = []
+    for match in TOKEN.finditer(normalize(text)):
+        run = match.group()
+        if CJK_RUN.fullmatch(run):
+            if len(run) == 1:
+                terms.append(run)
+            else:
+                terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            terms.append(run[:MAX_TERM_LENGTH])
+    return terms
+
+def query_terms(query: str) -> List[str]:
+    """查询词去重；索引中只有二元组，单个汉字只在没有其他词时保留（此时退回 LIKE 查询）"""
+    terms = list(dict.fromkeys(tokenize(query)))
+    longer = [term for term in terms if not (len(term) == 1 and CJK_RUN.fullmatch(term))]
+    return (longer or terms)[:getattr(settings, 'SEARCH_MAX_QUERY_TERMS', 16)]
+
+def document_terms(collection: Collection) -> Counter:
+    """收藏的加权词频，正文只索引前 SEARCH_INDEX_MAX_CHARS 个字符"""
+    max_chars = getattr(settings, 'SEARCH_INDEX_MAX_CHARS', 50000)
+    counts: Counter = Counter()
+    for field, weight in FIELD_WEIGHTS:
+        for term in tokenize((getattr(collection, field) or '')[:max_chars]):
+            counts[term] += weight
+    return counts
+
+def index_collection(collection: Collection) -> None:
+    """更新一条收藏的索引：只删除和写入有变化的词"""
+    counts = document_terms(collection)
+    with transaction.atomic():
+        existing = dict(CollectionSearchPosting.objects.filter(
+            collection_id=collection.id
+        ).values_list('term', 'tf'))
+        stale = [term for term, tf in existing.items() if counts.get(term) != tf]
+        if stale:
+            CollectionSearchPosting.objects.filter(collection_id=collection.id, term__in=stale).delete()
+        CollectionSearchPosting.objects.bulk_create([
+            CollectionSearchPosting(user_id=collection.user_id, term=term, collection_id=collection.id, tf=tf)
+            for term, tf in counts.items() if existing.get(term) != tf
+        ], batch_size=1000)
+        CollectionSearchDocument.objects.update_or_create(
+            collection_id=collection.id,
+            defaults={'user_id': collection.user_id, 'length': sum(counts.values())}
+        )
+
+def reindex(collection_id: int) -> None:
+    """按 ID 重新索引（用于 QuerySet.update() 写入摘要之后，update() 不触发信号）"""
+    collection = Collection.objects.filter(id=collection_id).first()
+    if collection is not None:
+        index_collection(collection)
+
+def _write_batch(collections: List[Collection]) -> None:
+    """整批重建索引：每批一次删除、一次批量写入"""
+    ids = [collection.id for collection in collections]
+    postings, documents = [], []
+    for collection in collections:
+        counts = document_terms(collection)
+        postings.extend(
+            CollectionSearchPosting(user_id=collection.user_id, term=term, collection_id=collection.id, tf=tf)
+            for term, tf in counts.items()
+        )
+        documents.append(CollectionSearchDocument(
+            collection_id=collection.id, user_id=collection.user_id, length=sum(counts.values())
+        ))
+    with transaction.atomic():
+        CollectionSearchPosting.objects.filter(collection_id__in=ids).delete()
+        CollectionSearchDocument.objects.filter(collection_id__in=ids).delete()
+        CollectionSearchPosting.objects.bulk_create(postings, batch_size=1000)
+        CollectionSearchDocument.objects.bulk_create(documents, batch_size=1000)
+
+def rebuild(user_ids: Optional[List[int]] = None, batch_size: int = 100) -> int:
+    """重新生成全部或指定用户的索引，返回索引的收藏数"""
+    collections = Collection.objects.all()
+    if user_ids is not None:
+        collections = collections.filter(user_id__in=user_ids)
+    count = 0
+    batch: List[Collection] = []
+    for collection in collections.only('id', 'user_id', 'title', 'summary', 'content').iterator(chunk_size=batch_size):
+        batch.append(collection)
+        if len(batch) >= batch_size:
+            _write_batch(batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        _write_batch(batch)
+        count += len(batch)
+    return count
+
+def like_filter(queryset, keyword: str):
+    """未使用索引的搜索：标题、正文、摘要的 LIKE '%keyword%'"""
+    return queryset.filter(
+        Q(title__icontains=keyword) |
+        Q(content__icontains=keyword) |
+        Q(summary__icontains=keyword)
+    )
+
+def _highlight_pattern(query: str, terms: List[str]):
+    """高亮整个查询词优先，其次是各个二元组"""
+    needles = {word for word in normalize(query).split() if word} | set(terms)
+    return re.compile('|'.join(re.escape(needle) for needle in sorted(needles, key=len, reverse=True)), re.IGNORECASE)
+
+def _mark(text: str, pattern) -> str:
+    parts, last = [], 0
+    for match in pattern.finditer(text):
+        parts.append(escape(text[last:match.start()]))
+        parts.append(f"<em>{escape(match.group())}</em>")
+        last = match.end()
+    parts.append(escape(text[last:]))
+    return ''.join(parts)
+
+def snippet(text: Optional[str], pattern, width: int) -> Optional[str]:
+    """截取第一个命中位置附近 width 个字符，命中词用 <em> 标出（其余内容已转义）"""
+    text = re.sub(r'\s+', ' ', text or '').strip()
+    match = pattern.search(text)
+    if match is None:
+        return None
+    start = max(0, min(match.start() - width // 4, len(text) - width))
+    end = min(len(text), start + width)
+    return ('…' if start > 0 else '') + _mark(text[start:end], pattern) + ('…' if end < len(text) else '')
+
+def search(queryset, user, query: str, limit: int = 20) -> Optional[List[Dict[str, Any]]]:
+    """BM25 排序的全文检索，要求文档包含全部查询词；无法使用索引时返回 None（由调用方退回 LIKE 查询）
+
+    queryset 用于附加过滤条件（如标签），只返回其中的收藏。
+    """
+    terms = query_terms(query)
+    if not terms or all(len(term) == 1 and CJK_RUN.fullmatch(term) for term in terms):
+        return None
+
+    matched: Dict[int, Dict[str, int]] = {}
+    for collection_id, term, tf in CollectionSearchPosting.objects.filter(
+        user=user, term__in=terms
+    ).values_list('collection_id', 'term', 'tf'):
+        matched.setdefault(collection_id, {})[term] = tf
+    candidates = [collection_id for collection_id, found in matched.items() if len(found) == len(terms)]
+    if not candidates:
+        return []
+
+    df = Counter(term for found in matched.values() for term in found)
+    stats = CollectionSearchDocument.objects.filter(user=user).aggregate(total=Count('pk'), avg_length=Avg('length'))
+    total, avg_length = stats['total'], stats['avg_length'] or 1
+    lengths = dict(CollectionSearchDocument.objects.filter(
+        collection_id__in=candidates
+    ).values_list('collection_id', 'length'))
+
+    scores = {}
+    for collection_id in candidates:
+        norm = K1 * (1 - B + B * lengths.get(collection_id, avg_length) / avg_length)
+        scores[collection_id] = sum(
+            math.log(1 + (total - df[term] + 0.5) / (df[term] + 0.5)) * tf * (K1 + 1) / (tf + norm)
+            for term, tf in matched[collection_id].items()
+        )
+
+    ranked = sorted(candidates, key=lambda collection_id: (-scores[collection_id], -collection_id))
+    allowed = set(queryset.filter(id__in=ranked).values_list('id', flat=True))
+    top = [collection_id for collection_id in ranked if collection_id in allowed][:limit]
+    collections = queryset.in_bulk(top)
+
+    pattern = _highlight_pattern(query, terms)
+    width = getattr(settings, 'SEARCH_SNIPPET_CHARS', 120)
+    results = []
+    for collection_id in top:
+        collection = collections[collection_id]
+        results.append({
+            'collection': collection,
+            'score': round(scores[collection_id], 4),
+            'highlight': {
+                'title': _mark(collection.title, pattern),
+                'snippet': snippet(collection.content, pattern, width) or snippet(collection.summary, pattern, width)
+            }
+        })
+    return results
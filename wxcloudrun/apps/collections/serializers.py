@@ -7,8 +7,8 @@ class CollectionSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Collection
-        fields = ['id', 'title', 'content', 'url', 'summary', 'tags', 'tags_list', 'created_at']
-        read_only_fields = ['id', 'summary', 'tags', 'created_at']
+        fields = ['id', 'title', 'content', 'url', 'summary', 'tags', 'tags_list', 'enrich_status', 'enriched_at', 'created_at']
+        read_only_fields = ['id', 'summary', 'tags', 'enrich_status', 'enriched_at', 'created_at']
 
     def get_tags_list(self, obj):
         """将tags字符串转换为列表"""
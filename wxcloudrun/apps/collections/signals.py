@@ -0,0 +1,30 @@
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+from .models import Collection
+from . import search_index, tags, near_duplicates
+
+# 索引、指纹、标签关联和计数在保存收藏的事务中更新（视图的 perform_create / perform_update 带 transaction.atomic，
+# 其他调用方需自行包在事务中，否则接收函数失败时收藏已提交而索引和计数未更新）；删除收藏时倒排记录、指纹和标签关联随外键级联删除
+# 注意：QuerySet.update()、bulk_create() 不触发信号，写入后需调用 search_index.reindex / tags.sync_tags，或执行 rebuild_search_index / backfill_collection_tags
+
+@receiver(post_save, sender=Collection)
+def update_search_index(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not {'title', 'content', 'summary'} & set(update_fields):
+        return
+    search_index.index_collection(instance)
+
+@receiver(post_save, sender=Collection)
+def update_fingerprint(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'content' not in update_fields:
+        return
+    near_duplicates.index_fingerprint(instance)
+
+@receiver(post_save, sender=Collection)
+def update_tags(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'tags' not in update_fields:
+        return
+    tags.sync_tags(instance)
+
+@receiver(pre_delete, sender=Collection)
+def release_tags(sender, instance, **kwargs):
+    tags.release_tags(instance)
@@ -0,0 +1,138 @@
+import re
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+from django.conf import settings
+from django.core.cache import cache
+from wxcloudrun.apps.core.services.ai_service import AIService
+from wxcloudrun.apps.core.services.quota import get_quota_engine
+from .summary_store import get_workflow_version
+
+logger = logging.getLogger(__name__)
+
+PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+# 句末标点（保留在句子末尾）或换行
+SENTENCE_END = re.compile(r'(?<=[。！？!?；;…])|(?<=\.)\s|\n')
+
+def _split_sentences(paragraph: str, max_chars: int) -> List[str]:
+    """按句子切分超长段落，单句仍超长时按长度硬切"""
+    pieces = []
+    for sentence in SENTENCE_END.split(paragraph):
+        if not sentence or not sentence.strip():
+            continue
+        while len(sentence) > max_chars:
+            pieces.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        pieces.append(sentence)
+    return pieces
+
+def _is_anchor(unit: str) -> bool:
+    """由内容决定的切分点：编辑只影响所在的块，后面的块边界不随之移动"""
+    return hashlib.md5(unit.encode('utf-8')).digest()[0] % 4 == 0
+
+def split_content(content: str, max_chars: int) -> List[str]:
+    """在段落和句子边界切分正文，每块不超过 max_chars 个字符
+
+    块长度超过一半后遇到锚点段落/句子即结束当前块，使切分点由内容决定，
+    编辑正文时未改动部分切出的块保持不变，可以复用块摘要缓存。
+    """
+    chunks: List[str] = []
+    current = ''
+    for paragraph in PARAGRAPH_BREAK.split(content or ''):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        units = [paragraph] if len(paragraph) <= max_chars else _split_sentences(paragraph, max_chars)
+        for position, unit in enumerate(units):
+            separator = '\n\n' if current and position == 0 else ''
+            if current and len(current) + len(separator) + len(unit) > max_chars:
+                chunks.append(current)
+                current, separator = '', ''
+            current += separator + unit
+            if len(current) >= max_chars // 2 and _is_anchor(unit):
+                chunks.append(current)
+                current = ''
+    if current:
+        chunks.append(current)
+    return chunks
+
+def _merge_terms(primary: List[str], partials: List[Dict[str, Any]], field: str, limit: int) -> List[str]:
+    """合并标签/关键词：先取归并结果，再按各块中出现的次数补充"""
+    counts: Dict[str, int] = {}
+    for partial in partials:
+        for term in partial.get(field, []):
+            counts[term] = counts.get(term, 0) + 1
+    merged = []
+    for term in list(primary) + sorted(counts, key=lambda t: -counts[t]):
+        term = term.strip()
+        if term and term not in merged:
+            merged.append(term)
+    return merged[:limit]
+
+class ChunkedSummarizer:
+    """长文本摘要：切块后并发摘要（map），再把各块摘要归并为最终摘要和标签（reduce）"""
+
+    def __init__(self, user):
+        self.user = user
+        self.max_chars = getattr(settings, 'AI_SUMMARY_CHUNK_CHARS', 4000)
+        self.concurrency = getattr(settings, 'AI_SUMMARY_CHUNK_CONCURRENCY', 4)
+        self.cache_ttl = getattr(settings, 'AI_SUMMARY_CHUNK_CACHE_TTL', 7 * 24 * 3600)
+        self.max_tags = getattr(settings, 'AI_SUMMARY_MAX_TAGS', 10)
+        self.max_depth = getattr(settings, 'AI_SUMMARY_MAX_DEPTH', 3)
+
+    def summarize(self, title: str, content: str, url: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """返回 {'summary', 'tags', 'keywords'}，失败时返回 None（已完成的块摘要保留在缓存中）
+
+        整篇只预占一次调用额度，各块和归并调用不再单独预占；失败时退还，重试不会多占额度。
+        额度用尽时抛出 QuotaExceededError。
+        """
+        reservation = get_quota_engine().reserve(self.user.id) if self.user is not None else None
+        result = None
+        try:
+            result = self._summarize(title, content, url, depth=0)
+        finally:
+            if result is None and reservation is not None:
+                reservation.refund()
+        return result
+
+    def _summarize(self, title: str, content: str, url: Optional[str], depth: int) -> Optional[Dict[str, Any]]:
+        if len(content or '') <= self.max_chars or depth >= self.max_depth:
+            return AIService(self.user).generate_summary(title, content, url, reserve=False)
+
+        chunks = split_content(content, self.max_chars)
+        logger.info(f"长文本摘要: {len(content)} 字符切分为 {len(chunks)} 块（第 {depth + 1} 层）")
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(chunks))) as executor:
+            partials = list(executor.map(
+                lambda item: self._summarize_chunk(title, item[1], url, item[0], len(chunks)),
+                enumerate(chunks, 1)
+            ))
+        if any(partial is None for partial in partials):
+            return None
+
+        # 各块摘要拼接后仍然过长时继续逐层归并
+        combined = '\n\n'.join(partial.get('summary', '') for partial in partials)
+        reduced = self._summarize(title, combined, url, depth + 1)
+        if reduced is None:
+            return None
+        return {
+            'summary': reduced.get('summary', ''),
+            'tags': _merge_terms(reduced.get('tags', []), partials, 'tags', self.max_tags),
+            'keywords': _merge_terms(reduced.get('keywords', []), partials, 'keywords', self.max_tags)
+        }
+
+    def _chunk_key(self, chunk: str) -> str:
+        digest = hashlib.sha256(chunk.encode('utf-8')).hexdigest()
+        return f"collections:chunk_summary:{get_workflow_version()}:{digest}"
+
+    def _summarize_chunk(self, title: str, chunk: str, url: Optional[str], index: int, total: int) -> Optional[Dict[str, Any]]:
+        """单块摘要，按块内容缓存：编辑正文后只有改动过的块重新调用工作流"""
+        key = self._chunk_key(chunk)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+        result = AIService(self.user).generate_summary(f"{title}（第{index}/{total}部分）", chunk, url, reserve=False)
+        if result is not None:
+            cache.set(key, result, self.cache_ttl)
+        return result
@@ -0,0 +1,92 @@
+import re
+import hashlib
+import unicodedata
+import logging
+from typing import Dict, Any, Optional
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import SharedSummary
+
+logger = logging.getLogger(__name__)
+
+# 不影响页面内容的跟踪参数
+TRACKING_PARAMS = {'spm', 'from', 'scene', 'share', 'share_source', 'share_token', 'chksm', 'sessionid', 'clicktime', 'enterid'}
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+def get_workflow_version() -> str:
+    """摘要工作流版本，变更后旧版本的共享摘要不再命中"""
+    return str(getattr(settings, 'COZE_SUMMARY_WORKFLOW_VERSION', '1'))
+
+def canonical_url(url: Optional[str]) -> str:
+    """规范化链接：小写协议和域名，去掉默认端口、锚点、跟踪参数和末尾斜杠，参数排序"""
+    if not url:
+        return ''
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith('utm_')
+    )
+    path = parts.path.rstrip('/') or '/'
+    return urlunsplit((scheme, host, path, urlencode(query), ''))
+
+def normalize_content(content: str) -> str:
+    """规范化正文：全角转半角、小写、合并空白"""
+    text = unicodedata.normalize('NFKC', content or '')
+    return re.sub(r'\s+', ' ', text).strip().lower()
+
+def _hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def summary_keys(url: Optional[str], content: str) -> Dict[str, str]:
+    link = canonical_url(url)
+    return {
+        'url_hash': _hash(link) if link else '',
+        'content_hash': _hash(normalize_content(content))
+    }
+
+def lookup(url: Optional[str], content: str, match_url: bool = True) -> Optional[Dict[str, Any]]:
+    """按链接或内容查找当前工作流版本的共享摘要，命中时累加命中次数
+
+    match_url 为 False 时只按内容查找：用户编辑过正文的收藏链接不变，按链接会命中旧正文的摘要。
+    """
+    keys = summary_keys(url, content)
+    condition = Q(content_hash=keys['content_hash'])
+    if match_url and keys['url_hash']:
+        condition |= Q(url_hash=keys['url_hash'])
+    entry = SharedSummary.objects.filter(condition, workflow_version=get_workflow_version()).order_by('-id').first()
+    if entry is None:
+        return None
+
+    SharedSummary.objects.filter(id=entry.id).update(hit_count=F('hit_count') + 1, last_hit_at=timezone.now())
+    return {'summary': entry.summary, 'tags': entry.tags, 'keywords': entry.keywords}
+
+def save(url: Optional[str], content: str, analysis: Dict[str, Any]) -> None:
+    """保存工作流生成的摘要；并发生成同一内容时保留先写入的一条"""
+    try:
+        with transaction.atomic():
+            SharedSummary.objects.create(
+                workflow_version=get_workflow_version(),
+                summary=analysis.get('summary', ''),
+                tags=list(analysis.get('tags', [])),
+                keywords=list(analysis.get('keywords', [])),
+                **summary_keys(url, content)
+            )
+    except IntegrityError:
+        logger.info('共享摘要已存在，忽略本次写入')
+
+def invalidate(version: Optional[str] = None) -> int:
+    """删除共享摘要：指定版本时只删除该版本，否则删除所有非当前版本，返回删除的条数"""
+    queryset = SharedSummary.objects.all()
+    if version is None:
+        queryset = queryset.exclude(workflow_version=get_workflow_version())
+    else:
+        queryset = queryset.filter(workflow_version=version)
+    deleted, _ = queryset.delete()
+    return deleted
@@ -0,0 +1,126 @@
+import re
+import logging
+from typing import Dict, List, Optional, Tuple
+from django.db import transaction, IntegrityError
+from django.db.models import F, Q, Count
+from .models import Collection, Tag, CollectionTag
+
+logger = logging.getLogger(__name__)
+
+SEPARATORS = re.compile(r'[,，、;；]')
+MAX_TAG_LENGTH = 64
+
+def tag_key(name: str) -> str:
+    """标签的比较键：忽略大小写（MySQL 的 utf8mb4 排序规则下 AI 与 ai 是同一个标签）"""
+    return name.casefold()
+
+def parse_tags(value: Optional[str]) -> List[str]:
+    """拆分逗号分隔的标签字符串，去掉空白和重复项（不区分大小写，保留第一次出现的写法）"""
+    names, seen = [], set()
+    for name in SEPARATORS.split(value or ''):
+        name = name.strip()[:MAX_TAG_LENGTH]
+        if name and tag_key(name) not in seen:
+            seen.add(tag_key(name))
+            names.append(name)
+    return names
+
+def _find_tags(user_id: int, names: List[str]):
+    condition = Q()
+    for name in names:
+        condition |= Q(name__iexact=name)
+    return Tag.objects.filter(condition, user_id=user_id).order_by('id')
+
+def _get_tags(user_id: int, names: List[str]) -> Dict[str, Tag]:
+    """按名称获取用户的标签（不区分大小写），不存在的创建；返回 {比较键: 标签}"""
+    tags: Dict[str, Tag] = {}
+    for tag in _find_tags(user_id, names):
+        tags.setdefault(tag_key(tag.name), tag)
+    for name in names:
+        if tag_key(name) in tags:
+            continue
+        try:
+            with transaction.atomic():
+                tags[tag_key(name)] = Tag.objects.create(user_id=user_id, name=name)
+        except IntegrityError:
+            # 并发创建了同名标签
+            tags[tag_key(name)] = _find_tags(user_id, [name]).first()
+    return tags
+
+def sync_tags(collection: Collection, names: Optional[List[str]] = None) -> None:
+    """让收藏的标签关联与 tags 字段一致，并增减对应标签的计数"""
+    names = parse_tags(collection.tags) if names is None else parse_tags(','.join(names))
+    with transaction.atomic():
+        current = {
+            tag_key(name): tag_id
+            for name, tag_id in CollectionTag.objects.filter(collection_id=collection.id).values_list('tag__name', 'tag_id')
+        }
+        keys = {tag_key(name) for name in names}
+        removed = [tag_id for key, tag_id in current.items() if key not in keys]
+        added = [name for name in names if tag_key(name) not in current]
+        if removed:
+            CollectionTag.objects.filter(collection_id=collection.id, tag_id__in=removed).delete()
+            Tag.objects.filter(id__in=removed).update(count=F('count') - 1)
+        if added:
+            tags = _get_tags(collection.user_id, added)
+            tag_ids = list(dict.fromkeys(tags[tag_key(name)].id for name in added))
+            CollectionTag.objects.bulk_create([CollectionTag(collection_id=collection.id, tag_id=tag_id) for tag_id in tag_ids])
+            Tag.objects.filter(id__in=tag_ids).update(count=F('count') + 1)
+
+def release_tags(collection: Collection) -> None:
+    """删除收藏前减少其标签的计数（关联随外键级联删除）"""
+    tag_ids = list(CollectionTag.objects.filter(collection_id=collection.id).values_list('tag_id', flat=True))
+    if tag_ids:
+        Tag.objects.filter(id__in=tag_ids).update(count=F('count') - 1)
+
+def tag_cloud(user) -> List[Dict[str, int]]:
+    """标签及使用次数，按次数降序（一次索引查询）"""
+    return [
+        {'tag': name, 'count': count}
+        for name, count in Tag.objects.filter(user=user, count__gt=0).order_by('-count', 'name').values_list('name', 'count')
+    ]
+
+def filter_by_tag(queryset, user, name: str):
+    """按标签精确筛选收藏（不再匹配标签的子串）"""
+    tag = _find_tags(user.id, [name.strip()]).first()
+    if tag is None:
+        return queryset.none()
+    return queryset.filter(tag_links__tag=tag)
+
+def rebuild(user_ids: Optional[List[int]] = None, batch_size: int = 500) -> int:
+    """按 tags 字段重新生成标签关联和计数，返回处理的收藏数"""
+    collections = Collection.objects.exclude(tags__isnull=True).exclude(tags='')
+    links = CollectionTag.objects.all()
+    tags = Tag.objects.all()
+    if user_ids is not None:
+        collections = collections.filter(user_id__in=user_ids)
+        links = links.filter(collection__user_id__in=user_ids)
+        tags = tags.filter(user_id__in=user_ids)
+
+    count = 0
+    with transaction.atomic():
+        links.delete()
+        new_links = []
+        known: Dict[Tuple[int, str], int] = {}  # (用户, 标签比较键) -> 标签 ID
+        for collection in collections.only('id', 'user_id', 'tags').iterator(chunk_size=batch_size):
+            names = parse_tags(collection.tags)
+            missing = [name for name in names if (collection.user_id, tag_key(name)) not in known]
+            if missing:
+                for key, tag in _get_tags(collection.user_id, missing).items():
+                    known[(collection.user_id, key)] = tag.id
+            tag_ids = dict.fromkeys(known[(collection.user_id, tag_key(name))] for name in names)
+            new_links.extend(CollectionTag(collection_id=collection.id, tag_id=tag_id) for tag_id in tag_ids)
+            count += 1
+            if len(new_links) >= batch_size:
+                CollectionTag.objects.bulk_create(new_links, batch_size=batch_size)
+                new_links = []
+        CollectionTag.objects.bulk_create(new_links, batch_size=batch_size)
+
+        # 计数按关联表重新统计
+        counts = dict(CollectionTag.objects.filter(tag__in=tags).values('tag_id').annotate(
+            total=Count('id')
+        ).values_list('tag_id', 'total'))
+        for tag in tags.only('id', 'count'):
+            if tag.count != counts.get(tag.id, 0):
+                Tag.objects.filter(id=tag.id).update(count=counts.get(tag.id, 0))
+    logger.info(f"重建收藏标签: {count} 条收藏")
+    return count
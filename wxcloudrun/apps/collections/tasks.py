@@ -0,0 +1,55 @@
+from django.db import transaction
+from wxcloudrun.apps.jobs.queue import register, JobError, PermanentJobError
+from wxcloudrun.apps.jobs.enrichment import track_enrichment, finish_enrichment
+from wxcloudrun.apps.core.services.quota import QuotaExceededError
+from .models import Collection
+from . import summary_store, search_index, embeddings, tags as tag_store
+from .summarizer import ChunkedSummarizer
+
+def save_analysis(collection: Collection, summary: str, tag_names, job=None) -> str:
+    """写回摘要和标签，标签计数和全文索引在同一事务中更新，返回标签字符串（任务已被取代时不写回）"""
+    # 去掉重复（含只有大小写不同）的标签
+    tag_names = tag_store.parse_tags(','.join(tag_names))
+    tags = ','.join(tag_names)
+    with transaction.atomic():
+        if not finish_enrichment(Collection, collection.id, job=job, summary=summary, tags=tags):
+            return tags
+        search_index.reindex(collection.id)
+        tag_store.sync_tags(collection, tag_names)
+    return tags
+
+@register('collections.summarize', workflow='content_summary')
+def summarize(job):
+    """生成收藏内容的摘要和标签"""
+    collection = Collection.objects.filter(id=job.payload['collection_id']).first()
+    if collection is None:
+        raise PermanentJobError('收藏记录不存在')
+
+    with track_enrichment(Collection, collection.id, job):
+        # 其他用户收藏过同一链接或同一内容时直接复用摘要，不再调用工作流；编辑正文后只按内容复用
+        analysis = summary_store.lookup(collection.url, collection.content, match_url=not job.payload.get('edited'))
+        shared = analysis is not None
+        if not shared:
+            # 长文本切块并发摘要后归并，短文本直接调用一次工作流
+            try:
+                analysis = ChunkedSummarizer(job.user).summarize(collection.title, collection.content, collection.url)
+            except QuotaExceededError as e:
+                # 额度按天重置，几分钟内的重试不会成功
+                raise PermanentJobError(str(e))
+            if analysis is None:
+                raise JobError('生成摘要失败')
+            summary_store.save(collection.url, collection.content, analysis)
+
+        summary = analysis.get('summary', '')
+        tags = save_analysis(collection, summary, analysis.get('tags', []), job=job)
+    return {'collection_id': collection.id, 'summary': summary, 'tags': tags, 'shared': shared}
+
+@register('collections.embed', workflow='local_embedding')
+def embed(job):
+    """计算收藏的本地向量（不调用外部服务），并原地写入本机已有的矩阵文件，检索时不必再读取"""
+    collection = Collection.objects.filter(id=job.payload['collection_id']).first()
+    if collection is None:
+        raise PermanentJobError('收藏记录不存在')
+    embeddings.index_collection(collection)
+    embeddings.sync(collection.user_id, build=False)
+    return {'collection_id': collection.id}
@@ -0,0 +1,373 @@
+import os
+import csv
+import gzip
+import json
+import random
+import tempfile
+from unittest.mock import patch, Mock
+from django.test import TestCase, override_settings
+from wxcloudrun.apps.core.utils.export import export_response
+from django.contrib.auth import get_user_model
+from wxcloudrun.apps.core.services.ai_service import AIService
+from wxcloudrun.apps.core.services.quota import get_quota_engine
+from wxcloudrun.apps.jobs.models import AIJob
+from .models import Collection, CollectionSearchPosting, Tag, SharedSummary
+from .serializers import CollectionSerializer
+from .tasks import summarize, embed
+from .summarizer import ChunkedSummarizer, split_content
+from . import search_index, tags, near_duplicates, embeddings, summary_store
+
+User = get_user_model()
+
+class CollectionSearchIndexTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='searchuser',
+            openid='searchuser',
+            password='testpass123'
+        )
+
+    def test_tokenize(self):
+        """测试分词：中文二元组、英文按词并统一小写"""
+        self.assertEqual(search_index.tokenize('机器学习 Python3'), ['机器', '器学', '学习', 'python3'])
+        self.assertEqual(search_index.tokenize('读 书'), ['读', '书'])
+
+    def test_search_ranks_and_follows_updates(self):
+        """测试检索排序、高亮，以及修改和删除后索引同步更新"""
+        title_hit = Collection.objects.create(user=self.user, title='机器学习入门', content='基础概念')
+        body_hit = Collection.objects.create(user=self.user, title='读书笔记', content='今天读了一本关于机器学习的书')
+        Collection.objects.create(user=self.user, title='学习计划', content='机器维修')
+
+        results = search_index.search(Collection.objects.filter(user=self.user), self.user, '机器学习')
+        self.assertEqual([r['collection'].id for r in results], [title_hit.id, body_hit.id])
+        self.assertIn('<em>机器学习</em>', results[1]['highlight']['snippet'])
+
+        body_hit.content = '换了内容'
+        body_hit.save()
+        title_hit.delete()
+        self.assertEqual(search_index.search(Collection.objects.filter(user=self.user), self.user, '机器学习'), [])
+        self.assertFalse(CollectionSearchPosting.objects.filter(term='机器', collection_id=body_hit.id).exists())
+        self.assertIsNone(search_index.search(Collection.objects.filter(user=self.user), self.user, '书'))
+
+class CollectionTagTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='taguser',
+            openid='taguser',
+            password='testpass123'
+        )
+
+    def test_counts_follow_changes(self):
+        """测试标签计数随收藏的标签修改、删除增减，筛选不匹配子串"""
+        first = Collection.objects.create(user=self.user, title='a', content='a', tags='学习, 读书')
+        second = Collection.objects.create(user=self.user, title='b', content='b', tags='学习，写作')
+        self.assertEqual(tags.tag_cloud(self.user), [
+            {'tag': '学习', 'count': 2}, {'tag': '写作', 'count': 1}, {'tag': '读书', 'count': 1}
+        ])
+
+        second.tags = '写作'
+        second.save()
+        first.delete()
+        self.assertEqual(tags.tag_cloud(self.user), [{'tag': '写作', 'count': 1}])
+
+        queryset = Collection.objects.filter(user=self.user)
+        self.assertEqual(list(tags.filter_by_tag(queryset, self.user, '写作')), [second])
+        self.assertFalse(tags.filter_by_tag(queryset, self.user, '写').exists())
+
+    def test_tags_differing_in_case_are_one_tag(self):
+        """测试只有大小写不同的标签视为同一个（MySQL 的唯一约束不区分大小写）"""
+        self.assertEqual(tags.parse_tags('AI, ai,Python，python'), ['AI', 'Python'])
+        first = Collection.objects.create(user=self.user, title='a', content='a', tags='AI,ai,Python')
+        second = Collection.objects.create(user=self.user, title='b', content='b', tags='python')
+        tags.sync_tags(first, ['ai', 'AI', 'PYTHON'])
+        self.assertEqual(tags.tag_cloud(self.user), [{'tag': 'Python', 'count': 2}, {'tag': 'AI', 'count': 1}])
+
+        queryset = Collection.objects.filter(user=self.user)
+        self.assertEqual(list(tags.filter_by_tag(queryset, self.user, 'ai')), [first])
+        self.assertEqual(tags.rebuild([self.user.id]), 2)
+        self.assertEqual(tags.tag_cloud(self.user), [{'tag': 'Python', 'count': 2}, {'tag': 'AI', 'count': 1}])
+        self.assertEqual(second.tag_links.count(), 1)
+
+    def test_rebuild_matches_incremental(self):
+        """测试从标签字符串重建的计数与增量维护一致"""
+        Collection.objects.create(user=self.user, title='a', content='a', tags='学习,读书')
+        Collection.objects.create(user=self.user, title='b', content='b', tags='学习')
+        expected = tags.tag_cloud(self.user)
+
+        Tag.objects.filter(user=self.user).update(count=0)
+        self.assertEqual(tags.rebuild([self.user.id]), 2)
+        self.assertEqual(tags.tag_cloud(self.user), expected)
+
+class CollectionNearDuplicateTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='dupuser',
+            openid='dupuser',
+            password='testpass123'
+        )
+        self.article = '。'.join(f'第{i}段讲述了情绪管理与时间管理的第{i}种方法和实践经验' for i in range(20))
+
+    def test_simhash_distance(self):
+        """测试末尾追加少量内容的正文指纹接近，不同正文指纹相差较远"""
+        base = near_duplicates.simhash(self.article)
+        edited = near_duplicates.simhash(self.article + '（本文转载自某公众号）')
+        other = near_duplicates.simhash('。'.join(f'关于深度学习模型训练的第{i}条经验总结' for i in range(20)))
+        self.assertLessEqual(near_duplicates.distance(base, edited), 3)
+        self.assertGreater(near_duplicates.distance(base, other), 16)
+        self.assertIsNone(near_duplicates.simhash('太短'))
+
+    def test_reuses_enriched_duplicate(self):
+        """测试近似重复的收藏复用已有摘要，相似列表包含原收藏"""
+        original = Collection.objects.create(
+            user=self.user, title='原文', content=self.article, summary='已有摘要', tags='情绪,时间',
+            enrich_status=Collection.ENRICH_DONE
+        )
+        copy = Collection.objects.create(user=self.user, title='转载', content=self.article + '（转载）')
+
+        self.assertEqual(near_duplicates.find_enriched_duplicate(copy), original)
+        self.assertEqual([item[0] for item in near_duplicates.similar(copy)], [original])
+
+class CollectionEmbeddingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='embeduser',
+            openid='embeduser',
+            password='testpass123'
+        )
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        settings_override = override_settings(COLLECTION_EMBEDDING_CACHE_DIR=cache_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        patcher = patch.object(embeddings, '_matrix_cache', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create(self, title, content):
+        collection = Collection.objects.create(user=self.user, title=title, content=content)
+        embeddings.index_collection(collection)
+        return collection
+
+    def test_related_and_semantic_search(self):
+        """测试相关收藏按相似度排序，新增向量后矩阵随之更新"""
+        sleep = self.create('改善睡眠', '睡前放松、规律作息可以改善睡眠质量')
+        insomnia = self.create('失眠怎么办', '规律作息和睡前放松有助于缓解失眠，提高睡眠质量')
+        python = self.create('python tips', 'list comprehension and generators in python')
+
+        related = embeddings.related(sleep)
+        self.assertEqual(related[0][0], insomnia.id)
+        self.assertNotIn(sleep.id, [collection_id for collection_id, _ in related])
+        self.assertEqual(embeddings.semantic_search(self.user, 'python generators')[0][0], python.id)
+
+        exercise = self.create('运动与睡眠', '适量运动能改善睡眠质量')
+        self.assertIn(exercise.id, [collection_id for collection_id, _ in embeddings.related(sleep)])
+
+    def test_changes_are_patched_in_place(self):
+        """测试向量增改、删除只写入变化的行，不替换矩阵文件，已打开的映射直接可见"""
+        sleep = self.create('改善睡眠', '睡前放松、规律作息可以改善睡眠质量')
+        python = self.create('python tips', 'list comprehension and generators in python')
+        matrix = embeddings.get_matrix(self.user.id)
+
+        with patch.object(embeddings, '_create', side_effect=AssertionError('不应重建矩阵文件')):
+            python.title, python.content = '睡眠笔记', '规律作息改善睡眠'
+            python.save()
+            embed(AIJob(payload={'collection_id': python.id}, attempts=1, max_attempts=3))
+            self.assertIn(python.id, [collection_id for collection_id, _ in matrix.top_k(embeddings.embed_query('睡眠'), 5)])
+
+            extra = self.create('失眠', '睡前放松缓解失眠')
+            sleep.delete()
+            self.assertIs(embeddings.get_matrix(self.user.id), matrix)
+            ids = [collection_id for collection_id, _ in matrix.top_k(embeddings.embed_query('睡眠 失眠'), 5)]
+        self.assertIn(extra.id, ids)
+        self.assertNotIn(sleep.id, ids)
+
+    def test_growth_replaces_file_and_reopens(self):
+        """测试容量不够时换成更大的文件，之前打开的映射仍可读，再次获取时重新打开"""
+        first = self.create('改善睡眠', '睡前放松、规律作息可以改善睡眠质量')
+        matrix = embeddings.get_matrix(self.user.id)
+        capacity = len(matrix.ids)
+        for i in range(capacity):
+            self.create(f'笔记{i}', f'第{i}条内容')
+
+        current = embeddings.get_matrix(self.user.id)
+        self.assertIsNot(current, matrix)
+        self.assertGreater(len(current.ids), capacity)
+        self.assertEqual(int((current.ids >= 0).sum()), capacity + 1)
+        self.assertEqual(int(matrix.ids[0]), first.id)
+        self.assertTrue(matrix.vectors[0].any())
+
+    def test_missing_file_is_rebuilt(self):
+        """测试矩阵文件被外部清理后重建，不报错"""
+        sleep = self.create('改善睡眠', '睡前放松、规律作息可以改善睡眠质量')
+        embeddings.get_matrix(self.user.id)
+        os.remove(f"{embeddings._cache_base(self.user.id)}.npy")
+        embeddings.get_matrix_cache().clear()
+
+        self.assertEqual(embeddings.semantic_search(self.user, '睡眠')[0][0], sleep.id)
+
+    @override_settings(COLLECTION_EMBEDDING_CACHE_USERS=1)
+    def test_matrix_cache_is_bounded(self):
+        """测试进程内打开的矩阵按用户数 LRU 淘汰"""
+        other = User.objects.create_user(username='embedother', openid='embedother', password='testpass123')
+        self.create('改善睡眠', '睡前放松、规律作息可以改善睡眠质量')
+        embeddings.index_collection(Collection.objects.create(user=other, title='睡眠', content='规律作息'))
+
+        embeddings.get_matrix(self.user.id)
+        embeddings.get_matrix(other.id)
+        cache = embeddings.get_matrix_cache()
+        self.assertEqual(len(cache), 1)
+        self.assertIsNone(cache.get(self.user.id))
+        self.assertIsNotNone(cache.get(other.id))
+
+class CollectionExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='exportuser',
+            openid='exportuser',
+            password='testpass123'
+        )
+        for i in range(5):
+            Collection.objects.create(user=self.user, title=f'收藏{i}', content=f'第{i}条,含逗号', tags='读书,笔记')
+
+    @override_settings(EXPORT_BATCH_SIZE=2)
+    def test_export_jsonl_and_csv(self):
+        """测试分批导出的 JSONL 与 CSV 包含全部记录，gzip 输出可解压"""
+        queryset = Collection.objects.filter(user=self.user)
+        with self.assertNumQueries(3):
+            response = export_response(queryset, CollectionSerializer, 'collections', 'jsonl', compress=True)
+            lines = gzip.decompress(b''.join(response.streaming_content)).decode('utf-8').splitlines()
+        self.assertTrue(response['Content-Disposition'].endswith('.jsonl.gz"'))
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([row['title'] for row in rows], [f'收藏{i}' for i in range(5)])
+        self.assertEqual(rows[0]['tags_list'], ['读书', '笔记'])
+
+        response = export_response(queryset, CollectionSerializer, 'collections', 'csv')
+        text = b''.join(response.streaming_content).decode('utf-8-sig')
+        rows = list(csv.DictReader(text.splitlines()))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[4]['content'], '第4条,含逗号')
+        self.assertEqual(json.loads(rows[0]['tags_list']), ['读书', '笔记'])
+
+class SharedSummaryStoreTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='shareuser',
+            openid='shareuser',
+            password='testpass123'
+        )
+        self.analysis = {'summary': '旧摘要', 'tags': ['读书'], 'keywords': ['习惯']}
+
+    def test_canonical_url(self):
+        """测试链接规范化：协议域名小写、去掉默认端口、锚点、跟踪参数和末尾斜杠，参数排序"""
+        self.assertEqual(
+            summary_store.canonical_url(' HTTPS://Mp.Weixin.QQ.com:443/s/abc/?b=2&utm_source=x&a=1&spm=3#frag '),
+            'https://mp.weixin.qq.com/s/abc?a=1&b=2'
+        )
+        self.assertEqual(summary_store.canonical_url('http://example.com:8080'), 'http://example.com:8080/')
+        self.assertEqual(summary_store.canonical_url(None), '')
+
+    def test_normalize_content(self):
+        """测试正文规范化：全角转半角、小写、合并空白"""
+        self.assertEqual(summary_store.normalize_content('  Ｈｅｌｌｏ\n\n  World！ '), 'hello world!')
+        self.assertEqual(summary_store.normalize_content(None), '')
+
+    def test_lookup_and_save(self):
+        """测试按内容或链接命中共享摘要，重复写入保留第一条"""
+        summary_store.save('https://example.com/a?utm_source=x', '正文 内容', self.analysis)
+        summary_store.save('https://example.com/a', '正文 内容', {'summary': '重复写入'})
+        self.assertEqual(SharedSummary.objects.count(), 1)
+
+        self.assertEqual(summary_store.lookup(None, '  正文\n内容 ')['summary'], '旧摘要')
+        self.assertEqual(summary_store.lookup('https://EXAMPLE.com/a/', '其他正文')['tags'], ['读书'])
+        self.assertIsNone(summary_store.lookup('https://example.com/a', '其他正文', match_url=False))
+        self.assertIsNone(summary_store.lookup('https://example.com/b', '其他正文'))
+        self.assertEqual(SharedSummary.objects.get().hit_count, 2)
+
+    def test_invalidate(self):
+        """测试工作流版本变更后旧版本不再命中，invalidate 删除旧版本"""
+        with override_settings(COZE_SUMMARY_WORKFLOW_VERSION='1'):
+            summary_store.save(None, '正文', self.analysis)
+        with override_settings(COZE_SUMMARY_WORKFLOW_VERSION='2'):
+            self.assertIsNone(summary_store.lookup(None, '正文'))
+            summary_store.save(None, '正文', {'summary': '新摘要'})
+            self.assertEqual(summary_store.invalidate(), 1)
+            self.assertEqual(summary_store.lookup(None, '正文')['summary'], '新摘要')
+            self.assertEqual(summary_store.invalidate('2'), 1)
+        self.assertFalse(SharedSummary.objects.exists())
+
+    @patch('wxcloudrun.apps.collections.tasks.ChunkedSummarizer.summarize')
+    def test_edited_content_is_summarized_again(self, mock_summarize):
+        """测试编辑正文后链接不变也重新生成摘要，不复用旧正文的共享摘要"""
+        url = 'https://example.com/article'
+        summary_store.save(url, '旧正文', self.analysis)
+        collection = Collection.objects.create(user=self.user, title='文章', url=url, content='新正文')
+        mock_summarize.return_value = {'summary': '新摘要', 'tags': ['写作'], 'keywords': []}
+
+        job = AIJob(payload={'collection_id': collection.id, 'edited': True}, attempts=1, max_attempts=3)
+        result = summarize(job)
+        self.assertEqual((result['summary'], result['shared']), ('新摘要', False))
+        mock_summarize.assert_called_once()
+
+        job = AIJob(payload={'collection_id': collection.id}, attempts=1, max_attempts=3)
+        self.assertTrue(summarize(job)['shared'])
+
+class ChunkedSummarizerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='chunkuser',
+            openid='chunkuser',
+            password='testpass123'
+        )
+
+    def article(self, seed):
+        rng = random.Random(seed)
+        return [
+            '。'.join(f'第{i}段第{j}句讲了{rng.randrange(10 ** 6)}号内容' for j in range(rng.randrange(1, 12))) + '。'
+            for i in range(60)
+        ]
+
+    def test_chunks_fit_and_edits_stay_local(self):
+        """测试每块不超过 max_chars，修改一段只影响附近的几块，其余块不变（块摘要缓存可复用）"""
+        for seed in range(20):
+            paragraphs = self.article(seed)
+            chunks = split_content('\n\n'.join(paragraphs), 300)
+            self.assertTrue(all(0 < len(chunk) <= 300 for chunk in chunks))
+            self.assertEqual(''.join(chunks).replace('\n', ''), ''.join(paragraphs))
+
+            edited = list(paragraphs)
+            position = random.Random(seed).randrange(len(edited))
+            edited[position] = edited[position].replace('内容', '修改后的内容', 1)
+            new_chunks = split_content('\n\n'.join(edited), 300)
+            self.assertTrue(all(len(chunk) <= 300 for chunk in new_chunks))
+            self.assertLessEqual(len(set(new_chunks) - set(chunks)), 4)
+            self.assertLessEqual(len(set(chunks) - set(new_chunks)), 4)
+
+    def test_single_sentence_longer_than_max_chars(self):
+        """测试没有标点的超长段落按长度硬切"""
+        chunks = split_content('字' * 1000, 300)
+        self.assertTrue(all(len(chunk) <= 300 for chunk in chunks))
+        self.assertEqual(''.join(chunks), '字' * 1000)
+
+    @override_settings(AI_SUMMARY_CHUNK_CHARS=300, CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    @patch('wxcloudrun.apps.core.services.ai_service.get_coze_service', Mock())
+    def test_long_article_reserves_quota_once(self):
+        """测试长文本分块摘要只占用一次额度，失败时退还"""
+        content = '\n\n'.join(self.article(1))
+        calls = []
+
+        def generate_summary(service, title, text, url=None, reserve=True):
+            calls.append(reserve)
+            return {'summary': text[:20], 'tags': ['标签'], 'keywords': []}
+
+        engine = get_quota_engine()
+        used = engine.used(self.user.id)
+        with patch.object(AIService, 'generate_summary', generate_summary):
+            result = ChunkedSummarizer(self.user).summarize('长文', content)
+        self.assertEqual(result['tags'], ['标签'])
+        self.assertGreater(len(calls), 2)
+        self.assertNotIn(True, calls)
+        self.assertEqual(engine.used(self.user.id), used + 1)
+
+        with patch.object(AIService, 'generate_summary', return_value=None):
+            self.assertIsNone(ChunkedSummarizer(self.user).summarize('长文', content + '\n\n新增一段'))
+        self.assertEqual(engine.used(self.user.id), used + 1)
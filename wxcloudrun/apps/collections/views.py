@@ -1,18 +1,26 @@
 from rest_framework import viewsets, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Q
+from rest_framework.renderers import JSONRenderer
+from django.conf import settings
+from django.db import transaction
 from django.db.models.functions import TruncDate
 from django.db.models import Count
 from .models import Collection
 from .serializers import CollectionSerializer, CollectionCreateSerializer
-from wxcloudrun.apps.core.utils.response import api_response
+from . import search_index, near_duplicates, embeddings, tags as tag_store
+from .tasks import save_analysis
+from wxcloudrun.apps.core.utils.pagination import KeysetPagination
+from wxcloudrun.apps.core.utils.export import export_response, EXPORT_FORMATS
+from wxcloudrun.apps.core.utils.response import api_response, accepted_response, stream_text_response, EventStreamRenderer
 from wxcloudrun.apps.core.services.ai_service import AIService
+from wxcloudrun.apps.jobs.enrichment import schedule_enrichment, enrichment_status, save_streamed_enrichment
 
 class CollectionViewSet(viewsets.ModelViewSet):
     """智能收藏视图集"""
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = CollectionSerializer
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         return Collection.objects.filter(user=self.request.user)
@@ -22,31 +30,151 @@ class CollectionViewSet(viewsets.ModelViewSet):
             return CollectionCreateSerializer
         return CollectionSerializer
 
+    def _enrich(self, collection, edited=False):
+        """正文与已有摘要的收藏近似重复时直接复用摘要和标签，否则在事务提交后由后台任务生成"""
+        original = near_duplicates.find_enriched_duplicate(collection)
+        if original is not None:
+            save_analysis(collection, original.summary, tag_store.parse_tags(original.tags))
+            collection.refresh_from_db()
+            return original
+        payload = {'collection_id': collection.id, 'edited': edited}
+        schedule_enrichment(collection, 'collections.summarize', payload, user=self.request.user)
+        return None
+
+    @transaction.atomic
     def perform_create(self, serializer):
         collection = serializer.save()
-        # 调用AI服务生成摘要和标签
-        ai_service = AIService()
-        analysis = ai_service.generate_summary(collection.content)
-        if analysis:
-            collection.summary = analysis.get('summary', '')
-            collection.tags = ','.join(analysis.get('tags', []))
-            collection.save()
+        self.duplicate_of = self._enrich(collection)
+        embeddings.schedule(collection, user=self.request.user)
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        content = serializer.validated_data.get('content')
+        title = serializer.validated_data.get('title')
+        if content is None or content == serializer.instance.content:
+            title_changed = title is not None and title != serializer.instance.title
+            collection = serializer.save()
+            if title_changed:
+                embeddings.schedule(collection, user=self.request.user)
+            return
+        # 正文修改后重新生成摘要，未改动部分的块摘要从缓存中复用
+        collection = serializer.save(enrich_status=Collection.ENRICH_PENDING)
+        self._enrich(collection, edited=True)
+        embeddings.schedule(collection, user=self.request.user)
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        self.perform_create(serializer)
+        data = CollectionSerializer(serializer.instance).data
+        data['duplicate_of'] = self.duplicate_of.id if self.duplicate_of else None
+        return accepted_response(data)
+
+    @action(detail=True, methods=['get'])
+    def enrichment(self, request, pk=None):
+        """摘要和标签的生成进度"""
+        return api_response(data=enrichment_status(self.get_object()))
+
+    def _limit(self, request, default=10):
+        return min(max(int(request.query_params.get('limit', default)), 1), 50)
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """正文相似的其他收藏（SimHash 分段索引），按海明距离升序"""
+        try:
+            limit = self._limit(request)
+        except ValueError:
+            return api_response(code=400, message='limit 必须为整数')
+        data = []
+        for collection, distance in near_duplicates.similar(self.get_object(), limit=limit):
+            item = CollectionSerializer(collection).data
+            item.update(distance=distance, similarity=round(1 - distance / near_duplicates.BITS, 4))
+            data.append(item)
+        return api_response(data=data)
+
+    def _ranked_response(self, ranked):
+        """按检索结果的顺序返回收藏，附带相似度"""
+        collections = self.get_queryset().in_bulk([collection_id for collection_id, _ in ranked])
+        data = []
+        for collection_id, score in ranked:
+            if collection_id in collections:
+                item = CollectionSerializer(collections[collection_id]).data
+                item['score'] = round(score, 4)
+                data.append(item)
+        return api_response(data=data)
+
+    @action(detail=True, methods=['get'])
+    def related(self, request, pk=None):
+        """语义相关的其他收藏（本地向量余弦相似度）"""
+        try:
+            limit = self._limit(request)
+        except ValueError:
+            return api_response(code=400, message='limit 必须为整数')
+        return self._ranked_response(embeddings.related(self.get_object(), limit=limit))
+
+    @action(detail=False, methods=['get'])
+    def semantic(self, request):
+        """语义检索：按查询文本的向量返回最相近的收藏"""
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return api_response(code=400, message='请提供查询文本 q')
+        try:
+            limit = self._limit(request)
+        except ValueError:
+            return api_response(code=400, message='limit 必须为整数')
+        return self._ranked_response(embeddings.semantic_search(request.user, query, limit=limit))
+
+    @action(detail=True, methods=['get'], url_path='summary/stream', renderer_classes=[EventStreamRenderer, JSONRenderer])
+    def stream_summary(self, request, pk=None):
+        """流式生成摘要（SSE），生成完成后保存"""
+        collection = self.get_object()
+        chunks = AIService(request.user).stream_summary(collection.title, collection.content, collection.url)
+
+        def save(summary):
+            # 取代尚未完成的摘要任务，避免稍后被任务的结果覆盖
+            with transaction.atomic():
+                save_streamed_enrichment(collection, summary=summary)
+                search_index.reindex(collection.id)
+            return {'id': collection.id}
+
+        return stream_text_response(chunks, save)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """流式导出全部收藏：?output=jsonl|csv，?gzip=1 时输出 .gz 文件"""
+        output = request.query_params.get('output', 'jsonl')
+        if output not in EXPORT_FORMATS:
+            return api_response(code=400, message='output 只支持 jsonl 或 csv')
+        return export_response(
+            self.get_queryset(), CollectionSerializer, 'collections', output,
+            compress=request.query_params.get('gzip') in ('1', 'true'),
+            context=self.get_serializer_context()
+        )
 
     @action(detail=False, methods=['get'])
     def search(self, request):
-        """搜索收藏内容"""
+        """搜索收藏内容：按全文索引的相关度排序，返回高亮片段"""
         keyword = request.query_params.get('keyword', '')
         tag = request.query_params.get('tag', '')
 
         queryset = self.get_queryset()
-        if keyword:
-            queryset = queryset.filter(
-                Q(title__icontains=keyword) |
-                Q(content__icontains=keyword) |
-                Q(summary__icontains=keyword)
-            )
         if tag:
-            queryset = queryset.filter(tags__icontains=tag)
+            queryset = tag_store.filter_by_tag(queryset, request.user, tag)
+        if keyword:
+            try:
+                limit = min(int(request.query_params.get('limit', 20)), getattr(settings, 'SEARCH_MAX_RESULTS', 100))
+            except ValueError:
+                return api_response(code=400, message='limit 必须为整数')
+            results = search_index.search(queryset, request.user, keyword, limit=max(limit, 1))
+            if results is not None:
+                data = []
+                for result in results:
+                    item = CollectionSerializer(result['collection']).data
+                    item.update(score=result['score'], highlight=result['highlight'])
+                    data.append(item)
+                return api_response(data=data)
+            # 查询只有单个汉字时索引无法命中，使用 LIKE 查询
+            queryset = search_index.like_filter(queryset, keyword)
 
         serializer = self.get_serializer(queryset, many=True)
         return api_response(data=serializer.data)
@@ -60,18 +188,8 @@ class CollectionViewSet(viewsets.ModelViewSet):
             count=Count('id')
         ).order_by('date')
 
-        # 获取所有标签及其使用次数
-        all_tags = {}
-        for collection in self.get_queryset():
-            if collection.tags:
-                for tag in collection.tags.split(','):
-                    tag = tag.strip()
-                    all_tags[tag] = all_tags.get(tag, 0) + 1
-
-        tags_stats = [{'tag': tag, 'count': count} 
-                     for tag, count in sorted(all_tags.items(), 
-                                           key=lambda x: x[1], 
-                                           reverse=True)]
+        # 标签云直接读取按用户维护的标签计数
+        tags_stats = tag_store.tag_cloud(request.user)
 
         return api_response(data={
             'by_date': list(collections_by_date),
@@ -0,0 +1,237 @@
+import json
+import math
+import time
+import random
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+def parse_latency(spec: str):
+    """解析延迟分布，返回采样函数（秒）
+
+    fixed:0.5 / uniform:0.2,1.5 / normal:1,0.3 / lognormal:1,0.5（中位数, sigma）
+    """
+    kind, _, params = spec.partition(':')
+    try:
+        values = [float(v) for v in params.split(',')] if params else []
+        if kind == 'fixed':
+            value = values[0]
+            return lambda: value
+        if kind == 'uniform':
+            low, high = values
+            return lambda: random.uniform(low, high)
+        if kind == 'normal':
+            mean, std = values
+            return lambda: max(0.0, random.gauss(mean, std))
+        if kind == 'lognormal':
+            median, sigma = values
+            mu = math.log(median)
+            return lambda: random.lognormvariate(mu, sigma)
+    except (ValueError, IndexError):
+        pass
+    raise CommandError(f"无效的延迟分布: {spec}")
+
+def default_outputs():
+    """各工作流的模拟输出，字段与 CozeService / AIService 的调用方一致"""
+    return {
+        getattr(settings, 'COZE_EMOTION_PHOTO_WORKFLOW_ID', 'emotion_photo'): {
+            'photo_url': 'https://example.com/standin/photo.jpg'
+        },
+        getattr(settings, 'COZE_EMOTION_CURVE_WORKFLOW_ID', 'emotion_curve'): {
+            'curve_url': 'https://example.com/standin/curve.png',
+            'analysis': '情绪整体平稳，周末略有上升'
+        },
+        getattr(settings, 'COZE_COLLECTION_SUMMARY_WORKFLOW_ID', 'collection_summary'): {
+            'summary': '这是一段模拟生成的摘要。',
+            'tags': ['模拟', '压测'],
+            'keywords': ['standin']
+        },
+        getattr(settings, 'COZE_CAREER_ACTION_WORKFLOW_ID', 'career_action'): {
+            'suggestion': '建议每周复盘一次目标进展。',
+            'skills': ['沟通', '规划'],
+            'development_path': ['初级', '中级', '高级']
+        },
+    }
+
+class StandinState:
+    """故障注入配置与请求计数"""
+
+    def __init__(self, options):
+        self.latency = parse_latency(options['latency'])
+        self.workflow_latency = {}
+        for item in options['workflow_latency']:
+            workflow_id, _, spec = item.partition('=')
+            self.workflow_latency[workflow_id] = parse_latency(spec)
+        self.error_rate = options['error_rate']
+        self.business_error_rate = options['business_error_rate']
+        self.rate_limit_rate = options['rate_limit_rate']
+        self.timeout_rate = options['timeout_rate']
+        self.hang = options['hang']
+        self.stream_chunks = options['stream_chunks']
+        self.chunk_delay = parse_latency(options['chunk_delay'])
+        self.outputs = default_outputs()
+        self._lock = threading.Lock()
+        self.counters = {}
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+
+    def sample_latency(self, workflow_id: str) -> float:
+        return self.workflow_latency.get(workflow_id, self.latency)()
+
+    def pick_fault(self) -> str:
+        """按配置的比例抽取本次请求的故障类型"""
+        roll = random.random()
+        for fault, rate in (
+            ('timeout', self.timeout_rate),
+            ('error', self.error_rate),
+            ('rate_limit', self.rate_limit_rate),
+            ('business_error', self.business_error_rate),
+        ):
+            if roll < rate:
+                return fault
+            roll -= rate
+        return ''
+
+class StandinHandler(BaseHTTPRequestHandler):
+    """实现 CozeService 使用的接口：/workflow/invoke、/workflow/stream_run、OAuth 令牌"""
+
+    protocol_version = 'HTTP/1.1'
+    state: StandinState = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: dict) -> None:
+        payload = json.dumps(body, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            return json.loads(self.rfile.read(length) or b'{}')
+        except json.JSONDecodeError:
+            return {}
+
+    def do_GET(self):
+        if self.path == '/stats':
+            with self.state._lock:
+                return self._send_json(200, dict(self.state.counters))
+        self._send_json(404, {'code': 404, 'message': 'not found'})
+
+    def do_POST(self):
+        data = self._read_json()
+        if self.path.endswith('/oauth2/token'):
+            self.state.count('token')
+            return self._send_json(200, {
+                'access_token': f"standin-{int(time.time())}",
+                'expires_in': int(time.time()) + 900
+            })
+        if self.path.endswith('/workflow/invoke'):
+            return self._invoke(data)
+        if self.path.endswith('/workflow/stream_run'):
+            return self._stream(data)
+        self._send_json(404, {'code': 404, 'message': 'not found'})
+
+    def _apply_fault(self, workflow_id: str) -> bool:
+        """注入故障，返回 True 表示已经处理完本次请求"""
+        fault = self.state.pick_fault()
+        if not fault:
+            return False
+        self.state.count(fault)
+        if fault == 'timeout':
+            # 挂起超过客户端读取超时后直接断开
+            time.sleep(self.state.hang)
+            self.close_connection = True
+        elif fault == 'error':
+            self._send_json(500, {'code': 500, 'message': 'standin internal error'})
+        elif fault == 'rate_limit':
+            self._send_json(429, {'code': 429, 'message': 'standin rate limited'})
+        else:
+            self._send_json(200, {'code': 5001, 'message': f"standin business error: {workflow_id}"})
+        return True
+
+    def _output(self, workflow_id: str, inputs: dict) -> dict:
+        return self.state.outputs.get(workflow_id, {'output': f"standin result for {workflow_id}", 'inputs': inputs})
+
+    def _invoke(self, data: dict) -> None:
+        workflow_id = data.get('workflow_id', '')
+        self.state.count(f"invoke:{workflow_id}")
+        time.sleep(self.state.sample_latency(workflow_id))
+        if self._apply_fault(workflow_id):
+            return
+
+        output = self._output(workflow_id, data.get('inputs', {}))
+        # 顶层字段供 CozeService 调用方读取，data 为工作流输出的 JSON 字符串
+        self._send_json(200, {'code': 200, 'message': 'success', **output, 'data': json.dumps(output, ensure_ascii=False)})
+
+    def _stream(self, data: dict) -> None:
+        workflow_id = data.get('workflow_id', '')
+        self.state.count(f"stream:{workflow_id}")
+        # 流式接口的延迟分布表示首个片段的等待时间
+        time.sleep(self.state.sample_latency(workflow_id))
+        if self._apply_fault(workflow_id):
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        output = self._output(workflow_id, data.get('inputs', {}))
+        # 文本类工作流流式输出正文，其余输出 JSON 文本
+        text = output.get('summary') or output.get('suggestion') or output.get('analysis') or json.dumps(output, ensure_ascii=False)
+        size = max(1, -(-len(text) // self.state.stream_chunks))
+        for start in range(0, len(text), size):
+            if start:
+                time.sleep(self.state.chunk_delay())
+            self._write_chunk(f"event: Message\ndata: {json.dumps({'content': text[start:start + size]}, ensure_ascii=False)}\n\n")
+        self._write_chunk('event: Done\ndata: {}\n\n')
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _write_chunk(self, text: str) -> None:
+        payload = text.encode()
+        self.wfile.write(f"{len(payload):x}\r\n".encode() + payload + b'\r\n')
+        self.wfile.flush()
+
+class StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+class Command(BaseCommand):
+    """本地 COZE 替身服务，用于压测时不消耗真实额度"""
+
+    help = '启动 COZE 替身服务（支持延迟分布、错误率、超时与流式输出注入）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8900)
+        parser.add_argument('--latency', default='lognormal:0.8,0.5', help='默认延迟分布，如 fixed:0.5、uniform:0.2,1.5、normal:1,0.3、lognormal:0.8,0.5')
+        parser.add_argument('--workflow-latency', action='append', default=[], help='单个工作流的延迟分布，如 curve=fixed:2，可重复')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='返回 HTTP 500 的比例')
+        parser.add_argument('--business-error-rate', type=float, default=0.0, help='返回 code != 200 的比例')
+        parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='返回 HTTP 429 的比例')
+        parser.add_argument('--timeout-rate', type=float, default=0.0, help='挂起后断开连接的比例')
+        parser.add_argument('--hang', type=float, default=35.0, help='模拟超时时挂起的秒数')
+        parser.add_argument('--stream-chunks', type=int, default=20, help='流式输出的片段数')
+        parser.add_argument('--chunk-delay', default='fixed:0.05', help='流式片段之间的间隔分布')
+
+    def handle(self, *args, **options):
+        handler = type('Handler', (StandinHandler,), {'state': StandinState(options)})
+        server = StandinServer((options['host'], options['port']), handler)
+        self.stdout.write(
+            f"COZE 替身服务已启动: http://{options['host']}:{server.server_port}"
+            f"（设置 COZE_API_BASE_URL 指向该地址，GET /stats 查看请求计数）"
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
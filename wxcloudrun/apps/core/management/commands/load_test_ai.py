@@ -0,0 +1,175 @@
+import json
+import math
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+import requests
+from requests.adapters import HTTPAdapter
+from django.core.management.base import BaseCommand, CommandError
+
+# 场景: (方法, 路径, 请求体, 是否流式)
+SCENARIOS = {
+    'photo': ('POST', '/api/v1/emotions/records/generate_photo/', {'text': '今天心情很好', 'style': '写实风格'}, False),
+    'photo-job': ('POST', '/api/v1/emotions/records/generate_photo/', {'text': '今天心情很好', 'style': '写实风格', 'async': True}, False),
+    'curve': ('POST', '/api/v1/emotions/records/generate_curve/', {'emotions': [{'date': '2023-12-14', 'level': 8}, {'date': '2023-12-15', 'level': 6}]}, False),
+    'photo-async': ('POST', '/api/v1/emotions/async/generate_photo/', {'text': '今天心情很好', 'style': '写实风格'}, False),
+    'curve-async': ('POST', '/api/v1/emotions/async/generate_curve/', {'emotions': [{'date': '2023-12-14', 'level': 8}]}, False),
+    'collection-create': ('POST', '/api/v1/collections/records/', {'title': '压测', 'content': '压测内容'}, False),
+    'summary-stream': ('GET', '/api/v1/collections/records/{id}/summary/stream/', None, True),
+    'health': ('GET', '/health/', None, False),
+}
+
+def percentile(values: List[float], pct: float) -> float:
+    """最近秩百分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+class Command(BaseCommand):
+    """对真实的 Django 接口施压（配合 coze_standin 使用），统计延迟分位数与吞吐"""
+
+    help = 'AI 接口压测：输出 p50/p95/p99 延迟与吞吐'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000', help='被测 Django 服务地址')
+        parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='curve')
+        parser.add_argument('--path', default=None, help='自定义路径，覆盖场景中的路径')
+        parser.add_argument('--method', default=None, help='自定义方法')
+        parser.add_argument('--body', default=None, help='自定义 JSON 请求体')
+        parser.add_argument('--id', default='1', help='路径中 {id} 的取值')
+        parser.add_argument('--token', default=None, help='JWT 访问令牌')
+        parser.add_argument('--user-id', type=int, default=None, help='为该用户生成 JWT（需要能访问数据库）')
+        parser.add_argument('--concurrency', type=int, default=10)
+        parser.add_argument('--requests', type=int, default=200, help='总请求数（与 --duration 二选一）')
+        parser.add_argument('--duration', type=float, default=None, help='持续压测秒数')
+        parser.add_argument('--warmup', type=int, default=0, help='预热请求数，不计入统计')
+        parser.add_argument('--timeout', type=float, default=60.0)
+        parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+
+    def handle(self, *args, **options):
+        method, path, body, streaming = SCENARIOS[options['scenario']]
+        method = (options['method'] or method).upper()
+        path = (options['path'] or path).format(id=options['id'])
+        if options['body'] is not None:
+            try:
+                body = json.loads(options['body'])
+            except json.JSONDecodeError as e:
+                raise CommandError(f"请求体不是合法的 JSON: {str(e)}")
+        url = options['base_url'].rstrip('/') + path
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=options['concurrency'])
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        token = options['token'] or self._token_for(options['user_id'])
+        if token:
+            session.headers['Authorization'] = f"Bearer {token}"
+        if streaming:
+            session.headers['Accept'] = 'text/event-stream'
+
+        def call() -> Dict[str, Any]:
+            start = time.perf_counter()
+            ttfb = None
+            try:
+                response = session.request(method, url, json=body, timeout=options['timeout'], stream=streaming)
+                if streaming:
+                    for chunk in response.iter_content(chunk_size=None):
+                        if ttfb is None and chunk:
+                            ttfb = time.perf_counter() - start
+                else:
+                    response.content
+                    ttfb = response.elapsed.total_seconds()
+                status = response.status_code
+            except requests.exceptions.RequestException as e:
+                status = type(e).__name__
+            return {'status': status, 'latency': time.perf_counter() - start, 'ttfb': ttfb}
+
+        for _ in range(options['warmup']):
+            call()
+
+        results: List[Dict[str, Any]] = []
+        lock = threading.Lock()
+        deadline = time.monotonic() + options['duration'] if options['duration'] else None
+        remaining = [options['requests']]
+
+        def take() -> bool:
+            with lock:
+                if deadline is not None:
+                    return time.monotonic() < deadline
+                if remaining[0] <= 0:
+                    return False
+                remaining[0] -= 1
+                return True
+
+        def worker() -> None:
+            while take():
+                result = call()
+                with lock:
+                    results.append(result)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            for _ in range(options['concurrency']):
+                executor.submit(worker)
+        elapsed = time.perf_counter() - started
+
+        report = self._report(results, elapsed, options, url)
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+        else:
+            self._print(report)
+
+    def _token_for(self, user_id: Optional[int]) -> Optional[str]:
+        if user_id is None:
+            return None
+        from wxcloudrun.apps.users.models import User
+        from wxcloudrun.apps.core.authentication.jwt_auth import JWTAuthentication
+        try:
+            return JWTAuthentication.generate_token(User.objects.get(id=user_id))['access_token']
+        except User.DoesNotExist:
+            raise CommandError(f"用户不存在: {user_id}")
+
+    def _report(self, results: List[Dict[str, Any]], elapsed: float, options, url: str) -> Dict[str, Any]:
+        statuses: Dict[str, int] = {}
+        for result in results:
+            statuses[str(result['status'])] = statuses.get(str(result['status']), 0) + 1
+        ok = [r for r in results if isinstance(r['status'], int) and r['status'] < 400]
+        latencies = [r['latency'] for r in ok]
+        ttfbs = [r['ttfb'] for r in ok if r['ttfb'] is not None]
+
+        def summary(values: List[float]) -> Dict[str, float]:
+            return {
+                'p50': round(percentile(values, 50) * 1000, 1),
+                'p95': round(percentile(values, 95) * 1000, 1),
+                'p99': round(percentile(values, 99) * 1000, 1),
+                'max': round(max(values) * 1000, 1) if values else 0.0,
+            }
+
+        return {
+            'url': url,
+            'concurrency': options['concurrency'],
+            'requests': len(results),
+            'succeeded': len(ok),
+            'error_rate': round(1 - len(ok) / len(results), 4) if results else 0.0,
+            'elapsed': round(elapsed, 2),
+            'throughput': round(len(results) / elapsed, 2) if elapsed else 0.0,
+            'statuses': statuses,
+            'latency_ms': summary(latencies),
+            'ttfb_ms': summary(ttfbs),
+        }
+
+    def _print(self, report: Dict[str, Any]) -> None:
+        self.stdout.write(f"{report['url']}  并发 {report['concurrency']}")
+        self.stdout.write(
+            f"请求 {report['requests']}，成功 {report['succeeded']}，错误率 {report['error_rate']:.2%}，"
+            f"耗时 {report['elapsed']}s，吞吐 {report['throughput']} req/s"
+        )
+        self.stdout.write(f"状态码: {report['statuses']}")
+        for name in ('latency_ms', 'ttfb_ms'):
+            values = report[name]
+            self.stdout.write(
+                f"{name:<11} p50 {values['p50']:>8}  p95 {values['p95']:>8}  p99 {values['p99']:>8}  max {values['max']:>8}"
+            )
@@ -2,8 +2,9 @@ import json
 import logging
 from django.conf import settings
 from django.utils import timezone
-from wxcloudrun.apps.users.models import AIUsageStats
-from .coze_service import CozeService
+from .coze_service import get_coze_service
+from .quota import get_quota_engine
+from .usage_stats import get_usage_aggregator
 
 logger = logging.getLogger('apps.core')
 
@@ -12,49 +13,42 @@ class AIService:
     
     def __init__(self, user):
         self.user = user
-        self.coze = CozeService()
+        # 复用进程内共享的 CozeService，避免每次请求重新解析私钥
+        self.coze = get_coze_service()
+        self._reservation = None
         
+    def _invoke(self, workflow_id, inputs):
+        """调用工作流（经过结果缓存、请求合并和熔断），返回工作流输出，字段位于响应顶层"""
+        return self.coze._make_request('/workflow/invoke', {
+            'workflow_id': workflow_id,
+            'inputs': inputs
+        })
+
     def _check_usage_limit(self):
-        """检查API调用限制"""
-        today_calls = AIUsageStats.objects.filter(
-            user=self.user,
-            call_date=timezone.now().date()
-        ).aggregate(
-            total_calls=models.Sum('call_count')
-        )['total_calls'] or 0
-        
-        if today_calls >= settings.COZE_SETTINGS['RATE_LIMIT_QPD']:
-            raise Exception('已达到今日调用限制')
+        """预占一次今日调用额度（原子计数，超出限制时抛出 QuotaExceededError）"""
+        if self.user is None:
+            return
+        self._reservation = get_quota_engine().reserve(self.user.id)
             
     def _update_stats(self, api_name, success=True):
-        """更新API调用统计"""
-        stats, _ = AIUsageStats.objects.get_or_create(
-            user=self.user,
-            api_name=api_name,
-            call_date=timezone.now().date()
-        )
-        stats.call_count += 1
-        if success:
-            stats.success_count += 1
-        else:
-            stats.error_count += 1
-        stats.save()
+        """更新API调用统计：失败时退还预占的额度，统计先在内存中累加，由后台批量写入"""
+        reservation, self._reservation = self._reservation, None
+        if not success and reservation is not None:
+            reservation.refund()
+        if self.user is not None:
+            get_usage_aggregator().record(self.user.id, api_name, success)
             
     def analyze_emotion(self, content):
-        """情绪分析"""
+        """情绪分析（额度用尽时抛出 QuotaExceededError）"""
+        self._check_usage_limit()
         try:
-            self._check_usage_limit()
-            
             # 调用工作流进行情绪分析
-            result = self.coze.run_workflow({
-                'task_type': 'emotion',
+            output = self._invoke(settings.COZE_EMOTION_ANALYSIS_WORKFLOW_ID, {
                 'content': content
             })
             
             self._update_stats('emotion_analysis', True)
             
-            # 解析工作流返回结果
-            output = json.loads(result.data)
             return {
                 'emotion_type': output.get('emotion_type'),
                 'emotion_level': output.get('emotion_level', 50),
@@ -68,24 +62,18 @@ class AIService:
             return None
             
     def analyze_career(self, content, action_type=None, target_position=None):
-        """职业发展分析"""
+        """职业发展分析（额度用尽时抛出 QuotaExceededError）"""
+        self._check_usage_limit()
         try:
-            self._check_usage_limit()
-            
             # 调用工作流进行职业分析
-            result = self.coze.run_workflow({
-                'task_type': 'career',
-                'content': content,
-                'additional_params': {
-                    'action_type': action_type,
-                    'target_position': target_position
-                }
+            output = self._invoke(settings.COZE_CAREER_ACTION_WORKFLOW_ID, {
+                'description': content,
+                'action_type': action_type,
+                'target_position': target_position
             })
             
             self._update_stats('career_analysis', True)
             
-            # 解析工作流返回结果
-            output = json.loads(result.data)
             return {
                 'suggestion': output.get('suggestion', ''),
                 'skills': output.get('skills', []),
@@ -97,25 +85,20 @@ class AIService:
             logger.error('职业分析失败: %s', str(e), exc_info=True)
             return None
             
-    def generate_summary(self, title, content, url=None):
-        """生成内容摘要"""
-        try:
+    def generate_summary(self, title, content, url=None, reserve=True):
+        """生成内容摘要；reserve 为 False 时不预占额度（长文本分块摘要由调用方整篇预占一次），额度用尽时抛出 QuotaExceededError"""
+        if reserve:
             self._check_usage_limit()
-            
+        try:
             # 调用工作流生成摘要
-            result = self.coze.run_workflow({
-                'task_type': 'summary',
+            output = self._invoke(settings.COZE_COLLECTION_SUMMARY_WORKFLOW_ID, {
+                'title': title,
                 'content': content,
-                'additional_params': {
-                    'title': title,
-                    'url': url
-                }
+                'url': url
             })
             
             self._update_stats('content_summary', True)
             
-            # 解析工作流返回结果
-            output = json.loads(result.data)
             return {
                 'summary': output.get('summary', ''),
                 'tags': output.get('tags', []),
@@ -127,21 +110,61 @@ class AIService:
             logger.error('生成摘要失败: %s', str(e), exc_info=True)
             return None
             
-    def evaluate_ability(self, actions):
-        """能力评估"""
+    def _stream(self, api_name, workflow_id, inputs):
+        """流式调用工作流，逐段返回文本；正常结束、出错或客户端断开后都会更新调用统计"""
+        self._check_usage_limit()
+        stream = self.coze.stream_workflow(workflow_id, inputs)
+        success = False
         try:
-            self._check_usage_limit()
+            for chunk in stream:
+                yield chunk
+            success = True
+        except GeneratorExit:
+            # 客户端断开连接时 Django 关闭生成器：工作流已经执行，照常计入额度
+            success = True
+            logger.info('客户端断开流式连接(%s)', api_name)
+            raise
+        except Exception as e:
+            logger.error('流式调用失败(%s): %s', api_name, str(e))
+            raise
+        finally:
+            # 立即关闭上游流，释放连接和并发槽位
+            stream.close()
+            self._update_stats(api_name, success)
+        
+    def stream_emotion_analysis(self, content):
+        """情绪分析（流式）"""
+        return self._stream('emotion_analysis', settings.COZE_EMOTION_ANALYSIS_WORKFLOW_ID, {
+            'content': content
+        })
+        
+    def stream_career_analysis(self, content, action_type=None, target_position=None):
+        """职业发展分析（流式）"""
+        return self._stream('career_analysis', settings.COZE_CAREER_ACTION_WORKFLOW_ID, {
+            'description': content,
+            'action_type': action_type,
+            'target_position': target_position
+        })
+        
+    def stream_summary(self, title, content, url=None):
+        """生成内容摘要（流式）"""
+        return self._stream('content_summary', settings.COZE_COLLECTION_SUMMARY_WORKFLOW_ID, {
+            'title': title,
+            'content': content,
+            'url': url
+        })
             
+    def evaluate_ability(self, actions):
+        """能力评估（额度用尽时抛出 QuotaExceededError）"""
+        self._check_usage_limit()
+        try:
             # 调用工作流进行能力评估
-            result = self.coze.run_workflow({
-                'task_type': 'ability',
-                'content': json.dumps(actions)
+            output = self._invoke(settings.COZE_CAREER_ABILITY_WORKFLOW_ID, {
+                'experience': json.dumps(actions, ensure_ascii=False)
             })
             
             self._update_stats('ability_evaluation', True)
             
-            # 解析工作流返回结果
-            output = json.loads(result.data)
             return {
                 'overall_score': output.get('overall_score', 0),
                 'skills': output.get('skills', []),
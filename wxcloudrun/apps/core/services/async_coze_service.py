@@ -0,0 +1,163 @@
+import asyncio
+import copy
+import json
+import weakref
+import logging
+from typing import Optional, Dict, Any, Tuple
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential
+from .coze_service import CozeService, CozeServiceError, CozeTransientError, registry, _should_retry
+
+logger = logging.getLogger(__name__)
+
+# 每个事件循环一个 AsyncClient（httpx 连接不能跨事件循环使用）
+_clients: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]' = weakref.WeakKeyDictionary()
+
+def get_async_client() -> httpx.AsyncClient:
+    """获取当前事件循环共享的异步连接池"""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        read_timeout = getattr(settings, 'COZE_READ_TIMEOUT', getattr(settings, 'COZE_API_TIMEOUT', 30))
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=getattr(settings, 'COZE_ASYNC_MAX_CONNECTIONS', 200),
+                max_keepalive_connections=getattr(settings, 'COZE_HTTP_POOL_MAXSIZE', 10)
+            ),
+            timeout=httpx.Timeout(
+                read_timeout,
+                connect=getattr(settings, 'COZE_CONNECT_TIMEOUT', 3.05)
+            )
+        )
+        _clients[loop] = client
+    return client
+
+_in_flight: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Future]]' = weakref.WeakKeyDictionary()
+
+def _in_flight_calls() -> Dict[str, asyncio.Future]:
+    """当前事件循环中正在进行的调用"""
+    loop = asyncio.get_running_loop()
+    calls = _in_flight.get(loop)
+    if calls is None:
+        calls = _in_flight[loop] = {}
+    return calls
+
+class AsyncCozeService(CozeService):
+    """基于 asyncio 的 COZE 客户端，工作流方法与 CozeService 一致"""
+
+    async def _prepare_request_async(self, endpoint: str, data: Dict[str, Any]) -> Tuple[str, Dict[str, str]]:
+        """生成请求头；每个请求的 RSA 签名和换取令牌都放到线程池执行，避免阻塞事件循环"""
+        if self.token_provider is not None and self.token_provider.peek() is not None:
+            # 已有缓存的访问令牌，只需拼接请求头
+            return self._prepare_request(endpoint, data)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._prepare_request, endpoint, data)
+
+    async def _make_request(self, endpoint: str, data: Dict[str, Any], use_cache: bool = True) -> Dict[str, Any]:
+        """发送异步请求到 COZE API：相同工作流与输入优先返回缓存结果，并发的相同调用合并为一次"""
+        workflow_id = data.get('workflow_id')
+        if not workflow_id:
+            self.resilience.retry_budget.record_request()
+            return await self._send_request(endpoint, data)
+
+        result_cache = self.result_cache
+        cacheable = result_cache.is_cacheable(workflow_id, use_cache)
+        key = result_cache.make_key(workflow_id, data.get('inputs', {}))
+        if cacheable:
+            result = result_cache.get_local(key)
+            if result is not None:
+                return result
+
+            # 共享缓存（Redis）是阻塞 IO，放到线程池执行
+            result = await sync_to_async(result_cache.get_shared, thread_sensitive=False)(key, workflow_id)
+            if result is not None:
+                return result
+
+        async def fetch() -> Dict[str, Any]:
+            self.resilience.retry_budget.record_request()
+            result = await self._send_request(endpoint, data)
+            if cacheable:
+                await sync_to_async(result_cache.set, thread_sensitive=False)(key, workflow_id, result)
+            return result
+
+        # 同一事件循环内合并相同的并发调用；shield 保证单个等待者被取消时不影响其他等待者
+        in_flight = _in_flight_calls()
+        task = in_flight.get(key)
+        if task is None:
+            task = in_flight[key] = asyncio.ensure_future(fetch())
+            task.add_done_callback(lambda _: in_flight.pop(key, None))
+        return copy.deepcopy(await asyncio.shield(task))
+
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=4, max=10),
+        retry=retry_if_exception(_should_retry),
+        reraise=True
+    )
+    async def _send_request(self, endpoint: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """发送异步请求到 COZE API；每次尝试都经过所属工作流的熔断器和并发限制"""
+        url = f"{self.base_url}{endpoint}"
+
+        with self.resilience.guard(data.get('workflow_id') or endpoint):
+            try:
+                url, headers = await self._prepare_request_async(endpoint, data)
+
+                response = await get_async_client().post(url, json=data, headers=headers)
+
+                if response.status_code == 401:
+                    self._handle_unauthorized(headers)
+
+                # 检查响应状态码
+                response.raise_for_status()
+
+                # 解析响应并检查业务状态码
+                return self._check_result(response.json())
+
+            except CozeServiceError:
+                raise
+            except httpx.ConnectTimeout:
+                logger.error(f"连接超时: {url}")
+                raise CozeTransientError("连接超时")
+            except httpx.TimeoutException:
+                logger.error(f"请求超时: {url}")
+                raise CozeTransientError("请求超时")
+            except httpx.HTTPStatusError as e:
+                logger.error(f"请求失败: {str(e)}")
+                error_class = CozeTransientError if self._is_transient_status(e.response.status_code) else CozeServiceError
+                raise error_class(f"请求失败: {str(e)}")
+            except httpx.HTTPError as e:
+                logger.error(f"请求失败: {str(e)}")
+                raise CozeTransientError(f"请求失败: {str(e)}")
+            except json.JSONDecodeError:
+                logger.error("响应解析失败")
+                raise CozeServiceError("响应解析失败")
+            except Exception as e:
+                logger.error(f"未知错误: {str(e)}")
+                raise CozeServiceError(f"未知错误: {str(e)}")
+
+    # 以下方法复用 CozeService 的参数校验与请求体构造，_make_request 返回协程
+    async def generate_emotion_photo(self, text: str, style: Optional[str] = None) -> Dict[str, Any]:
+        """生成情绪照片"""
+        return await super().generate_emotion_photo(text, style)
+
+    async def generate_emotion_curve(self, emotions: list) -> Dict[str, Any]:
+        """生成情绪曲线"""
+        return await super().generate_emotion_curve(emotions)
+
+    async def generate_career_action(self, description: str) -> Dict[str, Any]:
+        """生成职业行动建议"""
+        return await super().generate_career_action(description)
+
+    async def generate_career_ability(self, experience: str) -> Dict[str, Any]:
+        """生成能力画像"""
+        return await super().generate_career_ability(experience)
+
+    async def generate_collection_summary(self, content: str) -> Dict[str, Any]:
+        """生成智能摘要"""
+        return await super().generate_collection_summary(content)
+
+def get_async_coze_service() -> AsyncCozeService:
+    """获取进程内共享的 AsyncCozeService"""
+    return registry.get('async', AsyncCozeService)
@@ -0,0 +1,127 @@
+import time
+import uuid
+import threading
+import logging
+from typing import Optional, Dict, Any, Tuple
+import jwt
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+class CozeAuthError(Exception):
+    """COZE 鉴权异常"""
+    pass
+
+class CozeTokenProvider:
+    """COZE 访问令牌：用私钥签发 JWT 换取短期 access_token，进程内缓存并通过 cache 跨 worker 共享"""
+
+    GRANT_TYPE = 'urn:ietf:params:oauth:grant-type:jwt-bearer'
+
+    def __init__(self, app_id: str, public_key_fingerprint: str, key_loader, transport_getter, base_url: str):
+        self.app_id = app_id
+        self.public_key_fingerprint = public_key_fingerprint
+        self.key_loader = key_loader
+        self.transport_getter = transport_getter
+        self.token_url = getattr(
+            settings, 'COZE_OAUTH_TOKEN_URL', f"{base_url}/api/permission/oauth2/token"
+        )
+        self.audience = getattr(settings, 'COZE_OAUTH_AUDIENCE', 'api.coze.cn')
+        self.token_ttl = getattr(settings, 'COZE_ACCESS_TOKEN_TTL', 900)
+        # 到期前提前刷新，避免请求途中令牌过期
+        self.refresh_margin = getattr(settings, 'COZE_ACCESS_TOKEN_REFRESH_MARGIN', 60)
+        self.cache_key = f"coze:access_token:{app_id}"
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def _is_fresh(self, expires_at: float) -> bool:
+        return time.time() < expires_at - self.refresh_margin
+
+    def get_token(self) -> str:
+        """获取有效的访问令牌（热路径仅读内存）"""
+        token, expires_at = self._token, self._expires_at
+        if token and self._is_fresh(expires_at):
+            return token
+
+        with self._lock:
+            if self._token and self._is_fresh(self._expires_at):
+                return self._token
+
+            # 其他 worker 可能已经换取过令牌
+            shared = cache.get(self.cache_key)
+            if shared and self._is_fresh(shared['expires_at']):
+                self._token, self._expires_at = shared['token'], shared['expires_at']
+                return self._token
+
+            token, expires_at = self._mint()
+            self._token, self._expires_at = token, expires_at
+            cache.set(
+                self.cache_key,
+                {'token': token, 'expires_at': expires_at},
+                timeout=max(int(expires_at - time.time() - self.refresh_margin), 1)
+            )
+            return token
+
+    def peek(self) -> Optional[str]:
+        """返回内存中仍有效的令牌，不触发换取"""
+        token, expires_at = self._token, self._expires_at
+        if token and self._is_fresh(expires_at):
+            return token
+        return None
+
+    def invalidate(self, token: Optional[str] = None) -> None:
+        """令牌被服务端拒绝时作废（仅作废指定的令牌，避免误删新令牌）"""
+        with self._lock:
+            if token is None or token == self._token:
+                self._token, self._expires_at = None, 0.0
+            shared = cache.get(self.cache_key)
+            if shared and (token is None or shared['token'] == token):
+                cache.delete(self.cache_key)
+
+    def _build_assertion(self) -> str:
+        """用私钥签发 JWT 断言"""
+        now = int(time.time())
+        payload = {
+            'iss': self.app_id,
+            'aud': self.audience,
+            'iat': now,
+            'exp': now + 300,
+            'jti': uuid.uuid4().hex
+        }
+        return jwt.encode(
+            payload,
+            self.key_loader.get(),
+            algorithm='RS256',
+            headers={'kid': self.public_key_fingerprint}
+        )
+
+    def _mint(self) -> Tuple[str, float]:
+        """换取新的访问令牌"""
+        try:
+            response = self.transport_getter().post(
+                self.token_url,
+                json={
+                    'grant_type': self.GRANT_TYPE,
+                    'duration_seconds': self.token_ttl
+                },
+                headers={
+                    'Content-Type': 'application/json',
+                    'Authorization': f"Bearer {self._build_assertion()}"
+                }
+            )
+            response.raise_for_status()
+            result: Dict[str, Any] = response.json()
+        except Exception as e:
+            logger.error(f"获取访问令牌失败: {str(e)}")
+            raise CozeAuthError(f"获取访问令牌失败: {str(e)}")
+
+        token = result.get('access_token')
+        if not token:
+            raise CozeAuthError(f"获取访问令牌失败: {result.get('error_message', '响应缺少 access_token')}")
+
+        # expires_in 可能是绝对时间戳，也可能是有效秒数
+        expires_in = float(result.get('expires_in') or self.token_ttl)
+        expires_at = expires_in if expires_in > 10 ** 9 else time.time() + expires_in
+        logger.info(f"已换取 COZE 访问令牌，有效期至 {int(expires_at)}")
+        return token, expires_at
@@ -1,47 +1,160 @@
 import os
 import time
 import json
+import threading
 import requests
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple, Callable, Iterator
 from cryptography.hazmat.primitives import serialization, hashes
 from cryptography.hazmat.primitives.asymmetric import padding
 from cryptography.hazmat.primitives.asymmetric.rsa import RSAPrivateKey
 from django.conf import settings
+from django.utils.functional import SimpleLazyObject
 import base64
 import logging
 from requests.exceptions import RequestException
-from tenacity import retry, stop_after_attempt, wait_exponential
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential
+from .http_pool import get_transport
+from .coze_auth import CozeTokenProvider
+from .result_cache import get_result_cache
+from .singleflight import SingleFlight
+from .resilience import Resilience
+from .sse import parse_sse
 
 logger = logging.getLogger(__name__)
 
 class CozeServiceError(Exception):
     """COZE 服务异常"""
+    code = 500
+
+class CozeTransientError(CozeServiceError):
+    """临时性故障（超时、连接失败、限流或服务端错误），可以重试"""
     pass
 
+class CozeCircuitOpenError(CozeServiceError):
+    """工作流熔断中，请求被直接拒绝"""
+    code = 503
+
+class CozeOverloadedError(CozeServiceError):
+    """工作流并发调用已达上限，请求被直接拒绝"""
+    code = 429
+
+def _should_retry(e: BaseException) -> bool:
+    """只重试临时性故障，且需要全局重试预算允许"""
+    return isinstance(e, CozeTransientError) and get_resilience().retry_budget.try_spend()
+
+class PrivateKeyLoader:
+    """私钥加载器：每个进程只解析一次，文件变化后自动重新加载"""
+
+    def __init__(self, path: str, check_interval: Optional[float] = None):
+        self.path = path
+        self.check_interval = check_interval if check_interval is not None else getattr(
+            settings, 'COZE_PRIVATE_KEY_CHECK_INTERVAL', 30
+        )
+        self._key: Optional[RSAPrivateKey] = None
+        self._file_signature = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def _stat(self):
+        """文件签名：(inode, 大小, 修改时间)"""
+        stat = os.stat(self.path)
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def get(self) -> RSAPrivateKey:
+        """获取私钥，仅在检查间隔到期时才 stat 文件"""
+        if self._key is not None and time.monotonic() < self._next_check:
+            return self._key
+
+        with self._lock:
+            if self._key is not None and time.monotonic() < self._next_check:
+                return self._key
+            try:
+                file_signature = self._stat()
+                if self._key is None or file_signature != self._file_signature:
+                    self._key = self._load(file_signature)
+            except Exception as e:
+                if self._key is None:
+                    logger.error(f"加载私钥失败: {str(e)}")
+                    raise CozeServiceError(f"加载私钥失败: {str(e)}")
+                # 密钥轮换过程中文件可能暂时不可读，继续使用旧密钥
+                logger.warning(f"重新加载私钥失败，继续使用已加载的私钥: {str(e)}")
+            self._next_check = time.monotonic() + self.check_interval
+            return self._key
+
+    def _load(self, file_signature) -> RSAPrivateKey:
+        """从磁盘读取并解析 PEM 私钥"""
+        with open(self.path, 'rb') as key_file:
+            key = serialization.load_pem_private_key(
+                key_file.read(),
+                password=None
+            )
+        if self._key is not None:
+            logger.info(f"私钥文件已变更，重新加载: {self.path}")
+        self._file_signature = file_signature
+        return key
+
+_key_loaders: Dict[str, PrivateKeyLoader] = {}
+_key_loaders_lock = threading.Lock()
+
+def get_private_key_loader(path: str) -> PrivateKeyLoader:
+    """按路径获取共享的私钥加载器"""
+    loader = _key_loaders.get(path)
+    if loader is None:
+        with _key_loaders_lock:
+            loader = _key_loaders.get(path)
+            if loader is None:
+                loader = _key_loaders[path] = PrivateKeyLoader(path)
+    return loader
+
+_token_providers: Dict[str, CozeTokenProvider] = {}
+_token_providers_lock = threading.Lock()
+
+def get_token_provider(service: 'CozeService') -> CozeTokenProvider:
+    """按应用获取共享的访问令牌提供者"""
+    provider = _token_providers.get(service.app_id)
+    if provider is None:
+        with _token_providers_lock:
+            provider = _token_providers.get(service.app_id)
+            if provider is None:
+                provider = _token_providers[service.app_id] = CozeTokenProvider(
+                    app_id=service.app_id,
+                    public_key_fingerprint=service.public_key_fingerprint,
+                    key_loader=service.key_loader,
+                    transport_getter=get_transport,
+                    base_url=service.base_url
+                )
+    return provider
+
 class CozeService:
     def __init__(self):
         self.base_url = settings.COZE_API_BASE_URL
         self.app_id = settings.COZE_APP_ID
         self.private_key_path = settings.COZE_PRIVATE_KEY_PATH
         self.public_key_fingerprint = settings.COZE_PUBLIC_KEY_FINGERPRINT
-        self.timeout = getattr(settings, 'COZE_API_TIMEOUT', 30)
-        self.private_key: Optional[RSAPrivateKey] = None
-        self._load_private_key()
+        self.key_loader = get_private_key_loader(self.private_key_path)
+        # signature: 每个请求 RSA 签名；token: 使用缓存的短期访问令牌
+        self.auth_mode = getattr(settings, 'COZE_AUTH_MODE', 'signature')
+        self.token_provider = get_token_provider(self) if self.auth_mode == 'token' else None
+
+    @property
+    def transport(self):
+        """当前进程的共享连接池"""
+        return get_transport()
 
-    def _load_private_key(self) -> None:
+    @property
+    def timeout(self):
+        return self.transport.timeout
+
+    @property
+    def private_key(self) -> RSAPrivateKey:
+        """私钥由进程内共享的加载器缓存，请求路径上不再读盘"""
+        return self.key_loader.get()
+
+    def _load_private_key(self) -> RSAPrivateKey:
         """加载私钥"""
-        try:
-            if not os.path.exists(self.private_key_path):
-                raise CozeServiceError(f"私钥文件不存在: {self.private_key_path}")
-                
-            with open(self.private_key_path, 'rb') as key_file:
-                self.private_key = serialization.load_pem_private_key(
-                    key_file.read(),
-                    password=None
-                )
-        except Exception as e:
-            logger.error(f"加载私钥失败: {str(e)}")
-            raise CozeServiceError(f"加载私钥失败: {str(e)}")
+        if not os.path.exists(self.private_key_path):
+            raise CozeServiceError(f"私钥文件不存在: {self.private_key_path}")
+        return self.key_loader.get()
 
     def _generate_signature(self, data: Dict[str, Any]) -> str:
         """生成请求签名"""
@@ -65,64 +178,230 @@ class CozeService:
             logger.error(f"生成签名失败: {str(e)}")
             raise CozeServiceError(f"生成签名失败: {str(e)}")
 
+    def _build_auth_headers(self, data: Dict[str, Any]) -> Dict[str, str]:
+        """生成鉴权请求头"""
+        if self.token_provider is not None:
+            return {'Authorization': f"Bearer {self.token_provider.get_token()}"}
+
+        return {
+            'X-Public-Key-Fingerprint': self.public_key_fingerprint,
+            'X-Signature': self._generate_signature(data)
+        }
+
+    def _prepare_request(self, endpoint: str, data: Dict[str, Any]) -> Tuple[str, Dict[str, str]]:
+        """补充公共参数并生成请求头"""
+        # 添加时间戳和应用ID
+        data['timestamp'] = int(time.time())
+        data['app_id'] = self.app_id
+
+        # 设置请求头（签名或缓存的访问令牌）
+        headers = {
+            'Content-Type': 'application/json',
+            **self._build_auth_headers(data)
+        }
+        return f"{self.base_url}{endpoint}", headers
+
+    def _handle_unauthorized(self, headers: Dict[str, str]) -> None:
+        """访问令牌被拒绝时作废，重试时重新换取"""
+        if self.token_provider is not None:
+            self.token_provider.invalidate(headers['Authorization'][len('Bearer '):])
+
+    def _check_result(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """检查业务状态码"""
+        if result.get('code') != 200:
+            raise CozeServiceError(
+                f"业务处理失败: {result.get('message', '未知错误')}"
+            )
+        return result
+
+    @property
+    def result_cache(self):
+        """进程内共享的工作流结果缓存"""
+        return get_result_cache()
+
+    @property
+    def single_flight(self) -> SingleFlight:
+        """进程内共享的请求合并器"""
+        return get_single_flight()
+
+    @property
+    def resilience(self) -> Resilience:
+        """进程内共享的熔断器、并发限制器和重试预算"""
+        return get_resilience()
+
+    def _make_request(self, endpoint: str, data: Dict[str, Any], use_cache: bool = True) -> Dict[str, Any]:
+        """发送请求到 COZE API：相同工作流与输入优先返回缓存结果，并发的相同调用合并为一次"""
+        workflow_id = data.get('workflow_id')
+        if not workflow_id:
+            self.resilience.retry_budget.record_request()
+            return self._send_request(endpoint, data)
+
+        # 在补充时间戳等公共参数之前计算缓存键
+        result_cache = self.result_cache
+        cacheable = result_cache.is_cacheable(workflow_id, use_cache)
+        key = result_cache.make_key(workflow_id, data.get('inputs', {}))
+        if cacheable:
+            result = result_cache.get(key, workflow_id)
+            if result is not None:
+                return result
+
+        def fetch() -> Dict[str, Any]:
+            self.resilience.retry_budget.record_request()
+            result = self._send_request(endpoint, data)
+            if cacheable:
+                result_cache.set(key, workflow_id, result)
+            return result
+
+        # 不缓存的工作流（如情绪照片）同样合并并发的重复调用，例如用户连续点击
+        return self.single_flight.do(key, fetch)
+
     @retry(
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=1, min=4, max=10),
-        retry=lambda e: isinstance(e, (RequestException, CozeServiceError))
+        retry=retry_if_exception(_should_retry),
+        reraise=True
     )
-    def _make_request(self, endpoint: str, data: Dict[str, Any]) -> Dict[str, Any]:
-        """发送请求到 COZE API"""
+    def _send_request(self, endpoint: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """发送请求到 COZE API；每次尝试都经过所属工作流的熔断器和并发限制"""
         url = f"{self.base_url}{endpoint}"
         
-        try:
-            # 添加时间戳和应用ID
-            data['timestamp'] = int(time.time())
-            data['app_id'] = self.app_id
-            
-            # 生成签名
-            signature = self._generate_signature(data)
-            
-            # 设置请求头
-            headers = {
-                'Content-Type': 'application/json',
-                'X-Public-Key-Fingerprint': self.public_key_fingerprint,
-                'X-Signature': signature
-            }
-            
-            # 发送请求
-            response = requests.post(
-                url,
-                json=data,
-                headers=headers,
-                timeout=self.timeout
-            )
-            
-            # 检查响应状态码
-            response.raise_for_status()
-            
-            # 解析响应
-            result = response.json()
-            
-            # 检查业务状态码
-            if result.get('code') != 200:
-                raise CozeServiceError(
-                    f"业务处理失败: {result.get('message', '未知错误')}"
+        with self.resilience.guard(data.get('workflow_id') or endpoint):
+            try:
+                url, headers = self._prepare_request(endpoint, data)
+                
+                # 通过共享连接池发送请求，复用长连接
+                response = self.transport.post(
+                    url,
+                    json=data,
+                    headers=headers,
+                    timeout=self.timeout
                 )
                 
-            return result
-            
-        except requests.exceptions.Timeout:
-            logger.error(f"请求超时: {url}")
-            raise CozeServiceError("请求超时")
-        except requests.exceptions.RequestException as e:
-            logger.error(f"请求失败: {str(e)}")
-            raise CozeServiceError(f"请求失败: {str(e)}")
+                if response.status_code == 401:
+                    self._handle_unauthorized(headers)
+
+                # 检查响应状态码
+                response.raise_for_status()
+                
+                # 解析响应并检查业务状态码
+                return self._check_result(response.json())
+                
+            except CozeServiceError:
+                raise
+            except requests.exceptions.ConnectTimeout:
+                logger.error(f"连接超时: {url}")
+                raise CozeTransientError("连接超时")
+            except requests.exceptions.Timeout:
+                logger.error(f"请求超时: {url}")
+                raise CozeTransientError("请求超时")
+            except requests.exceptions.HTTPError as e:
+                logger.error(f"请求失败: {str(e)}")
+                error_class = CozeTransientError if self._is_transient_status(e.response.status_code) else CozeServiceError
+                raise error_class(f"请求失败: {str(e)}")
+            except requests.exceptions.RequestException as e:
+                logger.error(f"请求失败: {str(e)}")
+                raise CozeTransientError(f"请求失败: {str(e)}")
+            except json.JSONDecodeError:
+                logger.error("响应解析失败")
+                raise CozeServiceError("响应解析失败")
+            except Exception as e:
+                logger.error(f"未知错误: {str(e)}")
+                raise CozeServiceError(f"未知错误: {str(e)}")
+
+    def _is_transient_status(self, status_code: int) -> bool:
+        """限流、服务端错误可以重试；使用访问令牌时 401 换取新令牌后重试"""
+        return status_code == 429 or status_code >= 500 or (status_code == 401 and self.token_provider is not None)
+
+    def stream_workflow(self, workflow_id: str, inputs: Dict[str, Any]) -> Iterator[str]:
+        """以流式方式执行工作流，逐段返回生成的文本
+
+        读取超时作用于相邻两段数据之间，而不是整个生成过程；流式调用不重试、不缓存。
+        """
+        endpoint = getattr(settings, 'COZE_STREAM_ENDPOINT', '/workflow/stream_run')
+        data = {
+            'workflow_id': workflow_id,
+            'inputs': inputs
+        }
+        self.resilience.retry_budget.record_request()
+
+        with self.resilience.guard(workflow_id):
+            url, headers = self._prepare_request(endpoint, data)
+            headers['Accept'] = 'text/event-stream'
+            try:
+                response = self.transport.post(
+                    url,
+                    json=data,
+                    headers=headers,
+                    timeout=self.timeout,
+                    stream=True
+                )
+            except requests.exceptions.Timeout:
+                logger.error(f"请求超时: {url}")
+                raise CozeTransientError("请求超时")
+            except requests.exceptions.RequestException as e:
+                logger.error(f"请求失败: {str(e)}")
+                raise CozeTransientError(f"请求失败: {str(e)}")
+
+            try:
+                if response.status_code == 401:
+                    self._handle_unauthorized(headers)
+                if response.status_code != 200:
+                    error_class = CozeTransientError if self._is_transient_status(response.status_code) else CozeServiceError
+                    raise error_class(f"请求失败: HTTP {response.status_code}")
+
+                response.encoding = 'utf-8'
+                for event, payload in parse_sse(response.iter_lines(decode_unicode=True)):
+                    if event == 'Done':
+                        return
+                    if event == 'Error':
+                        raise CozeServiceError(f"业务处理失败: {self._stream_error_message(payload)}")
+                    if event == 'Message':
+                        content = self._stream_content(payload)
+                        if content:
+                            yield content
+            except requests.exceptions.RequestException as e:
+                # 已经开始输出后中断，只能由调用方决定如何处理已收到的部分
+                logger.error(f"流式读取中断: {str(e)}")
+                raise CozeTransientError(f"流式读取中断: {str(e)}")
+            finally:
+                response.close()
+
+    @staticmethod
+    def _stream_content(payload: str) -> str:
+        """Message 事件中的文本片段"""
+        try:
+            message = json.loads(payload)
         except json.JSONDecodeError:
-            logger.error("响应解析失败")
-            raise CozeServiceError("响应解析失败")
-        except Exception as e:
-            logger.error(f"未知错误: {str(e)}")
-            raise CozeServiceError(f"未知错误: {str(e)}")
+            return payload
+        if isinstance(message, dict):
+            return message.get('content') or ''
+        return str(message)
+
+    @staticmethod
+    def _stream_error_message(payload: str) -> str:
+        try:
+            error = json.loads(payload)
+        except json.JSONDecodeError:
+            return payload
+        if isinstance(error, dict):
+            return error.get('error_message') or error.get('message') or payload
+        return payload
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """获取连接池统计（新建连接数 / 复用次数）"""
+        return self.transport.stats()
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """获取结果缓存命中统计"""
+        return self.result_cache.stats()
+
+    def get_single_flight_stats(self) -> Dict[str, Any]:
+        """获取请求合并统计"""
+        return self.single_flight.stats()
+
+    def get_resilience_stats(self) -> Dict[str, Any]:
+        """获取熔断器状态、并发上限和重试预算"""
+        return self.resilience.stats()
 
     def generate_emotion_photo(self, text: str, style: Optional[str] = None) -> Dict[str, Any]:
         """生成情绪照片"""
@@ -190,5 +469,64 @@ class CozeService:
         }
         return self._make_request('/workflow/invoke', data)
 
-# 创建服务实例
-coze_service = CozeService()
\ No newline at end of file
+_single_flight: Optional[SingleFlight] = None
+_single_flight_lock = threading.Lock()
+
+def get_single_flight() -> SingleFlight:
+    """获取进程内共享的请求合并器"""
+    global _single_flight
+    if _single_flight is None:
+        with _single_flight_lock:
+            if _single_flight is None:
+                _single_flight = SingleFlight(error_class=CozeServiceError)
+    return _single_flight
+
+_resilience: Optional[Resilience] = None
+_resilience_lock = threading.Lock()
+
+def get_resilience() -> Resilience:
+    """获取进程内共享的熔断器、并发限制器和重试预算"""
+    global _resilience
+    if _resilience is None:
+        with _resilience_lock:
+            if _resilience is None:
+                _resilience = Resilience(
+                    open_error=CozeCircuitOpenError,
+                    overload_error=CozeOverloadedError,
+                    is_failure=lambda e: isinstance(e, CozeTransientError)
+                )
+    return _resilience
+
+class CozeServiceRegistry:
+    """进程内共享的 CozeService 注册表（线程安全、懒加载）"""
+
+    def __init__(self):
+        self._services: Dict[str, CozeService] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str = 'default', factory: Callable[[], CozeService] = CozeService) -> CozeService:
+        """获取共享实例，首次使用时创建并预加载私钥"""
+        service = self._services.get(name)
+        if service is not None:
+            return service
+
+        with self._lock:
+            service = self._services.get(name)
+            if service is None:
+                service = factory()
+                service._load_private_key()
+                self._services[name] = service
+            return service
+
+    def clear(self) -> None:
+        with self._lock:
+            self._services.clear()
+
+registry = CozeServiceRegistry()
+
+def get_coze_service() -> CozeService:
+    """获取进程内共享的 CozeService"""
+    return registry.get()
+
+# 创建服务实例（首次访问时才初始化）
+coze_service = SimpleLazyObject(get_coze_service)
\ No newline at end of file
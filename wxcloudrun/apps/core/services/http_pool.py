@@ -0,0 +1,123 @@
+import os
+import threading
+import logging
+from typing import Dict, Any, Optional, Tuple
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+class PooledHTTPTransport:
+    """进程内共享的 HTTP 连接池传输层"""
+
+    def __init__(
+        self,
+        pool_connections: Optional[int] = None,
+        pool_maxsize: Optional[int] = None,
+        connect_timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None
+    ):
+        # 缓存的主机数 / 每个主机保持的长连接数
+        self.pool_connections = pool_connections or getattr(settings, 'COZE_HTTP_POOL_CONNECTIONS', 4)
+        self.pool_maxsize = pool_maxsize or getattr(settings, 'COZE_HTTP_POOL_MAXSIZE', 10)
+        self.pool_block = getattr(settings, 'COZE_HTTP_POOL_BLOCK', False)
+
+        # 连接超时与读取超时分开设置，读取超时默认沿用 COZE_API_TIMEOUT
+        self.connect_timeout = connect_timeout or getattr(settings, 'COZE_CONNECT_TIMEOUT', 3.05)
+        self.read_timeout = read_timeout or getattr(
+            settings, 'COZE_READ_TIMEOUT', getattr(settings, 'COZE_API_TIMEOUT', 30)
+        )
+
+        self.pid = os.getpid()
+        self.session = self._build_session()
+
+    @property
+    def timeout(self) -> Tuple[float, float]:
+        """requests 使用的 (connect, read) 超时"""
+        return (self.connect_timeout, self.read_timeout)
+
+    def _build_session(self) -> requests.Session:
+        """创建带连接池的 Session"""
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=self.pool_block,
+            max_retries=0  # 重试统一交给 tenacity
+        )
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update({'Connection': 'keep-alive'})
+        return session
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """通过连接池发送请求"""
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.request(method, url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        """连接池统计：新建连接数、复用次数"""
+        hosts = {}
+        adapters = {id(adapter): adapter for adapter in self.session.adapters.values()}
+        for adapter in adapters.values():
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                opened = pool.num_connections
+                served = pool.num_requests
+                hosts[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                    'opened': opened,
+                    'requests': served,
+                    'reused': max(served - opened, 0),
+                    'idle': self._idle_connections(pool)
+                }
+
+        opened = sum(host['opened'] for host in hosts.values())
+        served = sum(host['requests'] for host in hosts.values())
+        return {
+            'pid': self.pid,
+            'pool_connections': self.pool_connections,
+            'pool_maxsize': self.pool_maxsize,
+            'connect_timeout': self.connect_timeout,
+            'read_timeout': self.read_timeout,
+            'opened': opened,
+            'requests': served,
+            'reused': max(served - opened, 0),
+            'hosts': hosts
+        }
+
+    @staticmethod
+    def _idle_connections(pool) -> int:
+        """池中已建立且空闲的连接数（队列中的 None 为未建立的占位）"""
+        if pool.pool is None:
+            return 0
+        return sum(1 for conn in list(pool.pool.queue) if conn is not None)
+
+    def close(self) -> None:
+        self.session.close()
+
+_transport: Optional[PooledHTTPTransport] = None
+_transport_lock = threading.Lock()
+
+def get_transport() -> PooledHTTPTransport:
+    """获取当前进程的共享传输层（fork 后自动重建）"""
+    global _transport
+    transport = _transport
+    if transport is not None and transport.pid == os.getpid():
+        return transport
+
+    with _transport_lock:
+        if _transport is None or _transport.pid != os.getpid():
+            # 子进程不能复用父进程的 socket
+            _transport = PooledHTTPTransport()
+            logger.info(
+                f"初始化 HTTP 连接池: pid={_transport.pid}, "
+                f"maxsize={_transport.pool_maxsize}, timeout={_transport.timeout}"
+            )
+        return _transport
@@ -0,0 +1,114 @@
+import threading
+import logging
+from datetime import timedelta
+from typing import Dict, Optional, Tuple
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+class QuotaExceededError(Exception):
+    """已达到今日调用限制"""
+    pass
+
+class QuotaReservation:
+    """一次已预占的调用额度，调用失败时退还"""
+
+    def __init__(self, engine: 'QuotaEngine', key: str, expire_at: int):
+        self.engine = engine
+        self.key = key
+        self.expire_at = expire_at
+        self.refunded = False
+
+    def refund(self) -> None:
+        if not self.refunded:
+            self.refunded = True
+            self.engine._incr(self.key, -1, self.expire_at)
+
+class QuotaEngine:
+    """按用户、按天的 AI 调用额度：Redis INCR 原子计数（当天结束时过期），Redis 不可用时退化为进程内计数"""
+
+    KEY_PREFIX = 'ai:quota'
+
+    def __init__(self):
+        self.limit = getattr(settings, 'COZE_SETTINGS', {}).get('RATE_LIMIT_QPD', 100)
+        self.alias = getattr(settings, 'AI_QUOTA_CACHE_ALIAS', 'default')
+        self._client = None
+        self._client_checked = False
+        self._local: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _redis(self):
+        """共享缓存为 django-redis 时返回原生客户端，否则返回 None"""
+        if not self._client_checked:
+            try:
+                from django_redis import get_redis_connection
+                self._client = get_redis_connection(self.alias)
+            except (ImportError, NotImplementedError):
+                self._client = None
+            self._client_checked = True
+        return self._client
+
+    @staticmethod
+    def _day_window() -> Tuple[str, int]:
+        """当天日期与次日零点（本地时区）的时间戳"""
+        now = timezone.localtime()
+        tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        return now.date().isoformat(), int(tomorrow.timestamp())
+
+    def _incr(self, key: str, delta: int, expire_at: int) -> int:
+        client = self._redis()
+        if client is not None:
+            try:
+                pipe = client.pipeline()
+                pipe.incrby(key, delta)
+                pipe.expireat(key, expire_at)
+                value, _ = pipe.execute()
+                return int(value)
+            except Exception as e:
+                logger.warning(f"Redis 额度计数失败，使用进程内计数: {str(e)}")
+        return self._incr_local(key, delta)
+
+    def _incr_local(self, key: str, delta: int) -> int:
+        with self._lock:
+            # 只保留当天的计数
+            day = key.rsplit(':', 1)[-1]
+            for stale in [k for k in self._local if not k.endswith(day)]:
+                del self._local[stale]
+            value = self._local[key] = self._local.get(key, 0) + delta
+            return value
+
+    def reserve(self, user_id: int) -> QuotaReservation:
+        """原子地预占一次调用额度，超出限制时抛出 QuotaExceededError"""
+        day, expire_at = self._day_window()
+        key = f"{self.KEY_PREFIX}:{user_id}:{day}"
+        used = self._incr(key, 1, expire_at)
+        if used > self.limit:
+            self._incr(key, -1, expire_at)
+            raise QuotaExceededError('已达到今日调用限制')
+        return QuotaReservation(self, key, expire_at)
+
+    def used(self, user_id: int) -> int:
+        """今日已使用的额度"""
+        day, _ = self._day_window()
+        key = f"{self.KEY_PREFIX}:{user_id}:{day}"
+        client = self._redis()
+        if client is not None:
+            try:
+                return int(client.get(key) or 0)
+            except Exception as e:
+                logger.warning(f"读取 Redis 额度计数失败: {str(e)}")
+        with self._lock:
+            return self._local.get(key, 0)
+
+_quota_engine: Optional[QuotaEngine] = None
+_lock = threading.Lock()
+
+def get_quota_engine() -> QuotaEngine:
+    """获取进程内共享的额度引擎"""
+    global _quota_engine
+    if _quota_engine is None:
+        with _lock:
+            if _quota_engine is None:
+                _quota_engine = QuotaEngine()
+    return _quota_engine
@@ -0,0 +1,248 @@
+import time
+import threading
+import logging
+from typing import Callable, Dict, Any, Type
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+class CircuitBreaker:
+    """熔断器：连续失败达到阈值后打开，冷却后半开放行少量探测请求，探测成功则关闭"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str):
+        self.name = name
+        self.failure_threshold = getattr(settings, 'COZE_BREAKER_FAILURE_THRESHOLD', 5)
+        self.reset_timeout = getattr(settings, 'COZE_BREAKER_RESET_TIMEOUT', 30)
+        self.half_open_max_calls = getattr(settings, 'COZE_BREAKER_HALF_OPEN_MAX_CALLS', 1)
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+        self._counters = {'rejected': 0, 'opened': 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    def allow_request(self) -> bool:
+        """是否放行请求；半开状态下只放行有限的探测请求"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and self._probes < self.half_open_max_calls:
+                self._probes += 1
+                return True
+            self._counters['rejected'] += 1
+            return False
+
+    def release_probe(self) -> None:
+        """归还未实际发出的探测名额"""
+        with self._lock:
+            if self._state == self.HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info(f"熔断器关闭: {self.name}")
+            self._state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            state = self._current_state()
+            if state == self.HALF_OPEN or (state == self.CLOSED and self._failures >= self.failure_threshold):
+                logger.warning(f"熔断器打开: {self.name}，连续失败 {self._failures} 次")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._counters['opened'] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            state = self._current_state()
+            retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at)) if state == self.OPEN else 0.0
+            return {
+                'state': state,
+                'consecutive_failures': self._failures,
+                'retry_in': round(retry_in, 1),
+                **self._counters
+            }
+
+class AdaptiveLimiter:
+    """AIMD 自适应并发限制：成功时加性增大上限，失败或超过延迟阈值时乘性减小"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.min_limit = getattr(settings, 'COZE_LIMIT_MIN', 1)
+        self.max_limit = getattr(settings, 'COZE_LIMIT_MAX', 50)
+        self.backoff_ratio = getattr(settings, 'COZE_LIMIT_BACKOFF_RATIO', 0.7)
+        self.latency_threshold = getattr(settings, 'COZE_LIMIT_LATENCY_THRESHOLD', 10)
+        self._limit = float(getattr(settings, 'COZE_LIMIT_INITIAL', 10))
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._counters = {'rejected': 0, 'decreased': 0}
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def try_acquire(self) -> bool:
+        """占用一个并发名额；已达上限时立即返回 False，不排队等待"""
+        with self._lock:
+            if self._in_flight >= int(self._limit):
+                self._counters['rejected'] += 1
+                return False
+            self._in_flight += 1
+            return True
+
+    def release(self, latency: float, dropped: bool = False) -> None:
+        """归还名额并根据本次调用的结果调整上限"""
+        with self._lock:
+            self._in_flight -= 1
+            if dropped or latency > self.latency_threshold:
+                self._limit = max(self.min_limit, self._limit * self.backoff_ratio)
+                self._counters['decreased'] += 1
+            elif self._in_flight * 2 >= int(self._limit):
+                # 只有并发接近上限时才增大，避免低负载下上限无限增长
+                self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'limit': int(self._limit),
+                'in_flight': self._in_flight,
+                **self._counters
+            }
+
+class RetryBudget:
+    """全局重试预算：时间窗口内的重试次数不超过请求数的一定比例，避免故障时重试放大流量"""
+
+    def __init__(self):
+        self.ratio = getattr(settings, 'COZE_RETRY_BUDGET_RATIO', 0.2)
+        self.min_per_second = getattr(settings, 'COZE_RETRY_BUDGET_MIN_PER_SECOND', 1)
+        self.window = getattr(settings, 'COZE_RETRY_BUDGET_WINDOW', 10)
+        # 按秒分桶: 秒 -> [请求数, 重试数]
+        self._buckets: Dict[int, list] = {}
+        self._lock = threading.Lock()
+        self._denied = 0
+
+    def _bucket(self) -> list:
+        now = int(time.monotonic())
+        for second in [s for s in self._buckets if s <= now - self.window]:
+            del self._buckets[second]
+        return self._buckets.setdefault(now, [0, 0])
+
+    def record_request(self) -> None:
+        with self._lock:
+            self._bucket()[0] += 1
+
+    def try_spend(self) -> bool:
+        """申请一次重试"""
+        with self._lock:
+            bucket = self._bucket()
+            requests = sum(b[0] for b in self._buckets.values())
+            retries = sum(b[1] for b in self._buckets.values())
+            if retries >= self.min_per_second * self.window + self.ratio * requests:
+                self._denied += 1
+                return False
+            bucket[1] += 1
+            return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._bucket()
+            return {
+                'requests': sum(b[0] for b in self._buckets.values()),
+                'retries': sum(b[1] for b in self._buckets.values()),
+                'denied': self._denied,
+                'window': self.window
+            }
+
+class WorkflowGuard:
+    """单次调用的熔断与限流：进入时检查，退出时按结果反馈给熔断器和限流器"""
+
+    def __init__(self, resilience: 'Resilience', name: str):
+        self.resilience = resilience
+        self.breaker = resilience.breaker(name)
+        self.limiter = resilience.limiter(name)
+        self.name = name
+
+    def __enter__(self):
+        if not self.breaker.allow_request():
+            raise self.resilience.open_error(f"服务暂时不可用（熔断中）: {self.name}")
+        if not self.limiter.try_acquire():
+            self.breaker.release_probe()
+            raise self.resilience.overload_error(f"服务繁忙，请稍后重试: {self.name}")
+        self._start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        latency = time.monotonic() - self._start
+        failed = exc is not None and self.resilience.is_failure(exc)
+        if failed:
+            self.breaker.record_failure()
+        elif exc is None or isinstance(exc, Exception):
+            # 业务错误说明服务可用；取消（CancelledError）等不计入熔断统计
+            self.breaker.record_success()
+        else:
+            self.breaker.release_probe()
+        self.limiter.release(latency, dropped=failed)
+        return False
+
+class Resilience:
+    """按工作流维护熔断器和并发限制器，并持有全局重试预算"""
+
+    def __init__(self, open_error: Type[Exception], overload_error: Type[Exception],
+                 is_failure: Callable[[BaseException], bool]):
+        self.open_error = open_error
+        self.overload_error = overload_error
+        self.is_failure = is_failure
+        self.retry_budget = RetryBudget()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._limiters: Dict[str, AdaptiveLimiter] = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, name: str) -> CircuitBreaker:
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(name, CircuitBreaker(name))
+        return breaker
+
+    def limiter(self, name: str) -> AdaptiveLimiter:
+        limiter = self._limiters.get(name)
+        if limiter is None:
+            with self._lock:
+                limiter = self._limiters.setdefault(name, AdaptiveLimiter(name))
+        return limiter
+
+    def guard(self, name: str) -> WorkflowGuard:
+        return WorkflowGuard(self, name)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            names = sorted(set(self._breakers) | set(self._limiters))
+        return {
+            'workflows': {
+                name: {
+                    'breaker': self.breaker(name).stats(),
+                    'limiter': self.limiter(name).stats()
+                }
+                for name in names
+            },
+            'retry_budget': self.retry_budget.stats()
+        }
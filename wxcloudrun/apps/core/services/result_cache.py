@@ -0,0 +1,169 @@
+import copy
+import json
+import time
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+class LRUCache:
+    """进程内带过期时间的 LRU 缓存"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+class WorkflowResultCache:
+    """COZE 工作流结果缓存：按 workflow_id + inputs 内容寻址，进程内 LRU + 共享缓存（Redis）两级"""
+
+    KEY_PREFIX = 'coze:result:v1'
+
+    def __init__(self):
+        self.enabled = getattr(settings, 'COZE_RESULT_CACHE_ENABLED', True)
+        self.default_ttl = getattr(settings, 'COZE_RESULT_CACHE_DEFAULT_TTL', 3600)
+        # {workflow_id: 秒}，0 表示不缓存
+        self.workflow_ttls: Dict[str, int] = getattr(settings, 'COZE_RESULT_CACHE_TTLS', {})
+        # 结果必须保持随机性的工作流（默认情绪照片）
+        self.bypass_workflows = set(getattr(
+            settings,
+            'COZE_RESULT_CACHE_BYPASS',
+            [getattr(settings, 'COZE_EMOTION_PHOTO_WORKFLOW_ID', None)]
+        ))
+        self.alias = getattr(settings, 'COZE_RESULT_CACHE_ALIAS', 'default')
+        self.local = LRUCache(getattr(settings, 'COZE_RESULT_CACHE_MAX_ENTRIES', 1024))
+        self._counters = {'local_hits': 0, 'shared_hits': 0, 'misses': 0, 'bypassed': 0, 'stores': 0}
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    @staticmethod
+    def make_key(workflow_id: str, inputs: Dict[str, Any]) -> str:
+        """workflow_id + inputs 规范化 JSON 的哈希"""
+        canonical = json.dumps(inputs, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+        digest = hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+        return f"{WorkflowResultCache.KEY_PREFIX}:{workflow_id}:{digest}"
+
+    def _incr(self, counter: str) -> None:
+        with self._lock:
+            self._counters[counter] += 1
+
+    def ttl_for(self, workflow_id: str) -> int:
+        """工作流的缓存时间，0 表示不缓存"""
+        if not self.enabled or workflow_id in self.bypass_workflows:
+            return 0
+        return self.workflow_ttls.get(workflow_id, self.default_ttl)
+
+    def is_cacheable(self, workflow_id: str, use_cache: bool = True) -> bool:
+        cacheable = use_cache and self.ttl_for(workflow_id) > 0
+        if not cacheable:
+            self._incr('bypassed')
+        return cacheable
+
+    def get_local(self, key: str) -> Optional[Dict[str, Any]]:
+        """只查进程内缓存（不产生网络 IO）"""
+        value = self.local.get(key)
+        if value is None:
+            return None
+        self._incr('local_hits')
+        # 返回副本，调用方修改结果不影响缓存
+        return copy.deepcopy(value)
+
+    def get_shared(self, key: str, workflow_id: str) -> Optional[Dict[str, Any]]:
+        """查共享缓存，命中后回填进程内缓存"""
+        try:
+            value = self.shared.get(key)
+        except Exception as e:
+            # 共享缓存不可用时降级为直接调用
+            logger.warning(f"读取共享结果缓存失败: {str(e)}")
+            value = None
+
+        if value is None:
+            self._incr('misses')
+            return None
+
+        self._incr('shared_hits')
+        self.local.set(key, copy.deepcopy(value), self.ttl_for(workflow_id))
+        return value
+
+    def get(self, key: str, workflow_id: str) -> Optional[Dict[str, Any]]:
+        value = self.get_local(key)
+        if value is not None:
+            return value
+        return self.get_shared(key, workflow_id)
+
+    def set(self, key: str, workflow_id: str, value: Dict[str, Any]) -> None:
+        ttl = self.ttl_for(workflow_id)
+        if ttl <= 0:
+            return
+        self.local.set(key, copy.deepcopy(value), ttl)
+        try:
+            self.shared.set(key, value, timeout=ttl)
+        except Exception as e:
+            logger.warning(f"写入共享结果缓存失败: {str(e)}")
+        self._incr('stores')
+
+    def invalidate(self, workflow_id: str, inputs: Dict[str, Any]) -> None:
+        key = self.make_key(workflow_id, inputs)
+        self.local.delete(key)
+        self.shared.delete(key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+        hits = counters['local_hits'] + counters['shared_hits']
+        lookups = hits + counters['misses']
+        return {
+            **counters,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'local_entries': len(self.local)
+        }
+
+_result_cache: Optional[WorkflowResultCache] = None
+_result_cache_lock = threading.Lock()
+
+def get_result_cache() -> WorkflowResultCache:
+    """获取进程内共享的结果缓存"""
+    global _result_cache
+    if _result_cache is None:
+        with _result_cache_lock:
+            if _result_cache is None:
+                _result_cache = WorkflowResultCache()
+    return _result_cache
@@ -0,0 +1,152 @@
+import copy
+import time
+import uuid
+import threading
+import logging
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, Any, Optional, Type
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+class _SharedCacheError(Exception):
+    """共享缓存访问失败"""
+    pass
+
+class SingleFlight:
+    """合并相同的并发调用：同一个 key 同时只有一个调用真正执行，其余调用等待并共享结果或异常"""
+
+    KEY_PREFIX = 'coze:flight'
+
+    def __init__(self, error_class: Type[Exception] = Exception):
+        self.error_class = error_class
+        self.timeout = getattr(settings, 'COZE_SINGLE_FLIGHT_TIMEOUT', 60)
+        # 跨进程合并（基于共享缓存中的短期锁），需要 Redis 作为共享缓存
+        self.distributed = getattr(settings, 'COZE_SINGLE_FLIGHT_DISTRIBUTED', False)
+        self.alias = getattr(settings, 'COZE_SINGLE_FLIGHT_CACHE_ALIAS', 'default')
+        self.lock_ttl = getattr(settings, 'COZE_SINGLE_FLIGHT_LOCK_TTL', 60)
+        self.result_ttl = getattr(settings, 'COZE_SINGLE_FLIGHT_RESULT_TTL', 10)
+        self.poll_interval = getattr(settings, 'COZE_SINGLE_FLIGHT_POLL_INTERVAL', 0.1)
+        self._calls: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._counters = {'leaders': 0, 'coalesced': 0, 'remote_waits': 0}
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def do(self, key: str, fn: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        """执行 fn；相同 key 的并发调用只执行一次"""
+        timeout = timeout if timeout is not None else self.timeout
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self._counters['leaders'] += 1
+            else:
+                self._counters['coalesced'] += 1
+
+        if not leader:
+            try:
+                # 等待者拿到副本，避免多个请求共用同一个可变对象
+                return copy.deepcopy(future.result(timeout=timeout))
+            except FutureTimeoutError:
+                raise self.error_class("等待相同请求的结果超时")
+
+        try:
+            result = self._run(key, fn, timeout)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def _run(self, key: str, fn: Callable[[], Any], timeout: float) -> Any:
+        if not self.distributed:
+            return fn()
+        try:
+            return self._run_distributed(key, fn, timeout)
+        except _SharedCacheError as e:
+            # 共享缓存不可用时退化为仅进程内合并
+            logger.warning(f"跨进程请求合并不可用: {str(e.__cause__ or e)}")
+            return fn()
+
+    def _run_distributed(self, key: str, fn: Callable[[], Any], timeout: float) -> Any:
+        """通过共享缓存中的短期锁跨进程合并"""
+        lock_key = f"{self.KEY_PREFIX}:lock:{key}"
+        result_key = f"{self.KEY_PREFIX}:result:{key}"
+        error_key = f"{self.KEY_PREFIX}:error:{key}"
+
+        token = uuid.uuid4().hex
+        if self._acquire(lock_key, token):
+            # 成为跨进程的执行者，先清掉上一次的结果
+            self._shared_call('delete_many', [result_key, error_key])
+            return self._lead(fn, lock_key, token, result_key, error_key)
+
+        with self._lock:
+            self._counters['remote_waits'] += 1
+
+        # 其他进程正在执行，等待其结果
+        deadline = time.monotonic() + timeout
+        while True:
+            time.sleep(self.poll_interval)
+            values = self._shared_call('get_many', [result_key, error_key])
+            if result_key in values:
+                return values[result_key]
+            if error_key in values:
+                raise self.error_class(values[error_key])
+            if time.monotonic() >= deadline:
+                raise self.error_class("等待相同请求的结果超时")
+
+            # 锁已释放但没有结果（执行者异常退出或结果刚写入），接手执行
+            if self._acquire(lock_key, token):
+                values = self._shared_call('get_many', [result_key, error_key])
+                if result_key in values:
+                    self._safe_shared_call('delete', lock_key)
+                    return values[result_key]
+                return self._lead(fn, lock_key, token, result_key, error_key)
+
+    def _lead(self, fn: Callable[[], Any], lock_key: str, token: str, result_key: str, error_key: str) -> Any:
+        """持有锁执行 fn，并把结果或异常写入共享缓存供其他进程读取"""
+        try:
+            result = fn()
+        except Exception as e:
+            self._safe_shared_call('set', error_key, str(e), timeout=self.result_ttl)
+            raise
+        else:
+            self._safe_shared_call('set', result_key, result, timeout=self.result_ttl)
+            return result
+        finally:
+            if self._safe_shared_call('get', lock_key) == token:
+                self._safe_shared_call('delete', lock_key)
+
+    def _acquire(self, lock_key: str, token: str) -> bool:
+        """尝试获取跨进程锁；django-redis 开启 IGNORE_EXCEPTIONS 时连接失败不抛异常而是返回 None，同样视为共享缓存不可用"""
+        acquired = self._shared_call('add', lock_key, token, timeout=self.lock_ttl)
+        if acquired is None:
+            raise _SharedCacheError('共享缓存未响应')
+        return acquired
+
+    def _shared_call(self, method: str, *args, **kwargs):
+        try:
+            return getattr(self.shared, method)(*args, **kwargs)
+        except Exception as e:
+            raise _SharedCacheError() from e
+
+    def _safe_shared_call(self, method: str, *args, **kwargs):
+        """fn 已执行后的共享缓存操作，失败只记录日志"""
+        try:
+            return getattr(self.shared, method)(*args, **kwargs)
+        except Exception as e:
+            logger.warning(f"共享缓存操作失败({method}): {str(e)}")
+            return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._counters, 'in_flight': len(self._calls)}
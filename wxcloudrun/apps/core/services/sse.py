@@ -0,0 +1,29 @@
+import json
+from typing import Iterable, Iterator, Tuple, Any
+
+def parse_sse(lines: Iterable[str]) -> Iterator[Tuple[str, str]]:
+    """解析 Server-Sent Events 文本流，逐个返回 (event, data)"""
+    event, data = 'message', []
+    for line in lines:
+        if line == '':
+            # 空行表示一个事件结束
+            if data:
+                yield event, '\n'.join(data)
+            event, data = 'message', []
+            continue
+        if line.startswith(':'):
+            continue
+        field, _, value = line.partition(':')
+        if value.startswith(' '):
+            value = value[1:]
+        if field == 'event':
+            event = value
+        elif field == 'data':
+            data.append(value)
+    if data:
+        yield event, '\n'.join(data)
+
+def format_sse(event: str, data: Any) -> str:
+    """编码一个发给客户端的 SSE 事件，data 按 JSON 序列化"""
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    return f"event: {event}\ndata: {payload}\n\n"
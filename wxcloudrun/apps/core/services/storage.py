@@ -0,0 +1,97 @@
+import threading
+import logging
+from typing import Optional
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+
+logger = logging.getLogger(__name__)
+
+class StorageError(Exception):
+    """对象存储读写失败"""
+    pass
+
+class LocalAssetStorage:
+    """本地文件系统存储（开发和测试用），文件通过 ASSET_LOCAL_URL 访问"""
+
+    def __init__(self, location: Optional[str] = None, base_url: Optional[str] = None):
+        self.storage = FileSystemStorage(
+            location=location or getattr(settings, 'ASSET_LOCAL_ROOT', None),  # 未配置时使用 MEDIA_ROOT
+            base_url=base_url or getattr(settings, 'ASSET_LOCAL_URL', '/media/')
+        )
+
+    def exists(self, key: str) -> bool:
+        return self.storage.exists(key)
+
+    def save(self, key: str, data: bytes, content_type: str) -> str:
+        """写入文件并返回访问地址；同名文件已存在时直接复用（键由内容决定）"""
+        if not self.storage.exists(key):
+            self.storage.save(key, ContentFile(data))
+        return self.url(key)
+
+    def url(self, key: str) -> str:
+        return self.storage.url(key)
+
+class COSAssetStorage:
+    """腾讯云对象存储，使用 COS_BUCKET / COS_REGION 配置"""
+
+    def __init__(self, bucket: Optional[str] = None, region: Optional[str] = None):
+        # 按需导入，未使用 COS 的环境不需要安装 SDK
+        from qcloud_cos import CosConfig, CosS3Client
+
+        self.bucket = bucket or settings.COS_BUCKET
+        self.region = region or settings.COS_REGION
+        self.base_url = (
+            getattr(settings, 'ASSET_BASE_URL', '') or f"https://{self.bucket}.cos.{self.region}.myqcloud.com"
+        ).rstrip('/')
+        self.client = CosS3Client(CosConfig(
+            Region=self.region,
+            SecretId=getattr(settings, 'COS_SECRET_ID', ''),
+            SecretKey=getattr(settings, 'COS_SECRET_KEY', ''),
+            Scheme='https'
+        ))
+
+    def exists(self, key: str) -> bool:
+        try:
+            return self.client.object_exists(Bucket=self.bucket, Key=key)
+        except Exception as e:
+            raise StorageError(f"查询对象失败: {key}: {str(e)}")
+
+    def save(self, key: str, data: bytes, content_type: str) -> str:
+        """上传对象并返回访问地址，键由内容决定，设置长期缓存"""
+        try:
+            self.client.put_object(
+                Bucket=self.bucket,
+                Key=key,
+                Body=data,
+                ContentType=content_type,
+                CacheControl='public, max-age=31536000, immutable'
+            )
+        except Exception as e:
+            raise StorageError(f"上传对象失败: {key}: {str(e)}")
+        return self.url(key)
+
+    def url(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+
+def build_asset_storage():
+    """按 ASSET_STORAGE_BACKEND 创建存储：cos 或 local，未设置时有 COS_BUCKET 则使用 COS"""
+    backend = getattr(settings, 'ASSET_STORAGE_BACKEND', '') or ('cos' if getattr(settings, 'COS_BUCKET', '') else 'local')
+    if backend == 'cos':
+        return COSAssetStorage()
+    if backend == 'local':
+        return LocalAssetStorage()
+    raise ValueError(f"未知的存储后端: {backend}")
+
+_asset_storage = None
+_lock = threading.Lock()
+
+def get_asset_storage():
+    """获取进程内共享的资源存储"""
+    global _asset_storage
+    if _asset_storage is None:
+        with _lock:
+            if _asset_storage is None:
+                _asset_storage = build_asset_storage()
+                logger.info(f"初始化资源存储: {type(_asset_storage).__name__}")
+    return _asset_storage
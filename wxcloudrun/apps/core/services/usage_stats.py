@@ -0,0 +1,152 @@
+import os
+import atexit
+import threading
+import logging
+from datetime import date
+from typing import Dict, Any, Optional, Tuple, List
+from django.conf import settings
+from django.db import connection, close_old_connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+UsageKey = Tuple[int, str, date]
+
+class UsageStatsAggregator:
+    """AI 调用统计的写缓冲：按 (用户, API, 日期) 累加增量，定期或达到阈值时批量 upsert 到 ai_usage_stats"""
+
+    def __init__(self):
+        self.interval = getattr(settings, 'AI_USAGE_FLUSH_INTERVAL', 10)
+        self.max_keys = getattr(settings, 'AI_USAGE_FLUSH_MAX_KEYS', 500)
+        self.batch_size = getattr(settings, 'AI_USAGE_FLUSH_BATCH_SIZE', 500)
+        self._pending: Dict[UsageKey, List[int]] = {}
+        self._lock = threading.Lock()
+        # 保证同一时刻只有一个线程在写库
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = os.getpid()
+        self._counters = {'recorded': 0, 'flushes': 0, 'rows': 0, 'failures': 0}
+
+    def record(self, user_id: int, api_name: str, success: bool) -> None:
+        """记录一次调用，只修改内存"""
+        key = (user_id, api_name, timezone.localdate())
+        with self._lock:
+            self._ensure_worker()
+            deltas = self._pending.get(key)
+            if deltas is None:
+                deltas = self._pending[key] = [0, 0, 0]
+            deltas[0] += 1
+            deltas[1 if success else 2] += 1
+            self._counters['recorded'] += 1
+            full = len(self._pending) >= self.max_keys
+        if full:
+            self._wakeup.set()
+
+    def _ensure_worker(self) -> None:
+        """启动后台刷新线程；fork 后的子进程丢弃父进程的缓冲并重新启动线程"""
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._pending = {}
+            self._thread = None
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='ai-usage-flush', daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+    def flush(self) -> int:
+        """把缓冲的增量写入数据库，返回写入的行数；失败时增量放回缓冲，下次重试"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+
+            items = list(pending.items())
+            try:
+                for start in range(0, len(items), self.batch_size):
+                    self._upsert(items[start:start + self.batch_size])
+                    # 已写入的部分不再放回缓冲
+                    for key, _ in items[start:start + self.batch_size]:
+                        del pending[key]
+            except Exception as e:
+                logger.error(f"写入AI调用统计失败，{len(pending)} 条将在下次重试: {str(e)}")
+                self._restore(pending)
+                with self._lock:
+                    self._counters['failures'] += 1
+                return len(items) - len(pending)
+
+            with self._lock:
+                self._counters['flushes'] += 1
+                self._counters['rows'] += len(items)
+            return len(items)
+
+    def _restore(self, pending: Dict[UsageKey, List[int]]) -> None:
+        with self._lock:
+            for key, deltas in pending.items():
+                current = self._pending.setdefault(key, [0, 0, 0])
+                for index, value in enumerate(deltas):
+                    current[index] += value
+
+    def _upsert(self, items: List[Tuple[UsageKey, List[int]]]) -> None:
+        """一条 INSERT ... ON DUPLICATE KEY UPDATE 写入一批增量（非 MySQL 数据库使用 ON CONFLICT）"""
+        from wxcloudrun.apps.users.models import AIUsageStats
+        meta = AIUsageStats._meta
+        qn = connection.ops.quote_name
+
+        def column(name):
+            return qn(meta.get_field(name).column)
+
+        columns = [column(name) for name in (
+            'user', 'api_name', 'call_date', 'call_count', 'success_count', 'error_count', 'created_at', 'updated_at'
+        )]
+        counters = [column(name) for name in ('call_count', 'success_count', 'error_count')]
+
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        params = []
+        for (user_id, api_name, call_date), (calls, successes, errors) in items:
+            params.extend([
+                user_id, api_name, connection.ops.adapt_datefield_value(call_date),
+                calls, successes, errors, now, now
+            ])
+
+        placeholders = ', '.join(['(' + ', '.join(['%s'] * len(columns)) + ')'] * len(items))
+        sql = f"INSERT INTO {qn(meta.db_table)} ({', '.join(columns)}) VALUES {placeholders} "
+        if connection.vendor == 'mysql':
+            updates = [f"{name} = {name} + VALUES({name})" for name in counters]
+            updates.append(f"{column('updated_at')} = VALUES({column('updated_at')})")
+            sql += 'ON DUPLICATE KEY UPDATE ' + ', '.join(updates)
+        else:
+            updates = [f"{name} = {qn(meta.db_table)}.{name} + excluded.{name}" for name in counters]
+            updates.append(f"{column('updated_at')} = excluded.{column('updated_at')}")
+            conflict = ', '.join(column(name) for name in ('user', 'api_name', 'call_date'))
+            sql += f"ON CONFLICT ({conflict}) DO UPDATE SET " + ', '.join(updates)
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._counters, 'pending_keys': len(self._pending)}
+
+_aggregator: Optional[UsageStatsAggregator] = None
+_aggregator_lock = threading.Lock()
+
+def get_usage_aggregator() -> UsageStatsAggregator:
+    """获取进程内共享的调用统计写缓冲"""
+    global _aggregator
+    if _aggregator is None:
+        with _aggregator_lock:
+            if _aggregator is None:
+                _aggregator = UsageStatsAggregator()
+                # worker 正常退出（gunicorn 优雅重启、SIGTERM）时写入剩余的缓冲
+                atexit.register(_aggregator.flush)
+    return _aggregator
@@ -0,0 +1,448 @@
+import os
+import time
+import asyncio
+import tempfile
+import threading
+from types import SimpleNamespace
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from unittest.mock import patch, Mock
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from wxcloudrun.apps.core.services.coze_service import CozeService, CozeServiceError
+from wxcloudrun.apps.core.services.async_coze_service import AsyncCozeService
+from wxcloudrun.apps.core.services.singleflight import SingleFlight
+from wxcloudrun.apps.core.services.result_cache import LRUCache, WorkflowResultCache
+from wxcloudrun.apps.core.services.resilience import CircuitBreaker, AdaptiveLimiter, RetryBudget
+from wxcloudrun.apps.core.services.sse import parse_sse
+from wxcloudrun.apps.core.services.quota import QuotaEngine, QuotaExceededError
+from wxcloudrun.apps.core.utils.pagination import KeysetPagination
+from wxcloudrun.apps.core.services.usage_stats import UsageStatsAggregator
+from wxcloudrun.apps.core.services import ai_service
+from wxcloudrun.apps.core.services.ai_service import AIService
+from wxcloudrun.apps.users.models import AIUsageStats
+
+class LRUCacheTests(SimpleTestCase):
+    def test_evicts_least_recently_used(self):
+        """测试超过容量时淘汰最久未使用的条目"""
+        cache = LRUCache(max_entries=2)
+        cache.set('a', 1, ttl=60)
+        cache.set('b', 2, ttl=60)
+        cache.get('a')
+        cache.set('c', 3, ttl=60)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_expired_entry(self):
+        """测试过期条目不再返回"""
+        cache = LRUCache(max_entries=2)
+        cache.set('a', 1, ttl=0)
+
+        self.assertIsNone(cache.get('a'))
+
+@override_settings(
+    COZE_API_BASE_URL='http://coze.test',
+    COZE_APP_ID='app',
+    COZE_PRIVATE_KEY_PATH='/tmp/coze-test.pem',
+    COZE_PUBLIC_KEY_FINGERPRINT='fingerprint',
+    COZE_EMOTION_CURVE_WORKFLOW_ID='curve',
+    COZE_EMOTION_PHOTO_WORKFLOW_ID='photo',
+    COZE_RESULT_CACHE_TTLS={'curve': 60},
+    COZE_RESULT_CACHE_BYPASS=['photo']
+)
+class WorkflowResultCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.result_cache = WorkflowResultCache()
+        patcher = patch.object(CozeService, 'result_cache', self.result_cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.result_cache.shared.clear)
+        self.service = CozeService()
+
+    def test_key_is_canonical(self):
+        """测试缓存键与 inputs 的键顺序无关"""
+        self.assertEqual(
+            WorkflowResultCache.make_key('curve', {'a': 1, 'b': [1, 2]}),
+            WorkflowResultCache.make_key('curve', {'b': [1, 2], 'a': 1})
+        )
+
+    def test_identical_inputs_hit_cache(self):
+        """测试相同输入只调用一次工作流"""
+        with patch.object(CozeService, '_send_request') as mock_send:
+            mock_send.return_value = {'code': 200, 'analysis': '情绪稳定'}
+
+            first = self.service.generate_emotion_curve([{'date': '2023-12-14', 'level': 8}])
+            second = self.service.generate_emotion_curve([{'date': '2023-12-14', 'level': 8}])
+
+            self.assertEqual(mock_send.call_count, 1)
+            self.assertEqual(first, second)
+            self.assertEqual(self.result_cache.stats()['local_hits'], 1)
+
+    def test_bypass_workflow(self):
+        """测试随机性工作流不走缓存"""
+        with patch.object(CozeService, '_send_request') as mock_send:
+            mock_send.return_value = {'code': 200, 'photo_url': 'http://example.com/photo.jpg'}
+
+            self.service.generate_emotion_photo('今天心情很好')
+            self.service.generate_emotion_photo('今天心情很好')
+
+            self.assertEqual(mock_send.call_count, 2)
+            self.assertEqual(self.result_cache.stats()['bypassed'], 2)
+
+class SingleFlightTests(SimpleTestCase):
+    def _run_concurrently(self, single_flight, fn, count=5):
+        results = []
+
+        def worker():
+            try:
+                results.append(single_flight.do('key', fn))
+            except CozeServiceError as e:
+                results.append(e)
+
+        threads = [threading.Thread(target=worker) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_calls_share_result(self):
+        """测试并发的相同调用只执行一次并共享结果"""
+        single_flight = SingleFlight(error_class=CozeServiceError)
+        calls = []
+
+        def fn():
+            calls.append(1)
+            time.sleep(0.2)
+            return {'code': 200}
+
+        results = self._run_concurrently(single_flight, fn)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'code': 200}] * 5)
+
+    def test_error_propagates_to_waiters(self):
+        """测试异常传递给所有等待者"""
+        single_flight = SingleFlight(error_class=CozeServiceError)
+
+        def fn():
+            time.sleep(0.2)
+            raise CozeServiceError('API错误')
+
+        results = self._run_concurrently(single_flight, fn)
+
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(isinstance(result, CozeServiceError) for result in results))
+
+    @override_settings(COZE_SINGLE_FLIGHT_DISTRIBUTED=True, COZE_SINGLE_FLIGHT_TIMEOUT=5)
+    def test_unavailable_shared_cache_falls_back_to_local(self):
+        """测试共享缓存不可用（IGNORE_EXCEPTIONS 下 add 返回 None、get_many 返回空）时退化为进程内合并，不等待超时"""
+        single_flight = SingleFlight(error_class=CozeServiceError)
+        unavailable = SimpleNamespace(add=lambda *args, **kwargs: None, get_many=lambda *args, **kwargs: {},
+                                      get=lambda *args, **kwargs: None, set=lambda *args, **kwargs: None,
+                                      delete=lambda *args, **kwargs: None, delete_many=lambda *args, **kwargs: None)
+        calls = []
+
+        def fn():
+            calls.append(1)
+            time.sleep(0.2)
+            return {'code': 200}
+
+        started = time.monotonic()
+        with patch.object(SingleFlight, 'shared', unavailable):
+            results = self._run_concurrently(single_flight, fn)
+
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'code': 200}] * 5)
+
+@override_settings(COZE_BREAKER_FAILURE_THRESHOLD=2, COZE_BREAKER_RESET_TIMEOUT=0.1)
+class CircuitBreakerTests(SimpleTestCase):
+    def test_opens_after_consecutive_failures(self):
+        """测试连续失败后打开并拒绝请求"""
+        breaker = CircuitBreaker('curve')
+        breaker.record_failure()
+        self.assertTrue(breaker.allow_request())
+        breaker.record_failure()
+
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow_request())
+
+    def test_half_open_probe(self):
+        """测试冷却后只放行一个探测请求，探测成功后关闭"""
+        breaker = CircuitBreaker('curve')
+        breaker.record_failure()
+        breaker.record_failure()
+        time.sleep(0.15)
+
+        self.assertTrue(breaker.allow_request())
+        self.assertFalse(breaker.allow_request())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+class AdaptiveLimiterTests(SimpleTestCase):
+    @override_settings(COZE_LIMIT_INITIAL=2, COZE_LIMIT_BACKOFF_RATIO=0.5)
+    def test_rejects_over_limit_and_backs_off(self):
+        """测试超过上限时拒绝，失败后上限减半"""
+        limiter = AdaptiveLimiter('curve')
+        self.assertTrue(limiter.try_acquire())
+        self.assertTrue(limiter.try_acquire())
+        self.assertFalse(limiter.try_acquire())
+
+        limiter.release(latency=0.1, dropped=True)
+        self.assertEqual(limiter.limit, 1)
+
+    @override_settings(COZE_RETRY_BUDGET_RATIO=0.5, COZE_RETRY_BUDGET_MIN_PER_SECOND=0)
+    def test_retry_budget(self):
+        """测试重试次数受请求数比例限制"""
+        budget = RetryBudget()
+        for _ in range(4):
+            budget.record_request()
+
+        self.assertEqual([budget.try_spend() for _ in range(3)], [True, True, False])
+
+class SSEParserTests(SimpleTestCase):
+    def test_parse_events(self):
+        """测试解析多行 data、注释和缺省事件名"""
+        lines = [
+            ': keep-alive',
+            'event: Message',
+            'data: {"content": "今天"}',
+            '',
+            'data: a',
+            'data: b',
+            '',
+            'event: Done',
+            'data: {}',
+        ]
+
+        self.assertEqual(list(parse_sse(lines)), [
+            ('Message', '{"content": "今天"}'),
+            ('message', 'a\nb'),
+            ('Done', '{}'),
+        ])
+
+@override_settings(COZE_SETTINGS={'RATE_LIMIT_QPD': 3})
+class QuotaEngineTests(SimpleTestCase):
+    def test_concurrent_reservations_respect_limit(self):
+        """测试并发预占不超过每日上限"""
+        engine = QuotaEngine()
+        granted = []
+
+        def worker():
+            try:
+                granted.append(engine.reserve(1))
+            except QuotaExceededError:
+                pass
+
+        threads = [threading.Thread(target=worker) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(granted), 3)
+        self.assertEqual(engine.used(1), 3)
+
+    def test_refund_on_failure(self):
+        """测试退还额度后可以再次调用"""
+        engine = QuotaEngine()
+        reservations = [engine.reserve(1) for _ in range(3)]
+        with self.assertRaises(QuotaExceededError):
+            engine.reserve(1)
+
+        reservations[0].refund()
+        reservations[0].refund()
+        engine.reserve(1)
+        self.assertEqual(engine.used(1), 3)
+
+class KeysetCursorTests(SimpleTestCase):
+    def test_cursor_round_trip(self):
+        """游标编码后能还原位置和方向，篡改的游标返回 404"""
+        row = SimpleNamespace(created_at=timezone.now(), pk=42)
+        cursor = KeysetPagination.encode_cursor(row, backwards=True)
+        self.assertEqual(KeysetPagination.decode_cursor(cursor), (row.created_at, 42, True))
+        self.assertIsNone(KeysetPagination.decode_cursor(None))
+        with self.assertRaises(NotFound):
+            KeysetPagination.decode_cursor('not-a-cursor')
+
+@patch.object(UsageStatsAggregator, '_ensure_worker', lambda self: None)
+class UsageStatsAggregatorTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.alice = User.objects.create_user(username='alice', openid='alice', password='testpass123')
+        self.bob = User.objects.create_user(username='bob', openid='bob', password='testpass123')
+        self.aggregator = UsageStatsAggregator()
+
+    def counters(self):
+        return {
+            (row.user_id, row.api_name): (row.call_count, row.success_count, row.error_count)
+            for row in AIUsageStats.objects.all()
+        }
+
+    def test_flushes_accumulate(self):
+        """测试多次写入的增量在同一行上累加"""
+        self.aggregator.record(self.alice.id, 'summary', True)
+        self.aggregator.record(self.alice.id, 'summary', False)
+        self.aggregator.record(self.bob.id, 'photo', True)
+        self.assertEqual(self.aggregator.flush(), 2)
+        self.assertEqual(self.aggregator.flush(), 0)
+
+        self.aggregator.record(self.alice.id, 'summary', True)
+        self.aggregator.record(self.alice.id, 'photo', False)
+        self.assertEqual(self.aggregator.flush(), 2)
+        self.assertEqual(self.counters(), {
+            (self.alice.id, 'summary'): (3, 2, 1),
+            (self.alice.id, 'photo'): (1, 0, 1),
+            (self.bob.id, 'photo'): (1, 1, 0),
+        })
+
+    def test_failed_flush_restores_increments(self):
+        """测试写库失败时增量放回缓冲，与之后的调用合并写入"""
+        self.aggregator.record(self.alice.id, 'summary', True)
+        self.aggregator.record(self.alice.id, 'summary', True)
+        with patch.object(UsageStatsAggregator, '_upsert', side_effect=RuntimeError('数据库不可用')):
+            self.assertEqual(self.aggregator.flush(), 0)
+        self.assertEqual(self.aggregator.stats()['pending_keys'], 1)
+        self.assertEqual(self.aggregator.stats()['failures'], 1)
+        self.assertFalse(AIUsageStats.objects.exists())
+
+        self.aggregator.record(self.alice.id, 'summary', False)
+        self.assertEqual(self.aggregator.flush(), 1)
+        self.assertEqual(self.counters(), {(self.alice.id, 'summary'): (3, 2, 1)})
+
+    def test_partial_flush_restores_only_unwritten_batches(self):
+        """测试分批写入中途失败时，只有未写入的批次放回缓冲"""
+        self.aggregator.batch_size = 1
+        self.aggregator.record(self.alice.id, 'summary', True)
+        self.aggregator.record(self.bob.id, 'summary', True)
+        upsert = self.aggregator._upsert
+        calls = []
+
+        def flaky(items):
+            calls.append(items)
+            if len(calls) > 1:
+                raise RuntimeError('连接断开')
+            upsert(items)
+
+        with patch.object(self.aggregator, '_upsert', side_effect=flaky):
+            self.assertEqual(self.aggregator.flush(), 1)
+        self.assertEqual(self.aggregator.stats()['pending_keys'], 1)
+        self.assertEqual(self.aggregator.flush(), 1)
+        self.assertEqual(self.counters(), {(self.alice.id, 'summary'): (1, 1, 0), (self.bob.id, 'summary'): (1, 1, 0)})
+
+def write_private_key(testcase) -> str:
+    """生成临时 RSA 私钥文件，测试结束后删除"""
+    key_file = tempfile.NamedTemporaryFile(suffix='.pem', delete=False)
+    testcase.addCleanup(os.remove, key_file.name)
+    with key_file:
+        key_file.write(rsa.generate_private_key(public_exponent=65537, key_size=2048).private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        ))
+    return key_file.name
+
+@override_settings(
+    COZE_API_BASE_URL='http://coze.test',
+    COZE_APP_ID='app',
+    COZE_PUBLIC_KEY_FINGERPRINT='fingerprint',
+    COZE_AUTH_MODE='signature',
+    COZE_COLLECTION_SUMMARY_WORKFLOW_ID='summary',
+    COZE_CAREER_ACTION_WORKFLOW_ID='career',
+    COZE_RESULT_CACHE_BYPASS=['summary', 'career']
+)
+class AIServiceTests(SimpleTestCase):
+    def setUp(self):
+        with override_settings(COZE_PRIVATE_KEY_PATH=write_private_key(self)):
+            coze = CozeService()
+        patcher = patch.object(ai_service, 'get_coze_service', return_value=coze)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        # 只模拟 HTTP：签名、结果缓存、请求合并和熔断都走真实实现
+        self.transport = Mock(timeout=(1, 1))
+        patcher = patch.object(CozeService, 'transport', self.transport)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def respond(self, body):
+        self.transport.post.return_value = Mock(status_code=200, json=Mock(return_value=body))
+
+    def test_generate_summary_invokes_workflow(self):
+        """测试摘要经 CozeService 调用配置的工作流，读取响应顶层的输出字段"""
+        self.respond({'code': 200, 'summary': '摘要', 'tags': ['读书'], 'keywords': ['习惯']})
+
+        result = AIService(None).generate_summary('标题', '正文', 'https://example.com')
+
+        self.assertEqual(result, {'summary': '摘要', 'tags': ['读书'], 'keywords': ['习惯']})
+        url = self.transport.post.call_args[0][0]
+        kwargs = self.transport.post.call_args[1]
+        self.assertEqual(url, 'http://coze.test/workflow/invoke')
+        self.assertEqual(kwargs['json']['workflow_id'], 'summary')
+        self.assertEqual(kwargs['json']['inputs'], {'title': '标题', 'content': '正文', 'url': 'https://example.com'})
+        self.assertTrue(kwargs['headers']['X-Signature'])
+
+    def test_business_error_returns_none(self):
+        """测试工作流返回业务错误时返回 None"""
+        self.respond({'code': 500, 'message': '工作流异常'})
+        self.assertIsNone(AIService(None).analyze_career('完成了项目'))
+
+    def test_quota_exceeded_propagates(self):
+        """测试额度用尽时抛出 QuotaExceededError，不调用工作流"""
+        user = SimpleNamespace(id=1)
+        with patch.object(QuotaEngine, 'reserve', side_effect=QuotaExceededError('已达到今日调用限制')):
+            with self.assertRaises(QuotaExceededError):
+                AIService(user).analyze_career('完成了项目')
+        self.transport.post.assert_not_called()
+
+    def test_stream_records_usage_when_client_disconnects(self):
+        """测试客户端断开（生成器被关闭）时关闭上游流并记录调用，不退还额度"""
+        closed = []
+
+        def upstream(workflow_id, inputs):
+            try:
+                yield '第一段'
+                yield '第二段'
+            finally:
+                closed.append(workflow_id)
+
+        reservation = Mock()
+        aggregator = Mock()
+        with patch.object(QuotaEngine, 'reserve', return_value=reservation), \
+                patch.object(ai_service, 'get_usage_aggregator', return_value=aggregator), \
+                patch.object(CozeService, 'stream_workflow', side_effect=upstream):
+            chunks = AIService(SimpleNamespace(id=1)).stream_summary('标题', '正文')
+            self.assertEqual(next(chunks), '第一段')
+            chunks.close()
+
+        self.assertEqual(closed, ['summary'])
+        aggregator.record.assert_called_once_with(1, 'content_summary', True)
+        reservation.refund.assert_not_called()
+
+@override_settings(COZE_API_BASE_URL='http://coze.test', COZE_APP_ID='app', COZE_PUBLIC_KEY_FINGERPRINT='fingerprint',
+                   COZE_AUTH_MODE='signature')
+class AsyncCozeServiceTests(SimpleTestCase):
+    def test_signing_runs_off_the_event_loop(self):
+        """测试签名模式下每个请求的 RSA 签名在线程池中执行，不阻塞事件循环"""
+        with override_settings(COZE_PRIVATE_KEY_PATH=write_private_key(self)):
+            service = AsyncCozeService()
+        threads = []
+        prepare = CozeService._prepare_request
+
+        def record_thread(service, endpoint, data):
+            threads.append(threading.get_ident())
+            return prepare(service, endpoint, data)
+
+        async def run():
+            return threading.get_ident(), await service._prepare_request_async('/workflow/invoke', {'workflow_id': 'curve'})
+
+        with patch.object(CozeService, '_prepare_request', record_thread):
+            loop_thread, (url, headers) = asyncio.run(run())
+
+        self.assertEqual(url, 'http://coze.test/workflow/invoke')
+        self.assertTrue(headers['X-Signature'])
+        self.assertEqual(len(threads), 1)
+        self.assertNotEqual(threads[0], loop_thread)
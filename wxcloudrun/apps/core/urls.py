@@ -0,0 +1,6 @@
+from django.urls import path
+from .views import CozeMetricsView
+
+urlpatterns = [
+    path('coze/', CozeMetricsView.as_view(), name='coze-metrics'),
+]
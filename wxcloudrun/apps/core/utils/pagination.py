@@ -1,5 +1,11 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+from datetime import datetime
+from typing import Optional, Tuple
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 class StandardResultsSetPagination(PageNumberPagination):
     """标准分页类"""
@@ -21,4 +27,96 @@ class SmallResultsSetPagination(StandardResultsSetPagination):
     
 class LargeResultsSetPagination(StandardResultsSetPagination):
     """大分页类"""
-    page_size = 50 
\ No newline at end of file
+    page_size = 50
+
+class KeysetPagination(BasePagination):
+    """按 (created_at, id) 倒序的游标分页：用 WHERE 条件定位而不是 OFFSET，也不执行 COUNT(*)
+
+    - ?cursor=... 从游标位置继续，响应中的 next / previous 为完整链接，next_cursor / prev_cursor 为游标本身
+    - ?with_total=1 时才计算准确的 total
+    - 仍带 ?page= 的旧客户端退回页码分页
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    total_query_param = 'with_total'
+    legacy_pagination_class = StandardResultsSetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.legacy = None
+        if 'page' in request.query_params and self.cursor_query_param not in request.query_params:
+            self.legacy = self.legacy_pagination_class()
+            return self.legacy.paginate_queryset(queryset, request, view)
+
+        self.page_size = self.get_page_size(request)
+        self.total = queryset.count() if request.query_params.get(self.total_query_param) in ('1', 'true') else None
+        position = self.decode_cursor(request.query_params.get(self.cursor_query_param))
+
+        if position is None:
+            rows = list(queryset.order_by('-created_at', '-id')[:self.page_size + 1])
+            self.has_more, self.has_less = len(rows) > self.page_size, False
+            rows = rows[:self.page_size]
+        else:
+            created_at, pk, backwards = position
+            if backwards:
+                # 向前翻页：按正序取游标之后的记录，再翻转回倒序
+                rows = list(queryset.filter(
+                    Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+                ).order_by('created_at', 'id')[:self.page_size + 1])
+                self.has_less, self.has_more = len(rows) > self.page_size, True
+                rows = rows[:self.page_size][::-1]
+            else:
+                rows = list(queryset.filter(
+                    Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+                ).order_by('-created_at', '-id')[:self.page_size + 1])
+                self.has_more, self.has_less = len(rows) > self.page_size, True
+                rows = rows[:self.page_size]
+
+        self.rows = rows
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    @staticmethod
+    def encode_cursor(row, backwards: bool) -> str:
+        raw = f"{row.created_at.isoformat()}|{row.pk}|{'p' if backwards else 'n'}"
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int, bool]]:
+        if not cursor:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+            created_at, pk, direction = raw.split('|')
+            return datetime.fromisoformat(created_at), int(pk), direction == 'p'
+        except (ValueError, UnicodeDecodeError):
+            raise NotFound('无效的分页游标')
+
+    def _link(self, cursor: Optional[str]) -> Optional[str]:
+        if cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        if self.legacy is not None:
+            return self.legacy.get_paginated_response(data)
+
+        next_cursor = self.encode_cursor(self.rows[-1], False) if self.rows and self.has_more else None
+        prev_cursor = self.encode_cursor(self.rows[0], True) if self.rows and self.has_less else None
+        return Response({
+            'total': self.total,
+            'page_size': self.page_size,
+            'next': self._link(next_cursor),
+            'previous': self._link(prev_cursor),
+            'next_cursor': next_cursor,
+            'prev_cursor': prev_cursor,
+            'results': data
+        })
@@ -1,5 +1,11 @@
+import logging
+from django.http import JsonResponse, StreamingHttpResponse
 from rest_framework.response import Response
+from rest_framework.renderers import BaseRenderer
 from rest_framework import status
+from wxcloudrun.apps.core.services.sse import format_sse
+
+logger = logging.getLogger(__name__)
 
 def success_response(data=None, message='success', code=200):
     """成功响应"""
@@ -9,6 +15,14 @@ def success_response(data=None, message='success', code=200):
         'data': data
     }, status=status.HTTP_200_OK)
     
+def accepted_response(data=None, message='任务已提交', code=202):
+    """异步任务已受理响应，客户端通过 job_id 查询结果"""
+    return Response({
+        'code': code,
+        'message': message,
+        'data': data
+    }, status=status.HTTP_202_ACCEPTED)
+    
 def error_response(message='error', code=500, status_code=None):
     """错误响应"""
     return Response({
@@ -42,4 +56,55 @@ def unauthorized_error(message='未认证', code=401):
     return Response({
         'code': code,
         'message': message
-    }, status=status.HTTP_401_UNAUTHORIZED) 
\ No newline at end of file
+    }, status=status.HTTP_401_UNAUTHORIZED) 
+    
+def json_response(data=None, message='success', code=200, status_code=None):
+    """普通 Django 视图（如异步视图）使用的 JSON 响应，结构与上面保持一致"""
+    body = {
+        'code': code,
+        'message': message
+    }
+    if code == 200:
+        body['data'] = data
+    return JsonResponse(
+        body,
+        status=status_code or code,
+        json_dumps_params={'ensure_ascii': False}
+    )
+    
+class EventStreamRenderer(BaseRenderer):
+    """text/event-stream 渲染器：让 EventSource 请求通过内容协商，流式前的错误以 error 事件返回"""
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, (str, bytes)):
+            return data
+        return format_sse('error', data)
+    
+def stream_text_response(chunks, on_complete=None):
+    """以 SSE 推送生成的文本：每个片段一个 delta 事件，结束后调用 on_complete 保存完整文本并发送 done 事件"""
+    def events():
+        parts = []
+        try:
+            for chunk in chunks:
+                parts.append(chunk)
+                yield format_sse('delta', {'text': chunk})
+            text = ''.join(parts)
+            extra = on_complete(text) if on_complete else None
+            yield format_sse('done', {'text': text, **(extra or {})})
+        except Exception as e:
+            logger.error(f"流式响应失败: {str(e)}")
+            yield format_sse('error', {'code': getattr(e, 'code', 500), 'message': str(e)})
+        finally:
+            # 客户端断开时 Django 只关闭本生成器，同时关闭上游片段的生成器
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream; charset=utf-8')
+    # 禁止代理缓冲，保证片段立即送达客户端
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
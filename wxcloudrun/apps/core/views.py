@@ -0,0 +1,21 @@
+from rest_framework.views import APIView
+from rest_framework.permissions import IsAdminUser
+from wxcloudrun.apps.core.authentication.jwt_auth import JWTAuthentication
+from wxcloudrun.apps.core.utils.response import success_response
+from wxcloudrun.apps.core.services.coze_service import get_coze_service
+from wxcloudrun.apps.core.services.usage_stats import get_usage_aggregator
+
+class CozeMetricsView(APIView):
+    """COZE 调用运行指标（仅管理员）：熔断器状态、并发上限、重试预算、连接池、缓存、请求合并与调用统计写缓冲"""
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        service = get_coze_service()
+        return success_response({
+            'resilience': service.get_resilience_stats(),
+            'pool': service.get_pool_stats(),
+            'cache': service.get_cache_stats(),
+            'single_flight': service.get_single_flight_stats(),
+            'usage_stats': get_usage_aggregator().stats()
+        })
@@ -3,4 +3,8 @@ from django.apps import AppConfig
 class EmotionsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'wxcloudrun.apps.emotions'
-    verbose_name = '情感分析' 
\ No newline at end of file
+    verbose_name = '情感分析'
+
+    def ready(self):
+        # 注册维护每日情绪汇总的信号
+        from . import signals
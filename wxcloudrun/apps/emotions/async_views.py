@@ -0,0 +1,120 @@
+import json
+import logging
+from asgiref.sync import sync_to_async
+from django.urls import reverse, NoReverseMatch
+from rest_framework import exceptions
+from wxcloudrun.apps.core.authentication.jwt_auth import JWTAuthentication
+from wxcloudrun.apps.core.utils.response import json_response
+from wxcloudrun.apps.core.services.coze_service import CozeServiceError
+from wxcloudrun.apps.core.services.async_coze_service import get_async_coze_service
+from .views import validate_photo_request, validate_curve_request, record_generated_photo, generate_curve_data
+from .curve import CurveDataError
+from .photos import find_asset, store_generated_photo, photo_urls
+
+logger = logging.getLogger(__name__)
+
+# 异步视图需要在 ASGI 下运行（如 gunicorn -k uvicorn.workers.UvicornWorker wxcloudrun.asgi:application），
+# 等待 COZE 响应期间不占用线程，单个容器可以同时挂起数百个调用
+
+async def _authenticate(request):
+    """JWT 认证，返回用户或 None"""
+    try:
+        result = await sync_to_async(JWTAuthentication().authenticate)(request)
+    except exceptions.AuthenticationFailed:
+        return None
+    return result[0] if result else None
+
+def _load_body(request):
+    """解析 JSON 请求体"""
+    try:
+        return json.loads(request.body or b'{}')
+    except ValueError:
+        return None
+
+async def generate_photo(request):
+    """生成情绪照片（异步）"""
+    if request.method != 'POST':
+        return json_response(message='方法不允许', code=405)
+
+    user = await _authenticate(request)
+    if user is None:
+        return json_response(message='未认证', code=401)
+
+    data = _load_body(request)
+    if data is None:
+        return json_response(message='请求体格式错误', code=400)
+
+    try:
+        text = data.get('text')
+        style = data.get('style')
+
+        message = validate_photo_request(text)
+        if message:
+            return json_response(message=message, code=400)
+
+        # 相同文本和风格的照片已转存过时直接复用，否则调用COZE服务生成并转存
+        asset = await sync_to_async(find_asset)(text, style)
+        if asset is not None:
+            result = {'photo_url': asset.original_url}
+        else:
+            result = await get_async_coze_service().generate_emotion_photo(text, style)
+            asset = await sync_to_async(store_generated_photo)(text, style, result.get('photo_url'))
+
+        # 记录生成历史
+        emotion_record = await sync_to_async(record_generated_photo)(user, text, style, result, asset)
+
+        return json_response({
+            'record_id': emotion_record.id,
+            **photo_urls(asset, result),
+            'created_at': emotion_record.created_at
+        })
+
+    except CozeServiceError as e:
+        logger.error(f"生成情绪照片失败: {str(e)}")
+        return json_response(message=f"生成情绪照片失败: {str(e)}", code=e.code)
+    except Exception as e:
+        logger.error(f"处理请求失败: {str(e)}")
+        return json_response(message='服务器内部错误', code=500)
+
+async def generate_curve(request):
+    """生成情绪曲线（异步）"""
+    if request.method != 'POST':
+        return json_response(message='方法不允许', code=405)
+
+    user = await _authenticate(request)
+    if user is None:
+        return json_response(message='未认证', code=401)
+
+    data = _load_body(request)
+    if data is None:
+        return json_response(message='请求体格式错误', code=400)
+
+    try:
+        emotions = data.get('emotions')
+
+        message = validate_curve_request(emotions)
+        if message:
+            return json_response(message=message, code=400)
+
+        # 曲线在本地生成（毫秒级），文字解读由后台任务调用 COZE
+        key, result = await sync_to_async(generate_curve_data)(user, emotions, data.get('commentary', True))
+        try:
+            curve_url = request.build_absolute_uri(reverse('emotion-record-curve-svg', kwargs={'key': key}))
+        except NoReverseMatch:
+            curve_url = None
+
+        return json_response({'curve_url': curve_url, **result})
+
+    except CurveDataError as e:
+        return json_response(message=str(e), code=400)
+    except CozeServiceError as e:
+        logger.error(f"生成情绪曲线失败: {str(e)}")
+        return json_response(message=f"生成情绪曲线失败: {str(e)}", code=e.code)
+    except Exception as e:
+        logger.error(f"处理请求失败: {str(e)}")
+        return json_response(message='服务器内部错误', code=500)
+
+# 接口使用 JWT 认证，不依赖 Cookie，与 DRF 视图一样豁免 CSRF 校验
+# （Django 3.2 的 csrf_exempt 装饰器会把协程函数包装成同步视图，因此直接设置属性）
+generate_photo.csrf_exempt = True
+generate_curve.csrf_exempt = True
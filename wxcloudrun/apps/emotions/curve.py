@@ -0,0 +1,177 @@
+import json
+import logging
+from datetime import date
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.crypto import salted_hmac
+from django.utils.html import escape
+
+logger = logging.getLogger(__name__)
+
+# 曲线计算或渲染方式变化时修改，使旧缓存失效
+CURVE_VERSION = 1
+
+class CurveDataError(ValueError):
+    """情绪数据格式错误"""
+    pass
+
+def parse_points(emotions: List[Dict[str, Any]]) -> Tuple[List[date], np.ndarray]:
+    """解析 [{'date': 'YYYY-MM-DD', 'level': 8}, ...]，按日期排序"""
+    points = []
+    for item in emotions:
+        try:
+            points.append((date.fromisoformat(str(item['date'])[:10]), float(item['level'])))
+        except (KeyError, TypeError, ValueError):
+            raise CurveDataError('情绪数据格式错误，每项需包含 date（YYYY-MM-DD）和 level')
+    points.sort(key=lambda point: point[0])
+    return [point[0] for point in points], np.array([point[1] for point in points], dtype=float)
+
+def ema(levels: np.ndarray, alpha: float) -> np.ndarray:
+    """指数平滑（以首个点为初值），用下三角权重矩阵一次算出整条序列"""
+    n = len(levels)
+    lags = np.subtract.outer(np.arange(n), np.arange(n))
+    weights = np.where(lags >= 0, alpha * (1 - alpha) ** np.clip(lags, 0, None), 0.0)
+    weights[:, 0] = (1 - alpha) ** np.arange(n)
+    return weights @ levels
+
+def moving_average(levels: np.ndarray, window: int) -> np.ndarray:
+    """尾随移动平均，序列开头不足一个窗口时取已有点的平均"""
+    sums = np.concatenate(([0.0], np.cumsum(levels)))
+    ends = np.arange(1, len(levels) + 1)
+    starts = np.maximum(ends - window, 0)
+    return (sums[ends] - sums[starts]) / (ends - starts)
+
+def trend(days: np.ndarray, levels: np.ndarray) -> Dict[str, float]:
+    """最小二乘线性趋势：每天的分数变化和拟合优度"""
+    if len(levels) < 2 or np.ptp(days) == 0:
+        return {'slope': 0.0, 'r2': 0.0}
+    slope, intercept = np.polyfit(days, levels, 1)
+    residual = levels - (slope * days + intercept)
+    total = np.sum((levels - levels.mean()) ** 2)
+    return {'slope': float(slope), 'r2': float(1 - np.sum(residual ** 2) / total) if total else 0.0}
+
+def volatility(levels: np.ndarray) -> Dict[str, float]:
+    """波动：分数的标准差和相邻两次的平均变化幅度"""
+    if len(levels) < 2:
+        return {'std': 0.0, 'mean_abs_change': 0.0}
+    return {'std': float(levels.std()), 'mean_abs_change': float(np.abs(np.diff(levels)).mean())}
+
+def _best_split(levels: np.ndarray, min_size: int) -> Tuple[int, float]:
+    """均值漂移的最佳切分点及其解释的平方和（用前缀和对所有切分点一次性计算）"""
+    n = len(levels)
+    splits = np.arange(min_size, n - min_size + 1)
+    if len(splits) == 0:
+        return -1, 0.0
+    sums = np.cumsum(levels)
+    left_mean = sums[splits - 1] / splits
+    right_mean = (sums[-1] - sums[splits - 1]) / (n - splits)
+    gains = splits * (n - splits) / n * (left_mean - right_mean) ** 2
+    best = int(np.argmax(gains))
+    return int(splits[best]), float(gains[best])
+
+def change_points(levels: np.ndarray, min_size: int = 3, max_points: int = 3, threshold: float = 4.0) -> List[int]:
+    """二分切分法检测均值变化点，返回变化后第一个点的下标
+
+    切分解释的平方和超过 threshold 倍的整体方差（至少 1 分）时才认为是变化点。
+    """
+    noise = max(float(levels.var()), 1.0) if len(levels) else 1.0
+    found: List[int] = []
+    segments = [(0, len(levels))]
+    while segments and len(found) < max_points:
+        start, end = segments.pop(0)
+        split, gain = _best_split(levels[start:end], min_size)
+        if split < 0 or gain < threshold * noise:
+            continue
+        found.append(start + split)
+        segments.extend([(start, start + split), (start + split, end)])
+    return sorted(found)
+
+def compute_curve(emotions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """计算情绪曲线：平滑序列、移动平均、趋势、波动和变化点"""
+    dates, levels = parse_points(emotions)
+    if len(levels) == 0:
+        raise CurveDataError('情绪数据不能为空')
+    days = np.array([(day - dates[0]).days for day in dates], dtype=float)
+    alpha = getattr(settings, 'EMOTION_CURVE_EMA_ALPHA', 0.4)
+    window = getattr(settings, 'EMOTION_CURVE_MA_WINDOW', 3)
+
+    points = change_points(levels)
+    return {
+        'dates': [day.isoformat() for day in dates],
+        'levels': levels.round(2).tolist(),
+        'smoothed': ema(levels, alpha).round(2).tolist(),
+        'moving_average': moving_average(levels, window).round(2).tolist(),
+        'average': round(float(levels.mean()), 2),
+        'trend': {key: round(value, 4) for key, value in trend(days, levels).items()},
+        'volatility': {key: round(value, 3) for key, value in volatility(levels).items()},
+        'change_points': [{'date': dates[index].isoformat(), 'index': index} for index in points]
+    }
+
+def render_svg(curve: Dict[str, Any], width: int = 600, height: int = 240) -> str:
+    """渲染 SVG 折线图：原始分数、平滑曲线、移动平均和变化点"""
+    left, right, top, bottom = 32, 12, 12, 28
+    levels = curve['levels']
+    low = min(0.0, min(levels))
+    high = max(10.0, max(levels))
+    count = len(levels)
+
+    def x(index):
+        return left + (width - left - right) * (index / (count - 1) if count > 1 else 0.5)
+
+    def y(value):
+        return top + (height - top - bottom) * (1 - (value - low) / (high - low))
+
+    def polyline(values, color, extra=''):
+        coords = ' '.join(f"{x(i):.1f},{y(v):.1f}" for i, v in enumerate(values))
+        return f'<polyline fill="none" stroke="{color}" stroke-width="2" points="{coords}"{extra}/>'
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}">',
+        f'<rect width="{width}" height="{height}" fill="#fff"/>',
+    ]
+    for tick in range(int(low), int(high) + 1, 2):
+        parts.append(f'<line x1="{left}" x2="{width - right}" y1="{y(tick):.1f}" y2="{y(tick):.1f}" stroke="#eee"/>')
+        parts.append(f'<text x="{left - 6}" y="{y(tick) + 4:.1f}" font-size="10" text-anchor="end" fill="#999">{tick}</text>')
+    for point in curve['change_points']:
+        cx = x(point['index'] - 0.5)
+        parts.append(f'<line x1="{cx:.1f}" x2="{cx:.1f}" y1="{top}" y2="{height - bottom}" stroke="#f5a623" stroke-dasharray="4 3"/>')
+    parts.append(polyline(curve['moving_average'], '#7ed321', ' stroke-dasharray="6 3"'))
+    parts.append(polyline(curve['smoothed'], '#4a90e2'))
+    for i, value in enumerate(levels):
+        parts.append(f'<circle cx="{x(i):.1f}" cy="{y(value):.1f}" r="3" fill="#4a90e2"/>')
+    # 最多标注 6 个日期
+    step = max(1, -(-count // 6))
+    for i in range(0, count, step):
+        parts.append(
+            f'<text x="{x(i):.1f}" y="{height - 8}" font-size="10" text-anchor="middle" fill="#999">'
+            f'{escape(curve["dates"][i][5:])}</text>'
+        )
+    parts.append('</svg>')
+    return ''.join(parts)
+
+def curve_key(user_id: Optional[int], emotions: List[Dict[str, Any]]) -> str:
+    """曲线的缓存键：同一用户的同一组数据复用，键不可由他人猜出"""
+    payload = json.dumps([user_id, CURVE_VERSION, emotions], sort_keys=True, ensure_ascii=False, default=str)
+    return salted_hmac('emotions.curve', payload).hexdigest()
+
+def _cache_key(key: str) -> str:
+    return f"emotions:curve:{key}"
+
+def build_curve(user_id: Optional[int], emotions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """计算并渲染曲线，结果按数据缓存"""
+    key = curve_key(user_id, emotions)
+    cached = cache.get(_cache_key(key))
+    if cached is not None:
+        return cached
+
+    curve = compute_curve(emotions)
+    curve['key'] = key
+    curve['svg'] = render_svg(curve)
+    cache.set(_cache_key(key), curve, getattr(settings, 'EMOTION_CURVE_CACHE_TTL', 24 * 3600))
+    return curve
+
+def get_cached_svg(key: str) -> Optional[str]:
+    curve = cache.get(_cache_key(key))
+    return curve['svg'] if curve else None
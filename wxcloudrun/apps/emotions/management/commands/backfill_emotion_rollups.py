@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from wxcloudrun.apps.emotions.rollup import rebuild
+
+class Command(BaseCommand):
+    """按情绪记录重新生成每日汇总（首次上线、批量导入或修复汇总时执行）"""
+
+    help = '重新生成每日情绪汇总表 emotion_daily_rollups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users', help='只处理指定用户，可重复')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rows = rebuild(options['users'], batch_size=options['batch_size'])
+        self.stdout.write(f"已生成 {rows} 条每日情绪汇总")
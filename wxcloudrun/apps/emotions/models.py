@@ -1,18 +1,68 @@
 from django.db import models
 from wxcloudrun.apps.users.models import User
 
+class PhotoAsset(models.Model):
+    """生成的情绪照片，按 (文本, 风格) 的哈希去重，原图和各尺寸版本保存在对象存储中"""
+    key = models.CharField(max_length=64, unique=True)  # sha256(文本, 风格)
+    style = models.CharField(max_length=50, null=True, blank=True)
+    source_url = models.URLField(max_length=1000)  # COZE 返回的原始地址
+    original_url = models.URLField(max_length=1000)
+    webp_url = models.URLField(max_length=1000)
+    thumbnail_url = models.URLField(max_length=1000)
+    thumbnail_webp_url = models.URLField(max_length=1000)
+    width = models.IntegerField(default=0)
+    height = models.IntegerField(default=0)
+    size = models.IntegerField(default=0)  # 原图字节数
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'emotion_photo_assets'
+
+    def __str__(self):
+        return f"{self.key[:12]} - {self.style}"
+
 class EmotionRecord(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='emotion_records')
     emotion_type = models.CharField(max_length=50)
-    emotion_level = models.IntegerField()
+    emotion_level = models.IntegerField(null=True, blank=True)  # 只有生成照片的记录没有分数，不计入汇总
     description = models.TextField()
     ai_analysis = models.TextField(null=True, blank=True)
+    photo_url = models.URLField(max_length=1000, null=True, blank=True)  # 未能转存时为 COZE 返回的地址
+    photo_style = models.CharField(max_length=50, null=True, blank=True)
+    photo_asset = models.ForeignKey(PhotoAsset, on_delete=models.SET_NULL, null=True, blank=True, related_name='records')
+    client_id = models.CharField(max_length=64, null=True, blank=True)  # 客户端生成的记录 ID，离线同步时去重
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
         db_table = 'emotion_records'
+        unique_together = [('user', 'client_id')]
+        # 游标分页按 (created_at, id) 定位
+        indexes = [models.Index(fields=['user', 'created_at', 'id'], name='emotion_records_user_created')]
 
     def __str__(self):
-        return f"{self.user.username} - {self.emotion_type} - {self.created_at}" 
\ No newline at end of file
+        return f"{self.user.username} - {self.emotion_type} - {self.created_at}"
+
+class EmotionDailyRollup(models.Model):
+    """按用户、按天预聚合的情绪数据，由 EmotionRecord 的增删改增量维护"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='emotion_rollups')
+    date = models.DateField()
+    count = models.IntegerField(default=0)
+    level_sum = models.IntegerField(default=0)
+    level_min = models.IntegerField(null=True, blank=True)
+    level_max = models.IntegerField(null=True, blank=True)
+    type_counts = models.JSONField(default=dict)  # emotion_type -> 记录数
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['date']
+        db_table = 'emotion_daily_rollups'
+        unique_together = [('user', 'date')]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.date} - {self.count}"
+
+    @property
+    def average_level(self):
+        return self.level_sum / self.count if self.count else 0
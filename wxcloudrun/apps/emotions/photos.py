@@ -0,0 +1,157 @@
+import io
+import json
+import hashlib
+import logging
+from typing import Dict, Any, Optional, Tuple
+from PIL import Image, UnidentifiedImageError
+from django.conf import settings
+from django.db import IntegrityError
+from wxcloudrun.apps.core.services.http_pool import get_transport
+from wxcloudrun.apps.core.services.storage import get_asset_storage, StorageError
+from wxcloudrun.apps.core.services.coze_service import coze_service
+from .models import PhotoAsset
+
+logger = logging.getLogger(__name__)
+
+# 原图格式 -> (扩展名, Content-Type)
+FORMATS = {
+    'JPEG': ('jpg', 'image/jpeg'),
+    'PNG': ('png', 'image/png'),
+    'WEBP': ('webp', 'image/webp'),
+    'GIF': ('gif', 'image/gif'),
+}
+
+class PhotoAssetError(Exception):
+    """下载或处理生成的照片失败"""
+    pass
+
+def photo_key(text: str, style: Optional[str]) -> str:
+    """照片去重键：相同的描述文本和风格只生成、转存一次"""
+    payload = json.dumps([text.strip(), style or ''], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def find_asset(text: str, style: Optional[str]) -> Optional[PhotoAsset]:
+    return PhotoAsset.objects.filter(key=photo_key(text, style)).first()
+
+def download(url: str) -> bytes:
+    """通过共享连接池下载图片，超过 EMOTION_PHOTO_MAX_BYTES 时中止"""
+    max_bytes = getattr(settings, 'EMOTION_PHOTO_MAX_BYTES', 10 * 1024 * 1024)
+    try:
+        response = get_transport().request('GET', url, stream=True)
+        try:
+            response.raise_for_status()
+            data = bytearray()
+            for chunk in response.iter_content(64 * 1024):
+                data.extend(chunk)
+                if len(data) > max_bytes:
+                    raise PhotoAssetError(f"图片超过 {max_bytes} 字节")
+        finally:
+            response.close()
+    except PhotoAssetError:
+        raise
+    except Exception as e:
+        raise PhotoAssetError(f"下载图片失败: {str(e)}")
+    return bytes(data)
+
+def _encode(image: Image.Image, fmt: str, **options) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, **options)
+    return buffer.getvalue()
+
+def render_variants(data: bytes) -> Dict[str, Any]:
+    """生成原图、WebP 原尺寸、缩略图（JPEG 和 WebP）四个版本"""
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except Image.DecompressionBombError as e:
+        raise PhotoAssetError(f"图片尺寸过大: {str(e)}")
+    except (UnidentifiedImageError, OSError) as e:
+        raise PhotoAssetError(f"无法识别的图片: {str(e)}")
+    if image.format not in FORMATS:
+        raise PhotoAssetError(f"不支持的图片格式: {image.format}")
+
+    quality = getattr(settings, 'EMOTION_PHOTO_WEBP_QUALITY', 80)
+    size = getattr(settings, 'EMOTION_PHOTO_THUMBNAIL_SIZE', 320)
+    extension, content_type = FORMATS[image.format]
+    has_alpha = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+    full = image.convert('RGBA' if has_alpha else 'RGB')
+    thumbnail = full.copy()
+    thumbnail.thumbnail((size, size), Image.LANCZOS)
+
+    try:
+        files = {
+            'original': (f"original.{extension}", data, content_type),
+            'webp': ('full.webp', _encode(full, 'WEBP', quality=quality), 'image/webp'),
+            'thumbnail': ('thumb.jpg', _encode(thumbnail.convert('RGB'), 'JPEG', quality=85, optimize=True), 'image/jpeg'),
+            'thumbnail_webp': ('thumb.webp', _encode(thumbnail, 'WEBP', quality=quality), 'image/webp'),
+        }
+    except (OSError, ValueError, KeyError) as e:
+        # 缺少 WebP/JPEG 编码支持等
+        raise PhotoAssetError(f"生成图片版本失败: {str(e)}")
+    return {'width': image.width, 'height': image.height, 'files': files}
+
+def store_photo(text: str, style: Optional[str], source_url: str) -> PhotoAsset:
+    """下载 COZE 生成的图片，生成各版本并写入对象存储"""
+    key = photo_key(text, style)
+    variants = render_variants(download(source_url))
+    try:
+        storage = get_asset_storage()
+    except Exception as e:
+        # 未安装 COS SDK、存储配置错误等
+        raise PhotoAssetError(f"初始化资源存储失败: {str(e)}")
+    prefix = f"emotions/photos/{key[:2]}/{key}"
+    try:
+        urls = {
+            name: storage.save(f"{prefix}/{filename}", content, content_type)
+            for name, (filename, content, content_type) in variants['files'].items()
+        }
+    except StorageError as e:
+        raise PhotoAssetError(str(e))
+
+    try:
+        return PhotoAsset.objects.create(
+            key=key,
+            style=style,
+            source_url=source_url,
+            original_url=urls['original'],
+            webp_url=urls['webp'],
+            thumbnail_url=urls['thumbnail'],
+            thumbnail_webp_url=urls['thumbnail_webp'],
+            width=variants['width'],
+            height=variants['height'],
+            size=len(variants['files']['original'][1])
+        )
+    except IntegrityError:
+        # 并发请求已转存了同一张照片（存储键相同，上传的文件可以共用）
+        return PhotoAsset.objects.get(key=key)
+
+def store_generated_photo(text: str, style: Optional[str], source_url: Optional[str]) -> Optional[PhotoAsset]:
+    """转存生成的照片，任何失败都返回 None（COZE 已经调用过，调用方退回使用 COZE 返回的地址）"""
+    if not source_url:
+        return None
+    try:
+        return store_photo(text, style, source_url)
+    except PhotoAssetError as e:
+        logger.warning(f"转存情绪照片失败: {source_url}: {str(e)}")
+    except Exception as e:
+        logger.error(f"转存情绪照片出错: {source_url}: {str(e)}", exc_info=True)
+    return None
+
+def obtain_photo(text: str, style: Optional[str]) -> Tuple[Optional[PhotoAsset], Dict[str, Any]]:
+    """获取照片：已转存过相同文本和风格的照片时直接复用，否则调用 COZE 生成并转存"""
+    asset = find_asset(text, style)
+    if asset is not None:
+        return asset, {'photo_url': asset.original_url}
+    result = coze_service.generate_emotion_photo(text, style)
+    return store_generated_photo(text, style, result.get('photo_url')), result
+
+def photo_urls(asset: Optional[PhotoAsset], result: Dict[str, Any]) -> Dict[str, Any]:
+    """接口返回的照片地址：原图、WebP 和缩略图"""
+    if asset is None:
+        return {'photo_url': result.get('photo_url'), 'webp_url': None, 'thumbnail_url': None, 'thumbnail_webp_url': None}
+    return {
+        'photo_url': asset.original_url,
+        'webp_url': asset.webp_url,
+        'thumbnail_url': asset.thumbnail_url,
+        'thumbnail_webp_url': asset.thumbnail_webp_url,
+    }
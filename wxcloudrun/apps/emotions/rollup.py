@@ -0,0 +1,152 @@
+import logging
+from datetime import date
+from typing import Dict, Any, List, Optional
+from django.db import transaction, IntegrityError
+from django.db.models import Count, Sum, Min, Max
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import EmotionRecord, EmotionDailyRollup
+
+logger = logging.getLogger(__name__)
+
+def record_date(record: EmotionRecord) -> date:
+    """记录所属的日期（本地时区）"""
+    return timezone.localdate(record.created_at)
+
+def _recompute_bounds(rollup: EmotionDailyRollup) -> None:
+    """删除了当天的最低/最高分记录后，从当天的记录重新计算最值"""
+    bounds = EmotionRecord.objects.filter(
+        user_id=rollup.user_id, created_at__date=rollup.date
+    ).aggregate(level_min=Min('emotion_level'), level_max=Max('emotion_level'))
+    rollup.level_min = bounds['level_min']
+    rollup.level_max = bounds['level_max']
+
+def _add(user_id: int, day: date, count: int, level_sum: int, level_min: int, level_max: int, type_counts: Dict[str, int]) -> None:
+    """把一组同一天的记录计入汇总"""
+    with transaction.atomic():
+        rollup = EmotionDailyRollup.objects.select_for_update().filter(user_id=user_id, date=day).first()
+        if rollup is None:
+            try:
+                with transaction.atomic():
+                    EmotionDailyRollup.objects.create(
+                        user_id=user_id, date=day, count=count, level_sum=level_sum,
+                        level_min=level_min, level_max=level_max, type_counts=dict(type_counts)
+                    )
+                return
+            except IntegrityError:
+                # 并发创建了同一天的汇总，改为累加
+                rollup = EmotionDailyRollup.objects.select_for_update().get(user_id=user_id, date=day)
+
+        rollup.count += count
+        rollup.level_sum += level_sum
+        rollup.level_min = level_min if rollup.level_min is None else min(rollup.level_min, level_min)
+        rollup.level_max = level_max if rollup.level_max is None else max(rollup.level_max, level_max)
+        for emotion_type, type_count in type_counts.items():
+            rollup.type_counts[emotion_type] = rollup.type_counts.get(emotion_type, 0) + type_count
+        rollup.save()
+
+def apply(user_id: int, day: date, level: int, emotion_type: str, delta: int) -> None:
+    """把一条记录计入（delta=1）或移出（delta=-1）当天的汇总"""
+    if level is None:
+        # 没有分数的记录（只生成了照片）不计入汇总
+        return
+    if delta > 0:
+        _add(user_id, day, 1, level, level, level, {emotion_type: 1})
+        return
+
+    with transaction.atomic():
+        rollup = EmotionDailyRollup.objects.select_for_update().filter(user_id=user_id, date=day).first()
+        if rollup is None:
+            logger.warning(f"情绪汇总缺失: 用户 {user_id} {day}，请执行 backfill_emotion_rollups")
+            return
+
+        rollup.count -= 1
+        if rollup.count <= 0:
+            rollup.delete()
+            return
+
+        rollup.level_sum -= level
+        type_count = rollup.type_counts.get(emotion_type, 0) - 1
+        if type_count > 0:
+            rollup.type_counts[emotion_type] = type_count
+        else:
+            rollup.type_counts.pop(emotion_type, None)
+
+        if level in (rollup.level_min, rollup.level_max):
+            _recompute_bounds(rollup)
+        rollup.save()
+
+def add_records(records: List[EmotionRecord]) -> None:
+    """计入批量新建的记录（bulk_create 不触发信号），每个用户每天只更新一次汇总"""
+    groups: Dict[tuple, Dict[str, Any]] = {}
+    for record in records:
+        level = record.emotion_level
+        if level is None:
+            continue
+        group = groups.setdefault((record.user_id, record_date(record)), {
+            'count': 0, 'level_sum': 0, 'level_min': level, 'level_max': level, 'type_counts': {}
+        })
+        group['count'] += 1
+        group['level_sum'] += level
+        group['level_min'] = min(group['level_min'], level)
+        group['level_max'] = max(group['level_max'], level)
+        group['type_counts'][record.emotion_type] = group['type_counts'].get(record.emotion_type, 0) + 1
+
+    for (user_id, day), group in groups.items():
+        _add(user_id, day, **group)
+
+def rebuild(user_ids: Optional[List[int]] = None, batch_size: int = 1000) -> int:
+    """按记录重新生成汇总（全部用户或指定用户），返回写入的汇总行数"""
+    records = EmotionRecord.objects.filter(emotion_level__isnull=False)
+    rollups = EmotionDailyRollup.objects.all()
+    if user_ids is not None:
+        records = records.filter(user_id__in=user_ids)
+        rollups = rollups.filter(user_id__in=user_ids)
+
+    days: Dict[tuple, EmotionDailyRollup] = {}
+    grouped = records.annotate(day=TruncDate('created_at')).values('user_id', 'day', 'emotion_type').annotate(
+        count=Count('id'), level_sum=Sum('emotion_level'), level_min=Min('emotion_level'), level_max=Max('emotion_level')
+    ).order_by()
+    for row in grouped.iterator():
+        key = (row['user_id'], row['day'])
+        rollup = days.get(key)
+        if rollup is None:
+            rollup = days[key] = EmotionDailyRollup(
+                user_id=row['user_id'], date=row['day'], count=0, level_sum=0,
+                level_min=row['level_min'], level_max=row['level_max'], type_counts={}
+            )
+        rollup.count += row['count']
+        rollup.level_sum += row['level_sum'] or 0
+        rollup.level_min = min(rollup.level_min, row['level_min'])
+        rollup.level_max = max(rollup.level_max, row['level_max'])
+        rollup.type_counts[row['emotion_type']] = row['count']
+
+    with transaction.atomic():
+        rollups.delete()
+        EmotionDailyRollup.objects.bulk_create(days.values(), batch_size=batch_size)
+    return len(days)
+
+def daily_statistics(user, start_date: date, end_date: date) -> Dict[str, Any]:
+    """按天汇总读取统计数据，查询量与天数成正比，与记录数无关"""
+    rollups = list(EmotionDailyRollup.objects.filter(user=user, date__gte=start_date, date__lte=end_date))
+    total_count = sum(rollup.count for rollup in rollups)
+    level_sum = sum(rollup.level_sum for rollup in rollups)
+
+    emotion_types: Dict[str, int] = {}
+    for rollup in rollups:
+        for emotion_type, count in rollup.type_counts.items():
+            emotion_types[emotion_type] = emotion_types.get(emotion_type, 0) + count
+
+    return {
+        'total_count': total_count,
+        'average_level': level_sum / total_count if total_count > 0 else 0,
+        'emotion_types': emotion_types,
+        'daily': [{
+            'date': rollup.date,
+            'count': rollup.count,
+            'average_level': round(rollup.average_level, 2),
+            'min_level': rollup.level_min,
+            'max_level': rollup.level_max,
+            'emotion_types': rollup.type_counts
+        } for rollup in rollups]
+    }
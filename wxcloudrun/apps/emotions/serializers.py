@@ -2,10 +2,39 @@ from rest_framework import serializers
 from .models import EmotionRecord
 
 class EmotionRecordSerializer(serializers.ModelSerializer):
+    # 照片地址：context['photo_variant'] 为 thumbnail 时返回缩略图（列表），否则返回原图（详情）
+    photo_url = serializers.SerializerMethodField()
+    photo_webp_url = serializers.SerializerMethodField()
+
     class Meta:
         model = EmotionRecord
-        fields = ['id', 'emotion_type', 'emotion_level', 'description', 'ai_analysis', 'created_at']
-        read_only_fields = ['id', 'ai_analysis', 'created_at']
+        fields = ['id', 'emotion_type', 'emotion_level', 'description', 'ai_analysis',
+                  'photo_url', 'photo_webp_url', 'photo_style', 'created_at']
+        read_only_fields = ['id', 'ai_analysis', 'photo_style', 'created_at']
+        # 只有生成照片的记录没有分数，手动创建的记录必须填写
+        extra_kwargs = {'emotion_level': {'required': True, 'allow_null': False}}
+
+    def _thumbnail(self):
+        return self.context.get('photo_variant') == 'thumbnail'
+
+    def get_photo_url(self, obj):
+        asset = obj.photo_asset
+        if asset is None:
+            return obj.photo_url
+        return asset.thumbnail_url if self._thumbnail() else asset.original_url
+
+    def get_photo_webp_url(self, obj):
+        asset = obj.photo_asset
+        if asset is None:
+            return None
+        return asset.thumbnail_webp_url if self._thumbnail() else asset.webp_url
+
+class EmotionRecordSyncSerializer(EmotionRecordSerializer):
+    """离线同步的单条记录，client_id 必填"""
+    client_id = serializers.CharField(max_length=64)
+
+    class Meta(EmotionRecordSerializer.Meta):
+        fields = EmotionRecordSerializer.Meta.fields + ['client_id']
 
 class EmotionRecordCreateSerializer(serializers.ModelSerializer):
     class Meta:
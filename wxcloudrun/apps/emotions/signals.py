@@ -0,0 +1,41 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import EmotionRecord
+from . import rollup
+
+# 汇总与记录在同一事务中更新，记录写入回滚时汇总一并回滚
+# 注意：QuerySet.update()、bulk_create() 不触发信号，批量写入后需执行 backfill_emotion_rollups
+
+def _rollup_fields(user_id, created_at, emotion_level, emotion_type):
+    return {
+        'user_id': user_id,
+        'date': timezone.localdate(created_at),
+        'emotion_level': emotion_level,
+        'emotion_type': emotion_type
+    }
+
+@receiver(pre_save, sender=EmotionRecord)
+def remember_previous(sender, instance, **kwargs):
+    """记录修改前影响汇总的字段"""
+    instance._rollup_previous = None
+    if instance.pk:
+        previous = EmotionRecord.objects.filter(pk=instance.pk).values_list(
+            'user_id', 'created_at', 'emotion_level', 'emotion_type'
+        ).first()
+        if previous:
+            instance._rollup_previous = _rollup_fields(*previous)
+
+@receiver(post_save, sender=EmotionRecord)
+def update_rollup_on_save(sender, instance, **kwargs):
+    current = _rollup_fields(instance.user_id, instance.created_at, instance.emotion_level, instance.emotion_type)
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous == current:
+        return
+    if previous:
+        rollup.apply(previous['user_id'], previous['date'], previous['emotion_level'], previous['emotion_type'], -1)
+    rollup.apply(current['user_id'], current['date'], current['emotion_level'], current['emotion_type'], 1)
+
+@receiver(post_delete, sender=EmotionRecord)
+def update_rollup_on_delete(sender, instance, **kwargs):
+    rollup.apply(instance.user_id, rollup.record_date(instance), instance.emotion_level, instance.emotion_type, -1)
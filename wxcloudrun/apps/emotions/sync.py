@@ -0,0 +1,82 @@
+import logging
+from typing import Dict, Any, List
+from django.conf import settings
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+from .models import EmotionRecord
+from .serializers import EmotionRecordSyncSerializer
+from . import rollup
+
+logger = logging.getLogger(__name__)
+
+class SyncRequestError(ValueError):
+    """同步请求整体不合法"""
+    pass
+
+def sync_records(user, items: Any) -> List[Dict[str, Any]]:
+    """批量写入离线记录：逐条校验，按 client_id 去重，一次 bulk_create，返回与请求顺序一致的逐条结果
+
+    每条结果的 status 为 created（本次写入）、duplicate（已同步过）或 invalid（校验失败）。
+    """
+    if not isinstance(items, list) or not items:
+        raise SyncRequestError('请提供 records 列表')
+    max_batch = getattr(settings, 'EMOTION_SYNC_MAX_BATCH', 100)
+    if len(items) > max_batch:
+        raise SyncRequestError(f"单次最多同步 {max_batch} 条记录")
+
+    # 与 many=True 相同的逐条校验，但单条失败不影响其他记录
+    validator = EmotionRecordSyncSerializer()
+    results: List[Dict[str, Any]] = []
+    validated: Dict[str, Dict[str, Any]] = {}  # client_id -> 校验后的数据
+    pending: Dict[str, int] = {}  # client_id -> 结果下标
+    for index, item in enumerate(items):
+        result = {'client_id': item.get('client_id') if isinstance(item, dict) else None}
+        results.append(result)
+        try:
+            data = validator.run_validation(item)
+        except ValidationError as e:
+            result.update(status='invalid', errors=e.detail)
+            continue
+        if data['client_id'] in pending:
+            # 同一批次中重复的记录只写入第一条
+            result['status'] = 'duplicate'
+            continue
+        pending[data['client_id']] = index
+        validated[data['client_id']] = data
+
+    existing = dict(EmotionRecord.objects.filter(
+        user=user, client_id__in=list(pending)
+    ).values_list('client_id', 'id'))
+
+    new_records = []
+    for client_id, index in pending.items():
+        if client_id in existing:
+            results[index].update(status='duplicate', id=existing[client_id])
+            continue
+        new_records.append(EmotionRecord(user=user, **validated[client_id]))
+
+    if new_records:
+        with transaction.atomic():
+            # 与并发的重放请求冲突时忽略，写入后按 client_id 回查 ID
+            EmotionRecord.objects.bulk_create(new_records, ignore_conflicts=True)
+            saved = {
+                row['client_id']: row for row in EmotionRecord.objects.filter(
+                    user=user, client_id__in=[record.client_id for record in new_records]
+                ).values('client_id', 'id', 'created_at')
+            }
+            created = []
+            for record in new_records:
+                row = saved.get(record.client_id)
+                # 创建时间与本次写入一致的才是本批次写入的记录
+                mine = row is not None and row['created_at'] == record.created_at
+                results[pending[record.client_id]].update(
+                    status='created' if mine else 'duplicate',
+                    id=row['id'] if row else None
+                )
+                if mine:
+                    record.id = row['id']
+                    created.append(record)
+            rollup.add_records(created)
+
+    logger.info(f"离线同步: 用户 {user.id} 提交 {len(items)} 条，新建 {sum(r.get('status') == 'created' for r in results)} 条")
+    return results
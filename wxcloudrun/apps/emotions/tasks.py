@@ -0,0 +1,36 @@
+from wxcloudrun.apps.core.services.coze_service import coze_service
+from wxcloudrun.apps.jobs.queue import register
+from .curve import build_curve
+
+@register('emotions.generate_photo', workflow='emotion_photo')
+def generate_photo(job):
+    """生成情绪照片并记录生成历史"""
+    # 在执行时导入视图模块，避免任务注册（AppConfig.ready）依赖视图层的导入
+    from .views import record_generated_photo
+    from .photos import obtain_photo, photo_urls
+
+    text = job.payload['text']
+    style = job.payload.get('style')
+    asset, result = obtain_photo(text, style)
+    emotion_record = record_generated_photo(job.user, text, style, result, asset)
+    return {
+        'record_id': emotion_record.id,
+        **photo_urls(asset, result)
+    }
+
+@register('emotions.curve_commentary', workflow='emotion_curve')
+def curve_commentary(job):
+    """情绪曲线的文字解读（曲线本身在本地生成）"""
+    result = coze_service.generate_emotion_curve(job.payload['emotions'])
+    return {'analysis': result.get('analysis')}
+
+@register('emotions.generate_curve', workflow='emotion_curve')
+def generate_curve(job):
+    """生成情绪曲线和文字解读（兼容已提交的任务）"""
+    curve = build_curve(job.user_id, job.payload['emotions'])
+    result = coze_service.generate_emotion_curve(job.payload['emotions'])
+    return {
+        'curve_key': curve['key'],
+        'curve_svg': curve['svg'],
+        'analysis': result.get('analysis')
+    }
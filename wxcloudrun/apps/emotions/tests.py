@@ -1,10 +1,17 @@
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.test import APITestCase, APIRequestFactory, force_authenticate
 from unittest.mock import patch, MagicMock
-from .models import EmotionRecord
+from .models import EmotionRecord, EmotionDailyRollup
+from .rollup import rebuild
+from .curve import compute_curve, render_svg
+from .sync import sync_records
+from .photos import render_variants, obtain_photo, photo_key, store_generated_photo, PhotoAssetError
+from .models import PhotoAsset
+from .views import EmotionViewSet
 from wxcloudrun.apps.core.services.coze_service import CozeService, CozeServiceError
 
 User = get_user_model()
@@ -167,4 +174,168 @@ class EmotionAPITests(APITestCase):
         
         response = self.client.get(url, params)
         
-        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST) 
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class EmotionDailyRollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='rollupuser',
+            password='testpass123'
+        )
+
+    def create_record(self, level, emotion_type='开心'):
+        return EmotionRecord.objects.create(
+            user=self.user,
+            emotion_type=emotion_type,
+            emotion_level=level,
+            description='测试'
+        )
+
+    def test_rollup_follows_create_update_delete(self):
+        """测试每日汇总随记录的增删改增量更新"""
+        low = self.create_record(3, '难过')
+        high = self.create_record(9)
+        rollup = EmotionDailyRollup.objects.get(user=self.user)
+        self.assertEqual((rollup.count, rollup.level_sum, rollup.level_min, rollup.level_max), (2, 12, 3, 9))
+        self.assertEqual(rollup.type_counts, {'难过': 1, '开心': 1})
+
+        low.emotion_level = 5
+        low.emotion_type = '开心'
+        low.save()
+        rollup.refresh_from_db()
+        self.assertEqual((rollup.count, rollup.level_sum, rollup.level_min, rollup.level_max), (2, 14, 5, 9))
+        self.assertEqual(rollup.type_counts, {'开心': 2})
+
+        high.delete()
+        rollup.refresh_from_db()
+        self.assertEqual((rollup.count, rollup.level_sum, rollup.level_min, rollup.level_max), (1, 5, 5, 5))
+
+        low.delete()
+        self.assertFalse(EmotionDailyRollup.objects.filter(user=self.user).exists())
+
+    def test_rebuild_matches_incremental(self):
+        """测试回填结果与增量维护一致"""
+        for level in (2, 7, 4):
+            self.create_record(level)
+        expected = EmotionDailyRollup.objects.values('count', 'level_sum', 'level_min', 'level_max', 'type_counts').get()
+
+        EmotionDailyRollup.objects.all().delete()
+        self.assertEqual(rebuild([self.user.id]), 1)
+        self.assertEqual(
+            EmotionDailyRollup.objects.values('count', 'level_sum', 'level_min', 'level_max', 'type_counts').get(),
+            expected
+        )
+
+    def test_statistics_records_opt_out(self):
+        """测试统计接口默认返回记录明细，include_records=0 时只返回汇总"""
+        self.create_record(4)
+        self.create_record(8)
+        today = timezone.localdate().isoformat()
+        view = EmotionViewSet.as_view({'get': 'statistics'})
+
+        def get(**params):
+            request = APIRequestFactory().get('/', {'start_date': today, 'end_date': today, **params})
+            force_authenticate(request, self.user)
+            return view(request).data['data']
+
+        data = get()
+        self.assertEqual((data['total_count'], data['average_level']), (2, 6.0))
+        self.assertEqual(len(data['records']), 2)
+        self.assertNotIn('records', get(include_records='0'))
+
+class EmotionCurveTests(TestCase):
+    def test_compute_curve(self):
+        """测试本地曲线计算：趋势、移动平均与变化点"""
+        emotions = [
+            {'date': f'2023-12-{day:02d}', 'level': 3 if day <= 6 else 8}
+            for day in range(12, 0, -1)
+        ]
+        curve = compute_curve(emotions)
+
+        self.assertEqual(curve['dates'][0], '2023-12-01')
+        self.assertEqual([point['date'] for point in curve['change_points']], ['2023-12-07'])
+        self.assertGreater(curve['trend']['slope'], 0)
+        self.assertEqual(curve['moving_average'][:2], [3.0, 3.0])
+        self.assertEqual(curve['smoothed'][0], 3.0)
+        self.assertTrue(render_svg(curve).startswith('<svg'))
+
+class EmotionSyncTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='syncuser',
+            password='testpass123'
+        )
+
+    def test_sync_dedupes_by_client_id(self):
+        """测试离线同步：逐条结果、批内与重放去重、汇总更新"""
+        records = [
+            {'client_id': 'a', 'emotion_type': '开心', 'emotion_level': 8, 'description': '测试'},
+            {'client_id': 'b', 'emotion_type': '难过', 'emotion_level': 2, 'description': '测试'},
+            {'client_id': 'a', 'emotion_type': '开心', 'emotion_level': 8, 'description': '测试'},
+            {'client_id': 'c', 'emotion_type': '开心', 'description': '缺少分数'},
+        ]
+        results = sync_records(self.user, records)
+        self.assertEqual([r['status'] for r in results], ['created', 'created', 'duplicate', 'invalid'])
+        self.assertIn('emotion_level', results[3]['errors'])
+
+        replay = sync_records(self.user, records[:2])
+        self.assertEqual([r['status'] for r in replay], ['duplicate', 'duplicate'])
+        self.assertEqual([r['id'] for r in replay], [results[0]['id'], results[1]['id']])
+
+        self.assertEqual(EmotionRecord.objects.filter(user=self.user).count(), 2)
+        rollup = EmotionDailyRollup.objects.get(user=self.user)
+        self.assertEqual((rollup.count, rollup.level_sum, rollup.level_min, rollup.level_max), (2, 10, 2, 8))
+
+class EmotionPhotoTests(TestCase):
+    def test_render_variants(self):
+        """测试照片版本：缩略图按比例缩小，原图保持原样"""
+        import io
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.new('RGB', (1000, 500), (200, 80, 40)).save(buffer, 'PNG')
+        variants = render_variants(buffer.getvalue())
+
+        self.assertEqual((variants['width'], variants['height']), (1000, 500))
+        self.assertEqual(variants['files']['original'][1], buffer.getvalue())
+        self.assertEqual(Image.open(io.BytesIO(variants['files']['thumbnail'][1])).size, (320, 160))
+        self.assertEqual(Image.open(io.BytesIO(variants['files']['webp'][1])).format, 'WEBP')
+
+    def test_render_variants_rejects_decompression_bomb(self):
+        """测试像素数超过 PIL 限制的图片转为 PhotoAssetError"""
+        import io
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.new('RGB', (100, 100)).save(buffer, 'PNG')
+        with patch.object(Image, 'MAX_IMAGE_PIXELS', 1000):
+            with self.assertRaises(PhotoAssetError):
+                render_variants(buffer.getvalue())
+
+    @patch('wxcloudrun.apps.emotions.photos.download', return_value=b'')
+    @patch('wxcloudrun.apps.emotions.photos.render_variants', return_value={'width': 1, 'height': 1, 'files': {}})
+    def test_storage_errors_fall_back_to_coze_url(self, mock_render, mock_download):
+        """测试存储初始化失败（如未安装 COS SDK）或意外错误时返回 None，由调用方使用 COZE 地址"""
+        with patch('wxcloudrun.apps.emotions.photos.get_asset_storage', side_effect=ImportError('No module named qcloud_cos')):
+            self.assertIsNone(store_generated_photo('开心', '水彩', 'https://example.com/a.png'))
+        with patch('wxcloudrun.apps.emotions.photos.get_asset_storage', side_effect=ValueError('未知的存储后端: s3')):
+            self.assertIsNone(store_generated_photo('开心', '水彩', 'https://example.com/a.png'))
+        mock_render.side_effect = RuntimeError('意外错误')
+        self.assertIsNone(store_generated_photo('开心', '水彩', 'https://example.com/a.png'))
+        self.assertFalse(PhotoAsset.objects.exists())
+
+    def test_obtain_photo_reuses_asset(self):
+        """测试相同文本和风格的照片直接复用，不再调用COZE"""
+        # 显式传入替身：默认的 patch 会检查原对象，触发懒加载的 coze_service 读取私钥
+        mock_coze = MagicMock()
+        patcher = patch('wxcloudrun.apps.emotions.photos.coze_service', mock_coze)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        asset = PhotoAsset.objects.create(
+            key=photo_key('开心', '水彩'), style='水彩', source_url='https://example.com/a.png',
+            original_url='https://cdn.example.com/a.png', webp_url='https://cdn.example.com/a.webp',
+            thumbnail_url='https://cdn.example.com/t.jpg', thumbnail_webp_url='https://cdn.example.com/t.webp'
+        )
+        found, result = obtain_photo(' 开心 ', '水彩')
+
+        self.assertEqual(found, asset)
+        self.assertEqual(result['photo_url'], asset.original_url)
+        mock_coze.generate_emotion_photo.assert_not_called()
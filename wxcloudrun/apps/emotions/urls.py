@@ -1,10 +1,14 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import EmotionRecordViewSet
+from . import async_views
 
 router = DefaultRouter()
 router.register(r'records', EmotionRecordViewSet, basename='emotion-record')
 
 urlpatterns = [
     path('', include(router.urls)),
+    # 异步接口（ASGI 部署时使用）
+    path('async/generate_photo/', async_views.generate_photo, name='emotion-generate-photo-async'),
+    path('async/generate_curve/', async_views.generate_curve, name='emotion-generate-curve-async'),
 ] 
\ No newline at end of file
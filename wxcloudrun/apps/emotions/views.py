@@ -1,30 +1,106 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.renderers import JSONRenderer
+from django.http import HttpResponse
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 from django.db import transaction
 from wxcloudrun.apps.core.authentication import JWTAuthentication
-from wxcloudrun.apps.core.utils.response import success_response, error_response
-from wxcloudrun.apps.core.services.coze_service import coze_service, CozeServiceError
+from wxcloudrun.apps.core.utils.pagination import KeysetPagination
+from wxcloudrun.apps.core.utils.export import export_response, EXPORT_FORMATS
+from wxcloudrun.apps.core.utils.response import success_response, error_response, not_found_error, accepted_response, stream_text_response, EventStreamRenderer
+from wxcloudrun.apps.core.services.coze_service import CozeServiceError
+from wxcloudrun.apps.core.services.ai_service import AIService
+from wxcloudrun.apps.jobs import queue
 from .models import EmotionRecord
+from .rollup import daily_statistics
+from .curve import build_curve, get_cached_svg, CurveDataError
+from .sync import sync_records, SyncRequestError
+from .photos import obtain_photo, photo_urls
 from .serializers import EmotionRecordSerializer
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 只生成了照片、没有情绪分数的记录
+EMOTION_TYPE_PHOTO = 'photo'
+
+def validate_photo_request(text):
+    """校验生成照片的参数，返回错误信息"""
+    if not text:
+        return '请提供情绪描述文本'
+    if len(text) > 500:
+        return '情绪描述文本过长，请控制在500字以内'
+    return None
+
+def validate_curve_request(emotions):
+    """校验生成曲线的参数，返回错误信息"""
+    if not emotions:
+        return '请提供情绪数据'
+    if not isinstance(emotions, list):
+        return '情绪数据格式错误'
+    if len(emotions) > 30:
+        return '情绪数据过多，请控制在30条以内'
+    return None
+
+def curve_points(user, days):
+    """从每日汇总生成最近 days 天的情绪曲线数据（每天的平均分）"""
+    end_date = timezone.localdate()
+    start_date = end_date - timezone.timedelta(days=days - 1)
+    return [
+        {'date': day['date'].isoformat(), 'level': round(day['average_level'], 1)}
+        for day in daily_statistics(user, start_date, end_date)['daily']
+    ]
+
+def generate_curve_data(user, emotions, commentary=True):
+    """本地计算并渲染情绪曲线；COZE 只用于可选的文字解读，在后台任务中生成"""
+    curve = build_curve(user.id, emotions)
+    commentary_job = None
+    if commentary:
+        commentary_job = queue.enqueue('emotions.curve_commentary', {'emotions': emotions}, user=user)
+    return curve['key'], {
+        'curve_svg': curve['svg'],
+        'series': {key: curve[key] for key in ('dates', 'levels', 'smoothed', 'moving_average')},
+        'average': curve['average'],
+        'trend': curve['trend'],
+        'volatility': curve['volatility'],
+        'change_points': curve['change_points'],
+        'analysis': None,
+        'commentary_job_id': commentary_job.id if commentary_job else None
+    }
+
+def record_generated_photo(user, text, style, result, asset=None):
+    """记录生成历史，照片已转存时关联转存后的资源"""
+    with transaction.atomic():
+        return EmotionRecord.objects.create(
+            user=user,
+            emotion_type=EMOTION_TYPE_PHOTO,
+            description=text,
+            photo_url=asset.original_url if asset else result.get('photo_url'),
+            photo_style=style,
+            photo_asset=asset
+        )
+
 class EmotionViewSet(viewsets.ModelViewSet):
     """情绪记录视图集"""
     serializer_class = EmotionRecordSerializer
     authentication_classes = [JWTAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
     
     def get_queryset(self):
         """获取用户的情绪记录"""
         return EmotionRecord.objects.filter(
             user=self.request.user
-        ).select_related('user').order_by('-created_at')
+        ).select_related('user', 'photo_asset').order_by('-created_at')
+    
+    def get_serializer_context(self):
+        """列表返回照片缩略图，详情返回原图"""
+        context = super().get_serializer_context()
+        context['photo_variant'] = 'thumbnail' if self.action == 'list' else 'full'
+        return context
     
     @transaction.atomic    
     def perform_create(self, serializer):
@@ -35,6 +111,15 @@ class EmotionViewSet(viewsets.ModelViewSet):
             logger.error(f"创建情绪记录失败: {str(e)}")
             raise ValidationError(f"创建情绪记录失败: {str(e)}")
     
+    @action(detail=False, methods=['post'])
+    def sync(self, request):
+        """批量同步离线记录，按 client_id 去重，返回逐条结果"""
+        try:
+            results = sync_records(request.user, request.data.get('records'))
+        except SyncRequestError as e:
+            return error_response(str(e), code=400, status_code=400)
+        return success_response({'results': results})
+    
     @action(detail=False, methods=['post'])
     def generate_photo(self, request):
         """生成情绪照片"""
@@ -43,33 +128,30 @@ class EmotionViewSet(viewsets.ModelViewSet):
             text = request.data.get('text')
             style = request.data.get('style')
             
-            if not text:
-                return error_response('请提供情绪描述文本', code=400)
-            
-            if len(text) > 500:
-                return error_response('情绪描述文本过长，请控制在500字以内', code=400)
+            message = validate_photo_request(text)
+            if message:
+                return error_response(message, code=400)
+                
+            # 异步模式：提交后台任务，通过 /api/v1/jobs/<job_id>/ 查询结果
+            if request.data.get('async'):
+                job = queue.enqueue('emotions.generate_photo', {'text': text, 'style': style}, user=request.user)
+                return accepted_response({'job_id': job.id, 'status': job.status})
                 
-            # 调用COZE服务生成照片
-            result = coze_service.generate_emotion_photo(text, style)
+            # 相同文本和风格的照片已转存过时直接复用，否则调用COZE服务生成并转存
+            asset, result = obtain_photo(text, style)
             
             # 记录生成历史
-            with transaction.atomic():
-                emotion_record = EmotionRecord.objects.create(
-                    user=request.user,
-                    content=text,
-                    photo_url=result.get('photo_url'),
-                    photo_style=style
-                )
+            emotion_record = record_generated_photo(request.user, text, style, result, asset)
             
             return success_response({
                 'record_id': emotion_record.id,
-                'photo_url': result.get('photo_url'),
+                **photo_urls(asset, result),
                 'created_at': emotion_record.created_at
             })
             
         except CozeServiceError as e:
             logger.error(f"生成情绪照片失败: {str(e)}")
-            return error_response(f"生成情绪照片失败: {str(e)}", code=500)
+            return error_response(f"生成情绪照片失败: {str(e)}", code=e.code, status_code=e.code)
         except Exception as e:
             logger.error(f"处理请求失败: {str(e)}")
             return error_response('服务器内部错误', code=500)
@@ -80,31 +162,67 @@ class EmotionViewSet(viewsets.ModelViewSet):
         try:
             # 参数验证
             emotions = request.data.get('emotions')
+            days = request.data.get('days')
             
-            if not emotions:
-                return error_response('请提供情绪数据', code=400)
+            # 未提供数据时按最近 days 天的每日汇总生成曲线
+            if not emotions and days:
+                try:
+                    emotions = curve_points(request.user, int(days))
+                except (TypeError, ValueError):
+                    return error_response('days 必须为整数', code=400)
+                    
+            message = validate_curve_request(emotions)
+            if message:
+                return error_response(message, code=400)
                 
-            if not isinstance(emotions, list):
-                return error_response('情绪数据格式错误', code=400)
-                
-            if len(emotions) > 30:
-                return error_response('情绪数据过多，请控制在30条以内', code=400)
-                
-            # 调用COZE服务生成曲线
-            result = coze_service.generate_emotion_curve(emotions)
-            
-            return success_response({
-                'curve_url': result.get('curve_url'),
-                'analysis': result.get('analysis')
-            })
+            key, data = generate_curve_data(request.user, emotions, request.data.get('commentary', True))
+            curve_url = request.build_absolute_uri(self.reverse_action('curve-svg', kwargs={'key': key}))
+            return success_response({'curve_url': curve_url, **data})
             
+        except CurveDataError as e:
+            return error_response(str(e), code=400)
         except CozeServiceError as e:
             logger.error(f"生成情绪曲线失败: {str(e)}")
-            return error_response(f"生成情绪曲线失败: {str(e)}", code=500)
+            return error_response(f"生成情绪曲线失败: {str(e)}", code=e.code, status_code=e.code)
         except Exception as e:
             logger.error(f"处理请求失败: {str(e)}")
             return error_response('服务器内部错误', code=500)
             
+    @action(detail=False, methods=['get'], url_path=r'curves/(?P<key>[0-9a-f]{40})',
+            authentication_classes=[], permission_classes=[AllowAny])
+    def curve_svg(self, request, key=None):
+        """情绪曲线图片（SVG），链接由 generate_curve 返回，不可猜测"""
+        svg = get_cached_svg(key)
+        if svg is None:
+            return not_found_error('曲线不存在或已过期')
+        response = HttpResponse(svg, content_type='image/svg+xml; charset=utf-8')
+        response['Cache-Control'] = 'private, max-age=86400'
+        return response
+            
+    @action(detail=True, methods=['get'], url_path='analysis/stream', renderer_classes=[EventStreamRenderer, JSONRenderer])
+    def stream_analysis(self, request, pk=None):
+        """流式生成情绪分析（SSE），生成完成后保存"""
+        emotion_record = self.get_object()
+        chunks = AIService(request.user).stream_emotion_analysis(emotion_record.description)
+        
+        def save(analysis):
+            EmotionRecord.objects.filter(id=emotion_record.id).update(ai_analysis=analysis)
+            return {'record_id': emotion_record.id}
+            
+        return stream_text_response(chunks, save)
+            
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """流式导出全部情绪记录（照片为原图地址）：?output=jsonl|csv，?gzip=1 时输出 .gz 文件"""
+        output = request.query_params.get('output', 'jsonl')
+        if output not in EXPORT_FORMATS:
+            return error_response('output 只支持 jsonl 或 csv', code=400, status_code=400)
+        return export_response(
+            self.get_queryset(), EmotionRecordSerializer, 'emotions', output,
+            compress=request.query_params.get('gzip') in ('1', 'true'),
+            context=self.get_serializer_context()
+        )
+
     @action(detail=False, methods=['get'])
     def statistics(self, request):
         """��取情绪统计数据"""
@@ -128,24 +246,16 @@ class EmotionViewSet(viewsets.ModelViewSet):
             if (end_date - start_date).days > 90:
                 return error_response('时间范围不能超过90天', code=400)
             
-            # 查询情绪记录
-            queryset = self.get_queryset().filter(
-                created_at__date__gte=start_date,
-                created_at__date__lte=end_date
-            )
+            # 按每日汇总统计，查询量与天数成正比
+            statistics = daily_statistics(request.user, start_date.date(), end_date.date())
             
-            # 序列化数据
-            serializer = self.get_serializer(queryset, many=True)
-            
-            # 统计数据
-            total_count = queryset.count()
-            emotion_levels = queryset.values_list('emotion_level', flat=True)
-            
-            statistics = {
-                'total_count': total_count,
-                'average_level': sum(emotion_levels) / total_count if total_count > 0 else 0,
-                'records': serializer.data
-            }
+            # 默认返回记录明细（兼容已有客户端），只需要汇总时传 include_records=0 跳过明细查询
+            if request.query_params.get('include_records') not in ('0', 'false'):
+                queryset = self.get_queryset().filter(
+                    created_at__date__gte=start_date,
+                    created_at__date__lte=end_date
+                )
+                statistics['records'] = self.get_serializer(queryset, many=True).data
             
             return success_response(statistics)
             
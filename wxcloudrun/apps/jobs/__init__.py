@@ -0,0 +1 @@
+default_app_config = 'wxcloudrun.apps.jobs.apps.JobsConfig'
\ No newline at end of file
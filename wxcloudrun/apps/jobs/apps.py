@@ -0,0 +1,15 @@
+from django.apps import AppConfig
+from django.core.signals import request_started
+from django.utils.module_loading import autodiscover_modules
+
+class JobsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'wxcloudrun.apps.jobs'
+    verbose_name = '后台任务'
+
+    def ready(self):
+        # 加载各应用 tasks.py 中注册的任务处理函数
+        autodiscover_modules('tasks')
+
+        from .enrichment import start_inline_pool
+        request_started.connect(start_inline_pool, dispatch_uid='jobs.start_inline_pool')
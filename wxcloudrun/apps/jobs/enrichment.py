@@ -0,0 +1,201 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional
+from django.conf import settings
+from django.db import transaction, close_old_connections
+from django.utils import timezone
+from . import queue
+from .models import AIJob, EnrichableModel
+from .serializers import AIJobSerializer
+
+logger = logging.getLogger(__name__)
+
+def make_ref(instance) -> str:
+    """记录在任务表中的关联标识，如 collections.collection:12"""
+    return f"{instance._meta.label_lower}:{instance.pk}"
+
+def schedule_enrichment(instance: EnrichableModel, job_type: str, payload: dict, user=None) -> None:
+    """事务提交后再提交富化任务，避免任务先于记录可见；调用方不等待 AI 结果"""
+    ref = make_ref(instance)
+    transaction.on_commit(lambda: submit_enrichment(job_type, payload, user, ref))
+
+def submit_enrichment(job_type: str, payload: dict, user, ref: str) -> AIJob:
+    job = queue.enqueue(job_type, payload, user=user, ref=ref)
+    # inline 模式下由 Web 进程内的有界线程池立即执行（池满时由池的定时领取执行），否则等待 run_ai_jobs 领取
+    if getattr(settings, 'AI_ENRICHMENT_BACKEND', 'worker') == 'inline':
+        get_enrichment_pool().submit(job.id)
+    return job
+
+@contextmanager
+def track_enrichment(model, pk: int, job: AIJob):
+    """富化任务的状态跟踪：开始时标记处理中，失败时按是否还会重试标记为等待或失败"""
+    model.objects.filter(pk=pk).update(enrich_status=EnrichableModel.ENRICH_RUNNING)
+    try:
+        yield
+    except Exception as e:
+        final = isinstance(e, queue.PermanentJobError) or job.attempts >= job.max_attempts
+        # 只改处理中的状态，记录在此期间已由流式生成写回结果时保持已完成
+        model.objects.filter(pk=pk, enrich_status=EnrichableModel.ENRICH_RUNNING).update(
+            enrich_status=EnrichableModel.ENRICH_FAILED if final else EnrichableModel.ENRICH_PENDING
+        )
+        raise
+
+def finish_enrichment(model, pk: int, job: Optional[AIJob] = None, **fields) -> bool:
+    """只写回 AI 字段和富化状态，不覆盖用户在此期间对其他字段的修改，返回是否写回
+
+    传入 job 时锁定任务行，任务已被取代（流式生成已写回结果）或已被其他执行者重新领取时不写回。
+    """
+    with transaction.atomic():
+        if job is not None and not AIJob.objects.select_for_update().filter(
+            id=job.id, status=AIJob.STATUS_RUNNING, locked_by=job.locked_by
+        ).exists():
+            logger.info(f"任务 {job.job_type}#{job.id} 已被取代，不写回结果")
+            return False
+        model.objects.filter(pk=pk).update(
+            enrich_status=EnrichableModel.ENRICH_DONE,
+            enriched_at=timezone.now(),
+            **fields
+        )
+    return True
+
+def save_streamed_enrichment(instance: EnrichableModel, **fields) -> None:
+    """写回流式生成的结果，同时取代该记录尚未完成的富化任务，避免稍后被任务的结果覆盖"""
+    now = timezone.now()
+    with transaction.atomic():
+        AIJob.objects.filter(
+            ref=make_ref(instance), status__in=[AIJob.STATUS_PENDING, AIJob.STATUS_RUNNING]
+        ).update(
+            status=AIJob.STATUS_SUCCEEDED,
+            result={'superseded': True},
+            locked_until=None,
+            finished_at=now,
+            updated_at=now
+        )
+        finish_enrichment(type(instance), instance.pk, **fields)
+
+def enrichment_status(instance: EnrichableModel) -> Dict[str, Any]:
+    """记录的富化状态及最近一次任务"""
+    job = AIJob.objects.filter(ref=make_ref(instance)).order_by('-id').first()
+    return {
+        'status': instance.enrich_status,
+        'enriched_at': instance.enriched_at,
+        'job': AIJobSerializer(job).data if job else None
+    }
+
+class EnrichmentPool:
+    """进程内的有界富化线程池
+
+    新任务提交后立即执行；槽位用尽时留在队列中的任务、退避到期的重试任务和执行者失联的任务
+    由后台线程每 AI_ENRICHMENT_SWEEP_INTERVAL 秒从 ai_jobs 表领取，不需要部署 run_ai_jobs。
+    """
+
+    def __init__(self):
+        self.workers = getattr(settings, 'AI_ENRICHMENT_WORKERS', 4)
+        # 正在执行和排队的任务总数上限
+        self.capacity = self.workers + getattr(settings, 'AI_ENRICHMENT_QUEUE_SIZE', 16)
+        self.sweep_interval = getattr(settings, 'AI_ENRICHMENT_SWEEP_INTERVAL', 15)
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._sweeper: Optional[threading.Thread] = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.worker_id = f"inline-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            # fork 出的子进程不能复用父进程的线程
+            if self._executor is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._slots = threading.BoundedSemaphore(self.capacity)
+                self.worker_id = f"inline-{self._pid}-{uuid.uuid4().hex[:8]}"
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='ai-enrich')
+                self._sweeper = None
+            if self._sweeper is None or not self._sweeper.is_alive():
+                self._sweeper = threading.Thread(target=self._sweep_loop, name='ai-enrich-sweep', daemon=True)
+                self._sweeper.start()
+            return self._executor
+
+    def start(self) -> None:
+        """启动线程池和定时领取线程（Web 进程处理第一个请求时调用）"""
+        self._get_executor()
+
+    def _sweep_loop(self) -> None:
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"领取富化任务失败: {str(e)}")
+            finally:
+                close_old_connections()
+
+    def sweep(self) -> int:
+        """领取到期的任务，数量不超过空闲槽位和线程数，返回领取的任务数"""
+        executor = self._get_executor()
+        free = 0
+        while free < self.workers and self._slots.acquire(blocking=False):
+            free += 1
+        if not free:
+            return 0
+        jobs = []
+        try:
+            jobs = queue.claim(self.worker_id, free)
+        finally:
+            for _ in range(free - len(jobs)):
+                self._slots.release()
+        for job in jobs:
+            executor.submit(self._execute, job)
+        return len(jobs)
+
+    def submit(self, job_id: int) -> bool:
+        """提交任务；池已满时返回 False"""
+        executor = self._get_executor()
+        if not self._slots.acquire(blocking=False):
+            logger.warning(f"富化线程池已满，任务 #{job_id} 留在队列中等待领取")
+            return False
+        executor.submit(self._run, job_id)
+        return True
+
+    def _run(self, job_id: int) -> None:
+        try:
+            job = queue.claim_job(job_id, self.worker_id)
+        except Exception as e:
+            logger.error(f"进程内领取富化任务 #{job_id} 失败: {str(e)}")
+            job = None
+        if job is None:
+            # 任务已被领取或所属工作流已满，由定时领取或 run_ai_jobs 处理
+            self._slots.release()
+            close_old_connections()
+            return
+        self._execute(job)
+
+    def _execute(self, job: AIJob) -> None:
+        try:
+            queue.run_job(job)
+        except Exception as e:
+            logger.error(f"进程内执行富化任务 #{job.id} 失败: {str(e)}")
+        finally:
+            self._slots.release()
+            close_old_connections()
+
+_pool: Optional[EnrichmentPool] = None
+_pool_lock = threading.Lock()
+
+def get_enrichment_pool() -> EnrichmentPool:
+    """获取进程内共享的富化线程池"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = EnrichmentPool()
+    return _pool
+
+def start_inline_pool(**kwargs) -> None:
+    """inline 模式下 Web 进程收到请求时启动线程池，之前留在队列中的任务随之被领取（request_started 信号）"""
+    if getattr(settings, 'AI_ENRICHMENT_BACKEND', 'worker') == 'inline':
+        get_enrichment_pool().start()
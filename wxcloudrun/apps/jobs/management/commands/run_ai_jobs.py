@@ -0,0 +1,71 @@
+import os
+import time
+import signal
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections
+from django.core.management.base import BaseCommand
+from wxcloudrun.apps.jobs import queue
+
+class Command(BaseCommand):
+    """AI 任务执行进程：从 ai_jobs 表领取任务并在线程池中执行"""
+
+    help = '执行后台 AI 任务'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=getattr(settings, 'AI_JOB_WORKER_CONCURRENCY', 8), help='同时执行的任务数')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='无任务时的轮询间隔（秒）')
+        parser.add_argument('--once', action='store_true', help='执行完当前可领取的任务后退出')
+
+    def handle(self, *args, **options):
+        concurrency = options['concurrency']
+        poll_interval = options['poll_interval']
+        worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        stopping = threading.Event()
+        slots = threading.Semaphore(concurrency)
+
+        def stop(signum, frame):
+            self.stdout.write('收到退出信号，等待执行中的任务完成...')
+            stopping.set()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        def execute(job):
+            try:
+                queue.run_job(job)
+            finally:
+                close_old_connections()
+                slots.release()
+
+        self.stdout.write(f"任务执行进程已启动: {worker_id}，并发数 {concurrency}")
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='ai-job') as executor:
+            while not stopping.is_set():
+                # 只领取空闲线程能立即执行的数量，避免任务在本进程中排队导致可见性超时
+                free = 0
+                while free < concurrency and slots.acquire(blocking=False):
+                    free += 1
+                if not free:
+                    time.sleep(0.05)
+                    continue
+
+                close_old_connections()
+                try:
+                    jobs = queue.claim(worker_id, free)
+                except Exception as e:
+                    self.stderr.write(f"领取任务失败: {str(e)}")
+                    jobs = []
+
+                for _ in range(free - len(jobs)):
+                    slots.release()
+                for job in jobs:
+                    executor.submit(execute, job)
+
+                if not jobs:
+                    if options['once']:
+                        break
+                    stopping.wait(poll_interval)
+
+        self.stdout.write(self.style.SUCCESS('任务执行进程已退出'))
@@ -0,0 +1,69 @@
+from django.db import models
+from django.utils import timezone
+from wxcloudrun.apps.users.models import User
+
+class AIJob(models.Model):
+    """AI 生成任务（MySQL 持久化队列）"""
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, '等待执行'),
+        (STATUS_RUNNING, '执行中'),
+        (STATUS_SUCCEEDED, '成功'),
+        (STATUS_FAILED, '失败'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='ai_jobs', verbose_name='用户')
+    job_type = models.CharField('任务类型', max_length=64)
+    workflow = models.CharField('工作流', max_length=64, db_index=True)
+    payload = models.JSONField('任务参数', default=dict)
+    status = models.CharField('状态', max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    result = models.JSONField('执行结果', null=True, blank=True)
+    error = models.TextField('错误信息', blank=True, default='')
+    attempts = models.IntegerField('已执行次数', default=0)
+    max_attempts = models.IntegerField('最大执行次数', default=3)
+    run_after = models.DateTimeField('可执行时间', default=timezone.now)
+    locked_until = models.DateTimeField('锁定到期时间', null=True, blank=True)
+    locked_by = models.CharField('执行者', max_length=64, blank=True, default='')
+    ref = models.CharField('关联记录', max_length=64, blank=True, default='', db_index=True)
+    created_at = models.DateTimeField('创建时间', auto_now_add=True)
+    updated_at = models.DateTimeField('更新时间', auto_now=True)
+    finished_at = models.DateTimeField('完成时间', null=True, blank=True)
+
+    class Meta:
+        db_table = 'ai_jobs'
+        ordering = ['-created_at']
+        verbose_name = 'AI任务'
+        verbose_name_plural = verbose_name
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='ai_jobs_status_run_after'),
+            models.Index(fields=['status', 'locked_until'], name='ai_jobs_status_locked'),
+        ]
+
+    def __str__(self):
+        return f"{self.job_type}#{self.id} - {self.status}"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_SUCCEEDED, self.STATUS_FAILED)
+
+class EnrichableModel(models.Model):
+    """带 AI 富化状态的记录（摘要、标签、分析等由后台任务写回）"""
+    ENRICH_PENDING = 'pending'
+    ENRICH_RUNNING = 'running'
+    ENRICH_DONE = 'done'
+    ENRICH_FAILED = 'failed'
+    ENRICH_STATUS_CHOICES = [
+        (ENRICH_PENDING, '等待处理'),
+        (ENRICH_RUNNING, '处理中'),
+        (ENRICH_DONE, '已完成'),
+        (ENRICH_FAILED, '失败'),
+    ]
+
+    enrich_status = models.CharField('AI处理状态', max_length=16, choices=ENRICH_STATUS_CHOICES, default=ENRICH_PENDING)
+    enriched_at = models.DateTimeField('AI处理完成时间', null=True, blank=True)
+
+    class Meta:
+        abstract = True
@@ -0,0 +1,171 @@
+import random
+import logging
+from datetime import timedelta
+from typing import Callable, Dict, List, Optional
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+from .models import AIJob
+
+logger = logging.getLogger(__name__)
+
+class JobError(Exception):
+    """任务执行失败（可重试）"""
+    pass
+
+class PermanentJobError(JobError):
+    """任务执行失败（不再重试）"""
+    pass
+
+# 任务类型 -> (处理函数, 工作流)
+_handlers: Dict[str, tuple] = {}
+
+def register(job_type: str, workflow: str):
+    """注册任务处理函数，处理函数接收 AIJob 并返回可 JSON 序列化的结果"""
+    def decorator(func: Callable[[AIJob], dict]):
+        _handlers[job_type] = (func, workflow)
+        return func
+    return decorator
+
+def get_handler(job_type: str) -> Optional[Callable[[AIJob], dict]]:
+    handler = _handlers.get(job_type)
+    return handler[0] if handler else None
+
+def get_concurrency_limit(workflow: str) -> int:
+    """每个工作流同时执行的任务数上限"""
+    limits = getattr(settings, 'AI_JOB_CONCURRENCY', {})
+    return limits.get(workflow, getattr(settings, 'AI_JOB_DEFAULT_CONCURRENCY', 4))
+
+def enqueue(job_type: str, payload: dict, user=None, max_attempts: Optional[int] = None, ref: str = '') -> AIJob:
+    """提交任务，ref 为关联记录（如 collections.collection:12），用于按记录查询任务进度"""
+    if job_type not in _handlers:
+        raise ValueError(f"未注册的任务类型: {job_type}")
+
+    return AIJob.objects.create(
+        user=user,
+        job_type=job_type,
+        workflow=_handlers[job_type][1],
+        payload=payload,
+        ref=ref,
+        max_attempts=max_attempts or getattr(settings, 'AI_JOB_MAX_ATTEMPTS', 3)
+    )
+
+def claim(worker_id: str, limit: int) -> List[AIJob]:
+    """领取可执行的任务：等待中且到达执行时间的任务，或可见性超时（执行者失联）的任务"""
+    now = timezone.now()
+
+    with transaction.atomic():
+        candidates = list(
+            AIJob.objects.select_for_update(skip_locked=True).filter(
+                Q(status=AIJob.STATUS_PENDING, run_after__lte=now) |
+                Q(status=AIJob.STATUS_RUNNING, locked_until__lte=now)
+            ).order_by('run_after', 'id')[:limit * 4]
+        )
+        if not candidates:
+            return []
+
+        # 各工作流当前仍在执行的任务数
+        running = dict(
+            AIJob.objects.filter(
+                status=AIJob.STATUS_RUNNING,
+                locked_until__gt=now,
+                workflow__in={job.workflow for job in candidates}
+            ).values_list('workflow').annotate(count=Count('id'))
+        )
+
+        claimed = []
+        for job in candidates:
+            if len(claimed) >= limit:
+                break
+            if running.get(job.workflow, 0) >= get_concurrency_limit(job.workflow):
+                continue
+            running[job.workflow] = running.get(job.workflow, 0) + 1
+            claimed.append(job)
+
+        if claimed:
+            _mark_running(claimed, worker_id, now)
+        return claimed
+
+def claim_job(job_id: int, worker_id: str) -> Optional[AIJob]:
+    """领取指定的任务（进程内执行用）；任务已被领取、未到执行时间或所属工作流已满时返回 None"""
+    now = timezone.now()
+    with transaction.atomic():
+        job = AIJob.objects.select_for_update(skip_locked=True).filter(
+            id=job_id, status=AIJob.STATUS_PENDING, run_after__lte=now
+        ).first()
+        if job is None:
+            return None
+        running = AIJob.objects.filter(
+            status=AIJob.STATUS_RUNNING, locked_until__gt=now, workflow=job.workflow
+        ).count()
+        if running >= get_concurrency_limit(job.workflow):
+            return None
+        _mark_running([job], worker_id, now)
+        return job
+
+def _mark_running(jobs: List[AIJob], worker_id: str, now) -> None:
+    visibility_timeout = getattr(settings, 'AI_JOB_VISIBILITY_TIMEOUT', 120)
+    AIJob.objects.filter(id__in=[job.id for job in jobs]).update(
+        status=AIJob.STATUS_RUNNING,
+        locked_by=worker_id,
+        locked_until=now + timedelta(seconds=visibility_timeout),
+        attempts=F('attempts') + 1,
+        updated_at=now
+    )
+    for job in jobs:
+        job.status = AIJob.STATUS_RUNNING
+        job.locked_by = worker_id
+        job.attempts += 1
+
+def complete(job: AIJob, result: dict) -> bool:
+    """标记成功；返回 False 表示任务已被其他执行者接管"""
+    now = timezone.now()
+    return AIJob.objects.filter(id=job.id, locked_by=job.locked_by, status=AIJob.STATUS_RUNNING).update(
+        status=AIJob.STATUS_SUCCEEDED,
+        result=result,
+        error='',
+        locked_until=None,
+        finished_at=now,
+        updated_at=now
+    ) > 0
+
+def fail(job: AIJob, error: Exception) -> bool:
+    """标记失败：未超过最大次数时按指数退避重新排队"""
+    now = timezone.now()
+    retryable = not isinstance(error, PermanentJobError) and job.attempts < job.max_attempts
+    if retryable:
+        base = getattr(settings, 'AI_JOB_RETRY_BACKOFF', 5)
+        delay = min(base * (2 ** (job.attempts - 1)), getattr(settings, 'AI_JOB_RETRY_BACKOFF_MAX', 300))
+        # 加入抖动，避免同时失败的任务同时重试
+        delay = delay * random.uniform(0.8, 1.2)
+        changes = {
+            'status': AIJob.STATUS_PENDING,
+            'run_after': now + timedelta(seconds=delay)
+        }
+    else:
+        changes = {
+            'status': AIJob.STATUS_FAILED,
+            'finished_at': now
+        }
+
+    return AIJob.objects.filter(id=job.id, locked_by=job.locked_by, status=AIJob.STATUS_RUNNING).update(
+        error=str(error)[:2000],
+        locked_until=None,
+        updated_at=now,
+        **changes
+    ) > 0
+
+def run_job(job: AIJob) -> None:
+    """执行单个任务"""
+    handler = get_handler(job.job_type)
+    try:
+        if handler is None:
+            raise PermanentJobError(f"未注册的任务类型: {job.job_type}")
+        result = handler(job)
+    except Exception as e:
+        logger.error(f"任务执行失败: {job.job_type}#{job.id} 第{job.attempts}次: {str(e)}")
+        fail(job, e)
+    else:
+        if not complete(job, result or {}):
+            logger.warning(f"任务 {job.job_type}#{job.id} 已超时被重新领取，丢弃本次结果")
@@ -0,0 +1,9 @@
+from rest_framework import serializers
+from .models import AIJob
+
+class AIJobSerializer(serializers.ModelSerializer):
+    """AI任务序列化器"""
+    class Meta:
+        model = AIJob
+        fields = ['id', 'job_type', 'status', 'result', 'error', 'attempts', 'created_at', 'finished_at']
+        read_only_fields = fields
@@ -0,0 +1,238 @@
+import threading
+from datetime import timedelta
+from unittest import skipUnless
+from django.db import connection, close_old_connections
+from unittest.mock import patch
+from django.contrib.auth import get_user_model
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from wxcloudrun.apps.careers.models import CareerRecord
+from . import queue, enrichment
+from .enrichment import (EnrichmentPool, schedule_enrichment, track_enrichment, finish_enrichment, enrichment_status,
+                         save_streamed_enrichment)
+from .models import AIJob
+
+@queue.register('tests.echo', workflow='tests')
+def echo(job):
+    if job.payload.get('error') == 'permanent':
+        raise queue.PermanentJobError('参数错误')
+    if job.payload.get('error'):
+        raise queue.JobError('暂时失败')
+    return {'echo': job.payload.get('value')}
+
+@queue.register('tests.enrich', workflow='tests')
+def enrich(job):
+    record_id = job.payload['record_id']
+    with track_enrichment(CareerRecord, record_id, job):
+        if job.attempts <= job.payload.get('failures', 0):
+            raise queue.JobError('暂时失败')
+        finish_enrichment(CareerRecord, record_id, job=job, ai_analysis=f"第{job.attempts}次分析")
+    return {'record_id': record_id}
+
+class SyncExecutor:
+    """在调用线程中直接执行，测试时与测试用例共用同一个数据库事务"""
+
+    def submit(self, func, *args):
+        func(*args)
+
+@override_settings(AI_JOB_CONCURRENCY={}, AI_JOB_DEFAULT_CONCURRENCY=10, AI_JOB_RETRY_BACKOFF=5, AI_JOB_VISIBILITY_TIMEOUT=120)
+class JobQueueTests(TestCase):
+    def test_claimed_jobs_are_not_claimed_again(self):
+        """测试已领取的任务不会被其他执行者再次领取"""
+        jobs = [queue.enqueue('tests.echo', {'value': i}) for i in range(3)]
+        first = queue.claim('worker-a', 2)
+        second = queue.claim('worker-b', 5)
+        self.assertEqual([job.id for job in first], [jobs[0].id, jobs[1].id])
+        self.assertEqual([job.id for job in second], [jobs[2].id])
+        self.assertEqual(queue.claim('worker-c', 5), [])
+        self.assertEqual(AIJob.objects.get(id=jobs[2].id).locked_by, 'worker-b')
+        self.assertIsNone(queue.claim_job(jobs[0].id, 'worker-c'))
+
+    @override_settings(AI_JOB_CONCURRENCY={'tests': 1})
+    def test_workflow_concurrency_limit(self):
+        """测试工作流并发上限"""
+        for i in range(2):
+            queue.enqueue('tests.echo', {'value': i})
+        self.assertEqual(len(queue.claim('worker-a', 5)), 1)
+        self.assertEqual(queue.claim('worker-b', 5), [])
+
+    def test_reclaim_after_visibility_timeout(self):
+        """测试执行者失联超时后任务被重新领取，原执行者的结果被丢弃"""
+        queue.enqueue('tests.echo', {'value': 1})
+        stale = queue.claim('worker-a', 1)[0]
+        AIJob.objects.filter(id=stale.id).update(locked_until=timezone.now() - timedelta(seconds=1))
+
+        current = queue.claim('worker-b', 1)[0]
+        self.assertEqual(current.id, stale.id)
+        self.assertEqual(current.attempts, 2)
+        self.assertFalse(queue.complete(stale, {'echo': 'stale'}))
+        self.assertFalse(queue.fail(stale, queue.JobError('超时')))
+
+        job = AIJob.objects.get(id=stale.id)
+        self.assertEqual((job.status, job.locked_by, job.error), (AIJob.STATUS_RUNNING, 'worker-b', ''))
+        self.assertTrue(queue.complete(current, {'echo': 1}))
+        self.assertEqual(AIJob.objects.get(id=stale.id).status, AIJob.STATUS_SUCCEEDED)
+
+    def test_retry_backoff_until_max_attempts(self):
+        """测试失败后按退避时间重新排队，达到最大次数后标记失败"""
+        job = queue.enqueue('tests.echo', {'error': 'retry'}, max_attempts=2)
+        before = timezone.now()
+        queue.run_job(queue.claim('worker-a', 1)[0])
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (AIJob.STATUS_PENDING, 1))
+        self.assertGreaterEqual(job.run_after, before + timedelta(seconds=4))
+        self.assertEqual(queue.claim('worker-a', 1), [])
+
+        AIJob.objects.filter(id=job.id).update(run_after=timezone.now())
+        queue.run_job(queue.claim('worker-a', 1)[0])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (AIJob.STATUS_FAILED, 2))
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(job.error, '暂时失败')
+
+    def test_permanent_error_is_not_retried(self):
+        """测试 PermanentJobError 不重试"""
+        job = queue.enqueue('tests.echo', {'error': 'permanent'}, max_attempts=3)
+        queue.run_job(queue.claim('worker-a', 1)[0])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (AIJob.STATUS_FAILED, 1))
+
+    def test_run_job_success(self):
+        """测试执行成功后写入结果"""
+        job = queue.enqueue('tests.echo', {'value': 'ok'})
+        queue.run_job(queue.claim_job(job.id, 'worker-a'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result), (AIJob.STATUS_SUCCEEDED, {'echo': 'ok'}))
+
+@skipUnless(connection.features.has_select_for_update_skip_locked, '数据库不支持 SKIP LOCKED')
+@override_settings(AI_JOB_CONCURRENCY={}, AI_JOB_DEFAULT_CONCURRENCY=100)
+class JobQueueConcurrencyTests(TransactionTestCase):
+    def test_concurrent_claims_are_disjoint(self):
+        """测试多个执行者同时领取时（SELECT ... FOR UPDATE SKIP LOCKED）每个任务只被领取一次"""
+        jobs = [queue.enqueue('tests.echo', {'value': i}) for i in range(40)]
+        barrier = threading.Barrier(4)
+        claimed = {}
+
+        def work(worker_id):
+            try:
+                barrier.wait()
+                ids = []
+                while True:
+                    batch = queue.claim(worker_id, 3)
+                    if not batch:
+                        break
+                    ids.extend(job.id for job in batch)
+                claimed[worker_id] = ids
+            finally:
+                close_old_connections()
+
+        threads = [threading.Thread(target=work, args=(f"worker-{i}",)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        ids = [job_id for worker_ids in claimed.values() for job_id in worker_ids]
+        self.assertEqual(sorted(ids), sorted(job.id for job in jobs))
+
+@override_settings(AI_ENRICHMENT_BACKEND='inline', AI_ENRICHMENT_WORKERS=2, AI_ENRICHMENT_QUEUE_SIZE=0,
+                   AI_JOB_CONCURRENCY={}, AI_JOB_DEFAULT_CONCURRENCY=10)
+@patch('wxcloudrun.apps.jobs.enrichment.close_old_connections', lambda: None)
+class InlineEnrichmentTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='enrichuser', openid='enrichuser', password='testpass123')
+        self.record = CareerRecord.objects.create(user=self.user, title='周总结', content='完成了项目', record_type='summary')
+        self.pool = EnrichmentPool()
+        self.pool.sweep_interval = 3600
+        self.pool._get_executor()
+        self.pool._executor = SyncExecutor()
+        patcher = patch.object(enrichment, 'get_enrichment_pool', return_value=self.pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def schedule(self, **payload):
+        with self.captureOnCommitCallbacks(execute=True):
+            schedule_enrichment(self.record, 'tests.enrich', {'record_id': self.record.id, **payload}, user=self.user)
+        self.record.refresh_from_db()
+
+    def test_schedule_runs_inline_and_writes_back(self):
+        """测试事务提交后在进程内执行任务并写回结果"""
+        self.schedule()
+        self.assertEqual((self.record.enrich_status, self.record.ai_analysis), (CareerRecord.ENRICH_DONE, '第1次分析'))
+        self.assertEqual(enrichment_status(self.record)['job']['status'], AIJob.STATUS_SUCCEEDED)
+
+    def test_retry_is_picked_up_by_sweep(self):
+        """测试可重试的失败在退避到期后由定时领取执行"""
+        self.schedule(failures=1)
+        self.assertEqual(self.record.enrich_status, CareerRecord.ENRICH_PENDING)
+        self.assertEqual(self.pool.sweep(), 0)
+
+        AIJob.objects.update(run_after=timezone.now())
+        self.assertEqual(self.pool.sweep(), 1)
+        self.record.refresh_from_db()
+        self.assertEqual((self.record.enrich_status, self.record.ai_analysis), (CareerRecord.ENRICH_DONE, '第2次分析'))
+
+    def test_jobs_left_when_pool_is_full_are_swept(self):
+        """测试线程池满时任务留在队列中，槽位空出后由定时领取执行"""
+        for _ in range(self.pool.capacity):
+            self.pool._slots.acquire()
+        self.schedule()
+        self.assertEqual(self.record.enrich_status, CareerRecord.ENRICH_PENDING)
+        self.assertEqual(self.pool.sweep(), 0)
+
+        for _ in range(self.pool.capacity):
+            self.pool._slots.release()
+        self.assertEqual(self.pool.sweep(), 1)
+        self.record.refresh_from_db()
+        self.assertEqual(self.record.enrich_status, CareerRecord.ENRICH_DONE)
+
+    def test_final_failure_marks_record_failed(self):
+        """测试达到最大次数后记录标记为失败"""
+        self.schedule(failures=5)
+        for _ in range(2):
+            AIJob.objects.filter(status=AIJob.STATUS_PENDING).update(run_after=timezone.now())
+            self.pool.sweep()
+        self.record.refresh_from_db()
+        self.assertEqual(self.record.enrich_status, CareerRecord.ENRICH_FAILED)
+        self.assertEqual(AIJob.objects.get().status, AIJob.STATUS_FAILED)
+
+@override_settings(AI_ENRICHMENT_BACKEND='worker', AI_JOB_CONCURRENCY={}, AI_JOB_DEFAULT_CONCURRENCY=10)
+class StreamedEnrichmentTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='streamuser', openid='streamuser', password='testpass123')
+        self.record = CareerRecord.objects.create(user=self.user, title='周总结', content='完成了项目', record_type='summary')
+
+    def submit(self):
+        return enrichment.submit_enrichment('tests.enrich', {'record_id': self.record.id}, self.user, enrichment.make_ref(self.record))
+
+    def test_streamed_result_supersedes_jobs(self):
+        """测试流式生成写回结果后，执行中的任务不再覆盖，等待中的任务不再执行"""
+        running = queue.claim_job(self.submit().id, 'worker-a')
+        pending = self.submit()
+        with track_enrichment(CareerRecord, self.record.id, running):
+            save_streamed_enrichment(self.record, ai_analysis='流式分析')
+            self.assertFalse(finish_enrichment(CareerRecord, self.record.id, job=running, ai_analysis='任务分析'))
+
+        self.record.refresh_from_db()
+        self.assertEqual((self.record.enrich_status, self.record.ai_analysis), (CareerRecord.ENRICH_DONE, '流式分析'))
+        self.assertFalse(queue.complete(running, {}))
+        self.assertEqual(AIJob.objects.get(id=pending.id).result, {'superseded': True})
+        self.assertIsNone(queue.claim_job(pending.id, 'worker-b'))
+
+    def test_failure_after_streamed_result_keeps_done(self):
+        """测试被取代的任务失败时不把已完成的记录改回等待或失败"""
+        running = queue.claim_job(self.submit().id, 'worker-a')
+        with self.assertRaises(queue.JobError):
+            with track_enrichment(CareerRecord, self.record.id, running):
+                save_streamed_enrichment(self.record, ai_analysis='流式分析')
+                raise queue.JobError('暂时失败')
+        self.record.refresh_from_db()
+        self.assertEqual(self.record.enrich_status, CareerRecord.ENRICH_DONE)
+
+    def test_active_job_writes_back(self):
+        """测试未被取代的任务正常写回"""
+        running = queue.claim_job(self.submit().id, 'worker-a')
+        self.assertTrue(finish_enrichment(CareerRecord, self.record.id, job=running, ai_analysis='任务分析'))
+        self.record.refresh_from_db()
+        self.assertEqual((self.record.enrich_status, self.record.ai_analysis), (CareerRecord.ENRICH_DONE, '任务分析'))
@@ -0,0 +1,10 @@
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+from .views import AIJobViewSet
+
+router = DefaultRouter()
+router.register(r'', AIJobViewSet, basename='ai-job')
+
+urlpatterns = [
+    path('', include(router.urls)),
+]
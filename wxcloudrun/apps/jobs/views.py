@@ -0,0 +1,35 @@
+import time
+from django.conf import settings
+from rest_framework import viewsets
+from rest_framework.permissions import IsAuthenticated
+from wxcloudrun.apps.core.authentication.jwt_auth import JWTAuthentication
+from wxcloudrun.apps.core.utils.response import success_response, error_response
+from .models import AIJob
+from .serializers import AIJobSerializer
+
+class AIJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """AI任务查询视图集"""
+    serializer_class = AIJobSerializer
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return AIJob.objects.filter(user=self.request.user).order_by('-created_at')
+
+    def retrieve(self, request, *args, **kwargs):
+        """查询任务；?wait=秒数 时长轮询，任务完成或超时后返回"""
+        job = self.get_object()
+        try:
+            wait = float(request.query_params.get('wait', 0))
+        except ValueError:
+            return error_response('wait 参数格式错误', code=400, status_code=400)
+
+        # 同步 worker 的线程在等待期间无法处理其他请求，上限保持较小（客户端超时后再次查询即可）
+        wait = min(max(wait, 0), getattr(settings, 'AI_JOB_MAX_WAIT', 10))
+        interval = getattr(settings, 'AI_JOB_POLL_INTERVAL', 0.5)
+        deadline = time.monotonic() + wait
+        while not job.is_finished and time.monotonic() < deadline:
+            time.sleep(interval)
+            job.refresh_from_db()
+
+        return success_response(self.get_serializer(job).data)